@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Book, Genre
+from .models import Book, BookImportJob, BookUpload, Genre
 
 
 @admin.register(Genre)
@@ -18,3 +18,25 @@ class BookAdmin(admin.ModelAdmin):
     filter_horizontal = ('genres',)
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-created_at',)
+
+
+
+@admin.register(BookImportJob)
+class BookImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'source', 'status', 'cursor', 'imported', 'skipped', 'failed', 'created_at')
+    list_filter = ('status',)
+    exclude = ('identifiers',)
+    readonly_fields = (
+        'created_by', 'source', 'status', 'cursor', 'imported', 'skipped',
+        'failed', 'errors', 'elapsed_seconds', 'created_at', 'finished_at',
+    )
+    ordering = ('-created_at',)
+
+
+
+@admin.register(BookUpload)
+class BookUploadAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'user', 'book', 'size', 'status', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('upload_id', 'key', 'created_at', 'completed_at')
+    ordering = ('-created_at',)
@@ -0,0 +1,253 @@
+"""
+Book cover proxy.
+
+Open Library covers are fetched once per cover id (through the shared
+client, so behind its circuit breaker), resized to a few widths
+and stored as WebP under books/covers/ol/<id>-<size>.webp. Catalog and
+search results point at the proxy (BookViewSet.cover), which fills the
+store on first request and from then on answers with the stored image —
+streamed from the filesystem, or redirected to the public object on S3 —
+with immutable caching headers. Once a cover is stored, books that still
+reference it through the proxy or Open Library are rewritten to the stored
+variant, so later page loads skip the proxy altogether.
+
+Only covers we hand out are fetched: proxy URLs carry a signature of the
+cover id, and an unsigned request must name a cover some catalog book
+already references. Fetches are also rate-limited per client, so the
+public endpoint can't be used to fill our storage with arbitrary images.
+"""
+
+import io
+import logging
+import re
+from urllib.parse import urljoin
+
+import requests
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, HttpResponsePermanentRedirect, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+
+from .http_client import get_client
+from .models import Book
+from .services import OpenLibraryService
+
+logger = logging.getLogger(__name__)
+
+_OPEN_LIBRARY_RE = re.compile(r'^https?://covers\.openlibrary\.org/b/id/(\d+)-([SML])\.jpg', re.IGNORECASE)
+_PROXY_RE        = re.compile(r'/books/covers/(\d+)/([SML])/?(?:\?.*)?$')
+
+
+class BookCoverService:
+
+    # Open Library's S/M/L names, as our widths
+    SIZES        = {'S': 96, 'M': 240, 'L': 480}
+    SOURCE_URL   = 'https://covers.openlibrary.org/b/id/{cover_id}-{size}.jpg'
+    IMAGE_FORMAT = 'WEBP'
+    QUALITY      = 80
+
+    # Stored covers never change under the same key
+    CACHE_CONTROL = 'public, max-age=31536000, immutable'
+    STORED_TTL    = 60 * 60 * 24
+    # Open Library has no image for the id — ask again tomorrow
+    MISSING_TTL   = 60 * 60 * 24
+    FETCH_LOCK_TTL = 30
+
+    SIGNING_SALT = 'books.cover'
+    # Upstream fetches one client may trigger per minute
+    FETCHES_PER_MINUTE = 30
+
+    @staticmethod
+    def key(cover_id, size):
+        return f"books/covers/ol/{cover_id}-{size}.webp"
+
+    @staticmethod
+    def source_url(cover_id, size='L'):
+        return BookCoverService.SOURCE_URL.format(cover_id=cover_id, size=size)
+
+    @staticmethod
+    def path(cover_id, size='M'):
+        return reverse('book-cover', kwargs={'cover_id': cover_id, 'size': size})
+
+    @staticmethod
+    def signature(cover_id):
+        return signing.Signer(salt=BookCoverService.SIGNING_SALT).signature(str(cover_id))
+
+    @staticmethod
+    def absolute(url):
+        """`url` on settings.SITE_URL if it's site-relative — API clients need a full URL."""
+        return urljoin(settings.SITE_URL, url)
+
+    @staticmethod
+    def signed_url(cover_id, size='M'):
+        """The proxy URL we emit for a cover — see allowed()."""
+        return BookCoverService.absolute(
+            f"{BookCoverService.path(cover_id, size)}?sig={BookCoverService.signature(cover_id)}"
+        )
+
+    @staticmethod
+    def stored_url(cover_id, size='M'):
+        return BookCoverService.absolute(default_storage.url(BookCoverService.key(cover_id, size)))
+
+    @staticmethod
+    def allowed(cover_id, signature=''):
+        """Whether we may fetch the cover: signed by us, or already used by a catalog book."""
+        if signature and constant_time_compare(signature, BookCoverService.signature(cover_id)):
+            return True
+        return Book.objects.filter(
+            Q(cover_url__contains=f'/books/covers/{cover_id}/')
+            | Q(cover_url__contains=f'/b/id/{cover_id}-')
+        ).exists()
+
+    @staticmethod
+    def throttled(request):
+        """Count a cover fetch against the client's per-minute budget; True once it's spent."""
+        # Vercel's edge sets X-Forwarded-For itself, so its first entry is the client
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip()
+        client    = forwarded or request.META.get('REMOTE_ADDR', '')
+        key = f"book_cover_fetches:{client}"
+        try:
+            cache.add(key, 0, timeout=60)
+            return cache.incr(key) > BookCoverService.FETCHES_PER_MINUTE
+        except Exception as exc:
+            # An unreachable cache never throttles
+            logger.warning("Cover rate limit unavailable for %s: %s", client, exc)
+            return False
+
+    @staticmethod
+    def parse(url):
+        """(cover_id, size) for an Open Library or proxy cover URL, else None."""
+        match = _OPEN_LIBRARY_RE.match(url or '') or _PROXY_RE.search(url or '')
+        if not match:
+            return None
+        return int(match.group(1)), match.group(2).upper()
+
+    @staticmethod
+    def stored(cover_id):
+        """Whether the cover's variants are in storage (cached — S3 exists() is a HEAD)."""
+        cache_key = f"book_cover_stored:{cover_id}"
+        if OpenLibraryService._safe_cache_get(cache_key):
+            return True
+        # 'L' is written last, so it being there means every size is
+        found = default_storage.exists(BookCoverService.key(cover_id, 'L'))
+        if found:
+            OpenLibraryService._safe_cache_set(cache_key, True, timeout=BookCoverService.STORED_TTL)
+        return found
+
+    @staticmethod
+    def fetch(cover_id):
+        """
+        Download, resize and store a cover, then point books at it.
+        True once stored, False if Open Library has no such cover, None if
+        another request is already fetching it. Upstream failures raise
+        requests.RequestException.
+        """
+        missing_key = f"book_cover_missing:{cover_id}"
+        if OpenLibraryService._safe_cache_get(missing_key):
+            return False
+        lock_key = f"book_cover_fetch:{cover_id}"
+        if not OpenLibraryService._safe_cache_add(lock_key, 1, timeout=BookCoverService.FETCH_LOCK_TTL):
+            return None
+
+        try:
+            try:
+                content = get_client().get_bytes(
+                    'cover', BookCoverService.source_url(cover_id),
+                    # Without default=false unknown ids come back as a 1×1 GIF
+                    params={'default': 'false'},
+                )
+            except requests.HTTPError as exc:
+                if getattr(exc.response, 'status_code', None) != 404:
+                    raise
+                OpenLibraryService._safe_cache_set(missing_key, True, timeout=BookCoverService.MISSING_TTL)
+                return False
+
+            for size, data in BookCoverService.resize(content):
+                key = BookCoverService.key(cover_id, size)
+                if not default_storage.exists(key):
+                    default_storage.save(key, ContentFile(data))
+        finally:
+            OpenLibraryService._safe_cache_delete(lock_key)
+
+        OpenLibraryService._safe_cache_set(
+            f"book_cover_stored:{cover_id}", True, timeout=BookCoverService.STORED_TTL,
+        )
+        BookCoverService.rewrite_books(cover_id)
+        return True
+
+    @staticmethod
+    def resize(content):
+        """[(size, webp bytes)] for every size, smallest first; never upscales."""
+        from PIL import Image
+
+        with Image.open(io.BytesIO(content)) as source:
+            image = source.convert('RGB')
+
+        variants = []
+        for size, width in sorted(BookCoverService.SIZES.items(), key=lambda item: item[1]):
+            variant = image
+            if image.width > width:
+                variant = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+            buf = io.BytesIO()
+            variant.save(buf, BookCoverService.IMAGE_FORMAT, quality=BookCoverService.QUALITY)
+            variants.append((size, buf.getvalue()))
+        return variants
+
+    @staticmethod
+    def rewrite_books(cover_id):
+        """Point books that reference the cover by URL at the stored variant; returns the count."""
+        updated = 0
+        for size in BookCoverService.SIZES:
+            path = BookCoverService.path(cover_id, size)
+            updated += Book.objects.filter(cover_url__in=[
+                BookCoverService.signed_url(cover_id, size),
+                BookCoverService.absolute(path),
+                path,
+                BookCoverService.source_url(cover_id, size),
+            ]).update(cover_url=BookCoverService.stored_url(cover_id, size))
+        return updated
+
+    @staticmethod
+    def serve(request, cover_id, size='M'):
+        """The stored cover variant, fetching it first if need be."""
+        if not BookCoverService.stored(cover_id):
+            if not BookCoverService.allowed(cover_id, request.GET.get('sig', '')):
+                response = HttpResponse(status=404)
+                response['Cache-Control'] = 'no-store'
+                return response
+            if BookCoverService.throttled(request):
+                return BookCoverService._detour(cover_id, size)
+            try:
+                found = BookCoverService.fetch(cover_id)
+            except (requests.RequestException, OSError) as exc:
+                # OSError: Pillow couldn't read what came back
+                logger.warning("Cover %s fetch failed: %s", cover_id, exc)
+                found = None
+
+            if found is False:
+                response = HttpResponse(status=404)
+                response['Cache-Control'] = f'public, max-age={BookCoverService.MISSING_TTL}'
+                return response
+            if found is None:
+                # Being fetched elsewhere, or upstream trouble
+                return BookCoverService._detour(cover_id, size)
+
+        key = BookCoverService.key(cover_id, size)
+        if getattr(default_storage, 'bucket_name', None):
+            response = HttpResponsePermanentRedirect(default_storage.url(key))
+        else:
+            response = FileResponse(default_storage.open(key), content_type='image/webp')
+        response['Cache-Control'] = BookCoverService.CACHE_CONTROL
+        return response
+
+    @staticmethod
+    def _detour(cover_id, size):
+        """Send this client to Open Library for now, without caching the detour."""
+        response = HttpResponseRedirect(BookCoverService.source_url(cover_id, size))
+        response['Cache-Control'] = 'no-store'
+        return response
@@ -0,0 +1,22 @@
+import logging
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from notifications.cron_views import _verify_qstash
+
+logger = logging.getLogger(__name__)
+
+
+@csrf_exempt
+@require_POST
+def cron_derive_pdfs(request):
+    if not _verify_qstash(request):
+        return JsonResponse({'error': 'unauthorized'}, status=401)
+    try:
+        from .tasks import derive_book_pdfs
+        done = derive_book_pdfs()
+        return JsonResponse({'status': 'pdf derivatives complete', 'books': done})
+    except Exception as e:
+        logger.error(f'cron_derive_pdfs failed: {e}')
+        return JsonResponse({'error': str(e)}, status=500)
@@ -0,0 +1,120 @@
+"""
+Content-addressed storage for book PDFs.
+
+Files are hashed in a streaming pass (SHA-256, one chunk at a time) and
+looked up in the BookFileBlob index: a file we already hold is not stored
+again — the book just points at the existing object. New files are stored
+under books/pdfs/sha256/<xx>/<digest>.pdf, so identical bytes always have
+the same URL and CDN caches are shared across books.
+"""
+
+import hashlib
+import logging
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Book, BookFileBlob
+
+logger = logging.getLogger(__name__)
+
+
+class BookFileStore:
+
+    CHUNK_SIZE = 1024 * 1024
+
+    @staticmethod
+    def key_for(digest):
+        return f"books/pdfs/sha256/{digest[:2]}/{digest}.pdf"
+
+    @staticmethod
+    def hash_chunks(chunks):
+        """(hex digest, size) of an iterable of byte chunks."""
+        sha, size = hashlib.sha256(), 0
+        for chunk in chunks:
+            sha.update(chunk)
+            size += len(chunk)
+        return sha.hexdigest(), size
+
+    @staticmethod
+    def store(fileobj):
+        """
+        Storage name for the contents of a seekable file (an UploadedFile or
+        temp file), saving it only if no identical file is stored yet.
+        """
+        fileobj = fileobj if isinstance(fileobj, File) else File(fileobj)
+        fileobj.seek(0)
+        digest, size = BookFileStore.hash_chunks(fileobj.chunks(BookFileStore.CHUNK_SIZE))
+
+        blob = BookFileBlob.objects.filter(sha256=digest).first()
+        if blob is not None:
+            return blob.name
+
+        fileobj.seek(0)
+        name   = default_storage.save(BookFileStore.key_for(digest), fileobj)
+        winner = BookFileStore._index(digest, name, size)
+        if winner != name:
+            # A concurrent upload of the same file got there first
+            default_storage.delete(name)
+        return winner
+
+    @staticmethod
+    def _index(digest, name, size):
+        """Record name as the object for digest; returns whichever name won."""
+        try:
+            with transaction.atomic():
+                BookFileBlob.objects.create(sha256=digest, name=name, size=size)
+            return name
+        except IntegrityError:
+            return BookFileBlob.objects.get(sha256=digest).name
+
+    @staticmethod
+    def iter_stored(name):
+        """Stream a stored object's bytes without buffering the whole file."""
+        from .uploads import BookUploadService, S3MultipartBackend
+
+        if BookUploadService.backend() is S3MultipartBackend:
+            # S3Boto3Storage.open() downloads the whole object first
+            body = S3MultipartBackend._client().get_object(**S3MultipartBackend._object(name))['Body']
+            yield from body.iter_chunks(BookFileStore.CHUNK_SIZE)
+            return
+        with default_storage.open(name, 'rb') as fh:
+            yield from fh.chunks(BookFileStore.CHUNK_SIZE)
+
+    @staticmethod
+    def download(name, fh):
+        """Stream a stored object into fh; returns its (hex digest, size)."""
+        sha, size = hashlib.sha256(), 0
+        for chunk in BookFileStore.iter_stored(name):
+            sha.update(chunk)
+            size += len(chunk)
+            fh.write(chunk)
+        fh.flush()
+        return sha.hexdigest(), size
+
+    @staticmethod
+    def dedupe_book(book, digest=None, size=None):
+        """
+        Index a book's already-stored file (e.g. after a direct-to-storage
+        upload) and repoint it at an identical stored object if there is one.
+        The file is hashed unless its digest and size are passed in.
+        Returns True when the book was repointed.
+        """
+        if not book.file:
+            return False
+        name = book.file.name
+        if digest is None:
+            digest, size = BookFileStore.hash_chunks(BookFileStore.iter_stored(name))
+
+        winner = BookFileStore._index(digest, name, size)
+        if winner == name:
+            return False
+
+        Book.objects.filter(pk=book.pk).update(file=winner, updated_at=timezone.now())
+        book.file.name = winner
+        if not Book.objects.filter(file=name).exists():
+            default_storage.delete(name)
+        logger.info("Book %s file deduplicated onto %s", book.pk, winner)
+        return True
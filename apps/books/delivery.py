@@ -0,0 +1,253 @@
+"""
+HTTP delivery of book PDFs.
+
+With object storage (settings.PDF_DELIVERY 'public' or 'signed') the client
+is redirected to the object itself, keeping Django out of the byte path.
+Streamed responses carry ETag / Last-Modified validators (so revalidation
+is a 304) and honour Range requests — single ranges as 206 Partial Content,
+several as multipart/byteranges — which lets pdf.js fetch only the pages it
+shows.
+"""
+
+import hashlib
+import logging
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+logger = logging.getLogger(__name__)
+
+_RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+class BookFileDelivery:
+
+    CHUNK_SIZE = 64 * 1024
+    # More ranges than this in one request is treated as no Range at all
+    MAX_RANGES = 20
+
+    # Storage names are never reused, so a positive existence check can be
+    # cached for long; a negative one only briefly (uploads may be landing).
+    EXISTS_TTL  = 60 * 60 * 24
+    MISSING_TTL = 60
+
+    @staticmethod
+    def exists(book):
+        """storage.exists(), cached — on S3 every call is a HEAD request."""
+        key = f"book_file_exists:{hashlib.sha1(book.file.name.encode()).hexdigest()}"
+        try:
+            found = cache.get(key)
+        except Exception as exc:
+            logger.warning("Cache read failed for key %s: %s", key, exc)
+            found = None
+        if found is not None:
+            return found
+
+        found = book.file.storage.exists(book.file.name)
+        try:
+            cache.set(
+                key, found,
+                timeout=BookFileDelivery.EXISTS_TTL if found else BookFileDelivery.MISSING_TTL,
+            )
+        except Exception as exc:
+            logger.warning("Cache write failed for key %s: %s", key, exc)
+        return found
+
+    @staticmethod
+    def redirect(book, filename=None):
+        """A redirect to the file in object storage, or None in 'stream' mode."""
+        mode = settings.PDF_DELIVERY
+        if mode == 'public':
+            url     = book.file.url
+            max_age = 60 * 60
+        elif mode == 'signed':
+            url     = BookFileDelivery._presigned_url(book, filename)
+            # Never let a cached redirect outlive its signature
+            max_age = max(settings.PDF_SIGNED_URL_EXPIRE - 60, 0)
+        else:
+            return None
+
+        response = HttpResponseRedirect(url)
+        response['Cache-Control'] = f'private, max-age={max_age}'
+        return response
+
+    @staticmethod
+    def _presigned_url(book, filename=None):
+        """Short-lived GET URL for the object (S3Boto3Storage only)."""
+        from storages.utils import clean_name
+
+        storage = book.file.storage
+        params  = {
+            'Bucket': storage.bucket_name,
+            'Key'   : storage._normalize_name(clean_name(book.file.name)),
+        }
+        if filename:
+            params['ResponseContentDisposition'] = f'attachment; filename="{filename}"'
+        return storage.connection.meta.client.generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=settings.PDF_SIGNED_URL_EXPIRE,
+        )
+
+    @staticmethod
+    def validators(book):
+        """(etag, last-modified timestamp) for the book's current file."""
+        # Storage names are never reused, so name + size identifies the bytes
+        digest = hashlib.sha1(f"{book.file.name}:{book.file.size}".encode()).hexdigest()
+        return f'"{digest[:32]}"', int(book.updated_at.timestamp())
+
+    @staticmethod
+    def serve(request, book, filename=None):
+        """The book's PDF as a 200, 206, 304, 412 or 416 response."""
+        etag, last_modified = BookFileDelivery.validators(book)
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(last_modified),
+            'Accept-Ranges': 'bytes',
+            # Revalidate every time; with the validators that's usually a 304
+            'Cache-Control': 'private, no-cache',
+        }
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return BookFileDelivery._with_headers(not_modified, headers)
+
+        size   = book.file.size
+        ranges = None
+        if BookFileDelivery._if_range_matches(request, etag, last_modified):
+            ranges = BookFileDelivery.parse_ranges(request.META.get('HTTP_RANGE', ''), size)
+
+        if ranges == []:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return BookFileDelivery._with_headers(response, headers)
+
+        handle = book.file.open('rb')
+        if not ranges:
+            response = FileResponse(handle, content_type='application/pdf')
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            response = StreamingHttpResponse(
+                BookFileDelivery._read_range(handle, start, end, close=True),
+                status=206, content_type='application/pdf',
+            )
+            response['Content-Range']  = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = BookFileDelivery._multipart(handle, ranges, size)
+
+        if filename:
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return BookFileDelivery._with_headers(response, headers)
+
+    @staticmethod
+    def parse_ranges(header, size):
+        """
+        Satisfiable (start, end) byte ranges, inclusive, sorted and merged.
+        None means "ignore the header and send everything" (absent,
+        malformed or abusive); [] means nothing is satisfiable (416).
+        """
+        units, _, spec = header.partition('=')
+        if units.strip().lower() != 'bytes' or not spec:
+            return None
+
+        specs = spec.split(',')
+        if len(specs) > BookFileDelivery.MAX_RANGES:
+            return None
+
+        ranges = []
+        for part in specs:
+            match = _RANGE_RE.match(part)
+            if not match or match.groups() == ('', ''):
+                return None
+            first, last = match.groups()
+            if first == '':
+                # Suffix range: the final N bytes
+                length = int(last)
+                if length == 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(first)
+                end   = min(int(last), size - 1) if last else size - 1
+                if last and int(last) < start:
+                    return None
+                if start >= size:
+                    continue
+            ranges.append((start, end))
+
+        ranges.sort()
+        merged = []
+        for start, end in ranges:
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    @staticmethod
+    def _if_range_matches(request, etag, last_modified):
+        """False when If-Range names an older version of the file."""
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range:
+            return True
+        if if_range.startswith(('"', 'W/')):
+            return if_range == etag
+        return parse_http_date_safe(if_range) == last_modified
+
+    @staticmethod
+    def _read_range(handle, start, end, close=False):
+        try:
+            handle.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = handle.read(min(BookFileDelivery.CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            if close:
+                handle.close()
+
+    @staticmethod
+    def _multipart(handle, ranges, size):
+        boundary = uuid.uuid4().hex
+        heads = [
+            (
+                f'--{boundary}\r\n'
+                f'Content-Type: application/pdf\r\n'
+                f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+            ).encode()
+            for start, end in ranges
+        ]
+        tail = f'--{boundary}--\r\n'.encode()
+
+        def body():
+            try:
+                for head, (start, end) in zip(heads, ranges):
+                    yield head
+                    yield from BookFileDelivery._read_range(handle, start, end)
+                    yield b'\r\n'
+                yield tail
+            finally:
+                handle.close()
+
+        response = StreamingHttpResponse(
+            body(), status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}',
+        )
+        response['Content-Length'] = str(
+            sum(len(head) + (end - start + 1) + 2 for head, (start, end) in zip(heads, ranges))
+            + len(tail)
+        )
+        return response
+
+    @staticmethod
+    def _with_headers(response, headers):
+        for name, value in headers.items():
+            response[name] = value
+        return response
@@ -0,0 +1,233 @@
+"""
+Shared HTTP client for Open Library.
+
+One module-level requests.Session keeps TLS connections to openlibrary.org
+alive across requests on a warm instance, retries connection errors and
+429/5xx responses with exponential backoff, and applies per-endpoint
+timeouts. Latency and error counters are kept per process.
+
+A circuit breaker whose state lives in the Django cache (so every instance
+sees it) stops calling upstream after repeated failures, then lets single
+probe requests through once the cooldown has passed.
+"""
+
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamMetrics:
+    """Thread-safe in-process counters for upstream calls."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, endpoint, elapsed_ms, ok):
+        with self._lock:
+            c = self._counters
+            c[f'{endpoint}.calls'] = c.get(f'{endpoint}.calls', 0) + 1
+            c[f'{endpoint}.latency_ms_total'] = c.get(f'{endpoint}.latency_ms_total', 0) + elapsed_ms
+            c[f'{endpoint}.latency_ms_max'] = max(c.get(f'{endpoint}.latency_ms_max', 0), elapsed_ms)
+            if not ok:
+                c[f'{endpoint}.errors'] = c.get(f'{endpoint}.errors', 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    closed    — calls go through; failures are counted in a rolling window.
+    open      — calls fail fast with CircuitOpenError until the cooldown ends.
+    half-open — after the cooldown one probe call at a time is let through;
+                success closes the breaker, failure re-opens it.
+
+    Any cache error fails open (calls go through), so a cache outage never
+    takes search down with it.
+    """
+
+    def __init__(self, name, failure_threshold=5, failure_window=60,
+                 cooldown=30, probe_timeout=15, metrics=None):
+        self.failure_threshold = failure_threshold
+        self.failure_window    = failure_window
+        self.cooldown          = cooldown
+        self.probe_timeout     = probe_timeout
+        self.metrics           = metrics or UpstreamMetrics()
+
+        self.failures_key   = f"breaker:{name}:failures"
+        self.open_until_key = f"breaker:{name}:open_until"
+        self.probe_key      = f"breaker:{name}:probe"
+
+    def state(self):
+        try:
+            open_until = cache.get(self.open_until_key)
+        except Exception:
+            return 'closed'
+        if open_until is None:
+            return 'closed'
+        return 'open' if time.time() < open_until else 'half_open'
+
+    def before_call(self):
+        """
+        Returns True if this call is a half-open probe.
+        Raises CircuitOpenError if the call must not go upstream.
+        """
+        state = self.state()
+        if state == 'closed':
+            return False
+        if state == 'half_open':
+            try:
+                if cache.add(self.probe_key, 1, timeout=self.probe_timeout):
+                    return True
+            except Exception:
+                return False
+        self.metrics.incr('breaker.short_circuits')
+        raise CircuitOpenError("Open Library circuit breaker is open")
+
+    def record_success(self, probe):
+        if not probe:
+            return
+        try:
+            cache.delete_many([self.failures_key, self.open_until_key, self.probe_key])
+        except Exception as exc:
+            logger.warning("Circuit breaker reset failed: %s", exc)
+        self.metrics.incr('breaker.closed')
+
+    def record_failure(self, probe):
+        try:
+            if probe:
+                self._open()
+                cache.delete(self.probe_key)
+                return
+            cache.add(self.failures_key, 0, timeout=self.failure_window)
+            if cache.incr(self.failures_key) >= self.failure_threshold:
+                self._open()
+                cache.delete(self.failures_key)
+        except Exception as exc:
+            logger.warning("Circuit breaker update failed: %s", exc)
+
+    def _open(self):
+        # Keep the marker well past the cooldown so the breaker half-opens
+        # (and probes) rather than silently closing when the key expires.
+        cache.set(
+            self.open_until_key,
+            time.time() + self.cooldown,
+            timeout=self.cooldown + self.failure_window * 10,
+        )
+        self.metrics.incr('breaker.opened')
+        logger.warning("Open Library circuit breaker opened for %ss", self.cooldown)
+
+
+class OpenLibraryClient:
+
+    # (connect, read) seconds per endpoint
+    TIMEOUTS = {
+        'search'  : (3.05, 10),
+        'work'    : (3.05, 4),
+        'author'  : (3.05, 3),
+        'editions': (3.05, 3),
+        'cover'   : (3.05, 10),
+    }
+    DEFAULT_TIMEOUT = (3.05, 5)
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, base_url, retries=2, backoff_factor=0.3, pool_size=10):
+        self.base_url = base_url.rstrip('/')
+        self.metrics  = UpstreamMetrics()
+        self.breaker  = CircuitBreaker('openlibrary', metrics=self.metrics)
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # a read timeout already cost the full budget — don't double it
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset({'GET'}),
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = 'Bud/1.0 (reading app)'
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_json(self, endpoint, path, params=None):
+        """
+        GET base_url + path and decode JSON.
+        Raises requests.RequestException on network errors, retries exhausted
+        or non-2xx responses, and its subclass CircuitOpenError without
+        calling upstream while the breaker is open.
+        """
+        # JSONDecodeError is a RequestException too
+        return self._get(endpoint, f"{self.base_url}{path}", params, lambda response: response.json())
+
+    def get_bytes(self, endpoint, url, params=None):
+        """GET an absolute Open Library URL (e.g. a cover image) and return its body; raises as get_json."""
+        return self._get(endpoint, url, params, lambda response: response.content)
+
+    def _get(self, endpoint, url, params, read):
+        probe   = self.breaker.before_call()
+        timeout = self.TIMEOUTS.get(endpoint, self.DEFAULT_TIMEOUT)
+        started = time.perf_counter()
+        ok      = False
+        healthy = False  # a 404 for an unknown work still means upstream is up
+        try:
+            response = self.session.get(url, params=params, timeout=timeout)
+            healthy  = response.status_code < 500 and response.status_code != 429
+            response.raise_for_status()
+            data = read(response)
+            ok = True
+            return data
+        finally:
+            if healthy:
+                self.breaker.record_success(probe)
+            else:
+                self.breaker.record_failure(probe)
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.metrics.observe(endpoint, elapsed_ms, ok)
+            if not ok:
+                logger.warning("Open Library %s failed after %.0f ms: %s", endpoint, elapsed_ms, url)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenLibraryClient(settings.OPEN_LIBRARY_BASE_URL)
+    return _client
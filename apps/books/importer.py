@@ -0,0 +1,346 @@
+"""
+Bulk catalog import from Open Library work ids and ISBNs.
+
+Identifiers are looked up in chunks through the search endpoint
+(`key:(...)` / `isbn:(...)` queries return the same rich docs as a normal
+search), with a bounded number of lookups in flight. Each batch is written
+with bulk inserts (books here, genres and through rows via GenreResolver)
+in one transaction that also advances the job's checkpoint, so an
+interrupted import resumes at the first uncommitted batch.
+"""
+
+import csv
+import functools
+import io
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .http_client import get_client
+from .models import Book, BookImportJob
+from .search import BookSearchService
+from .services import GenreResolver, OpenLibraryService
+
+logger = logging.getLogger(__name__)
+
+_ISBN_RE = re.compile(r'^(?:\d{9}[\dX]|\d{13})$')
+_WORK_RE = re.compile(r'\b(OL\d+W)\b', re.IGNORECASE)
+
+# Column names / JSON keys recognised as holding the identifier
+IDENTIFIER_FIELDS = ('work_id', 'isbn', 'isbn_13', 'isbn_10', 'key', 'id', 'identifier')
+
+SEARCH_FIELDS = (
+    'key,title,author_name,cover_i,isbn,subject,publisher,'
+    'first_publish_year,number_of_pages_median'
+)
+
+
+class BookImportService:
+
+    BATCH_SIZE   = 200   # identifiers per transaction / checkpoint
+    LOOKUP_CHUNK = 50    # identifiers per Open Library search call
+    CONCURRENCY  = 4     # lookups in flight at once
+    MAX_ERRORS   = 200   # per-identifier errors kept on the job
+
+    # Batches one web request may run when there is no worker (Vercel);
+    # the client resumes the job for the rest
+    REQUEST_BATCHES = 2
+
+    # ── Input ────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def parse_identifiers(stream, fmt='csv'):
+        """
+        Identifiers from a CSV (a recognised header column, else the first
+        column) or JSONL (bare strings or objects) text stream, de-duplicated
+        in input order.
+        """
+        if fmt == 'jsonl':
+            raw = BookImportService._parse_jsonl(stream)
+        else:
+            raw = BookImportService._parse_csv(stream)
+        return list(dict.fromkeys(value.strip() for value in raw if value and value.strip()))
+
+    @staticmethod
+    def _parse_csv(stream):
+        rows = csv.reader(stream)
+        first = next(rows, None)
+        if first is None:
+            return
+        header = [cell.strip().lower() for cell in first]
+        column = next((header.index(f) for f in IDENTIFIER_FIELDS if f in header), None)
+        if column is None:
+            column = 0
+            yield first[0] if first else ''
+        for row in rows:
+            if len(row) > column:
+                yield row[column]
+
+    @staticmethod
+    def _parse_jsonl(stream):
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, dict):
+                item = next((item[f] for f in IDENTIFIER_FIELDS if item.get(f)), '')
+            yield str(item)
+
+    @staticmethod
+    def format_for(filename):
+        return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+    @staticmethod
+    def create_job(stream=None, fmt='csv', user=None, source='', identifiers=None):
+        """
+        A pending BookImportJob from a text stream / raw bytes in `fmt`, or
+        from an already-parsed `identifiers` list.
+        """
+        if identifiers is None:
+            if isinstance(stream, (bytes, bytearray)):
+                stream = io.StringIO(stream.decode('utf-8-sig'))
+            identifiers = BookImportService.parse_identifiers(stream, fmt)
+        else:
+            identifiers = list(dict.fromkeys(
+                str(value).strip() for value in identifiers if str(value).strip()
+            ))
+        return BookImportJob.objects.create(
+            created_by  = user,
+            source      = source[:255],
+            identifiers = identifiers,
+        )
+
+    @staticmethod
+    def classify(identifier):
+        """('isbn', digits) | ('work', 'OL…W') | (None, identifier)."""
+        compact = re.sub(r'[\s-]', '', identifier).upper()
+        if _ISBN_RE.match(compact):
+            return 'isbn', compact
+        match = _WORK_RE.search(identifier)
+        if match:
+            return 'work', match.group(1).upper()
+        return None, identifier
+
+    # ── Run ──────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def run(job, batch_size=None, concurrency=None, progress=None, max_batches=None):
+        """
+        Import from job.cursor to the end, or for at most `max_batches`
+        batches (the job is then left pending). Upstream outages abort the
+        run without advancing the checkpoint; call run() again to resume.
+        `progress(job)` is called after every committed batch.
+        """
+        batch_size  = batch_size or BookImportService.BATCH_SIZE
+        concurrency = concurrency or BookImportService.CONCURRENCY
+
+        job.status = 'running'
+        job.save(update_fields=['status'])
+
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ol-import') as pool:
+                batches = 0
+                while job.cursor < job.total:
+                    if max_batches is not None and batches >= max_batches:
+                        job.status = 'pending'
+                        job.save(update_fields=['status'])
+                        return job
+                    batches += 1
+                    started = time.monotonic()
+                    batch   = job.identifiers[job.cursor:job.cursor + batch_size]
+                    records, errors = BookImportService._fetch_batch(pool, batch)
+
+                    with transaction.atomic():
+                        created_ids = BookImportService._write_batch(records, job.created_by)
+                        job.cursor          += len(batch)
+                        job.imported        += len(created_ids)
+                        job.skipped         += len(records) - len(created_ids)
+                        job.failed          += len(errors)
+                        job.errors           = (job.errors + errors)[:BookImportService.MAX_ERRORS]
+                        job.elapsed_seconds += time.monotonic() - started
+                        job.save(update_fields=[
+                            'cursor', 'imported', 'skipped', 'failed',
+                            'errors', 'elapsed_seconds',
+                        ])
+                        # bulk_create bypasses the post_save search signal
+                        transaction.on_commit(
+                            lambda ids=created_ids: BookSearchService.refresh(ids)
+                        )
+
+                    if progress:
+                        progress(job)
+        except Exception:
+            logger.exception("Book import %s stopped at %s/%s", job.pk, job.cursor, job.total)
+            job.status = 'failed'
+            job.save(update_fields=['status'])
+            raise
+
+        job.status      = 'completed'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at'])
+        return job
+
+    # ── Fetch ────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _fetch_batch(pool, batch):
+        """
+        ([records], [error dicts]) for one batch.
+        Lookup failures propagate so the batch is retried on resume.
+        """
+        works, isbns, errors = [], [], []
+        for identifier in batch:
+            kind, value = BookImportService.classify(identifier)
+            if kind == 'work':
+                works.append(value)
+            elif kind == 'isbn':
+                isbns.append(value)
+            else:
+                errors.append({'identifier': identifier, 'error': 'Not a work id or ISBN'})
+
+        chunk = BookImportService.LOOKUP_CHUNK
+        lookups = [
+            pool.submit(BookImportService._lookup, 'key', works[i:i + chunk])
+            for i in range(0, len(works), chunk)
+        ] + [
+            pool.submit(BookImportService._lookup, 'isbn', isbns[i:i + chunk])
+            for i in range(0, len(isbns), chunk)
+        ]
+
+        records = {}
+        missing_works = []
+        for future in lookups:
+            field, values, docs = future.result()
+            if field == 'key':
+                by_key = {doc.get('key', '').split('/')[-1]: doc for doc in docs}
+                for work_id in values:
+                    if work_id in by_key:
+                        records[work_id] = BookImportService._record(by_key[work_id])
+                    else:
+                        missing_works.append(work_id)
+            else:
+                by_isbn = {isbn: doc for doc in docs for isbn in doc.get('isbn', [])}
+                for isbn in values:
+                    if isbn in by_isbn:
+                        record = BookImportService._record(by_isbn[isbn], isbn)
+                        records.setdefault(record['google_books_id'], record)
+                    else:
+                        errors.append({'identifier': isbn, 'error': 'Not found on Open Library'})
+
+        # Works the search index doesn't know yet: per-work fetch
+        fetch = functools.partial(OpenLibraryService.fetch_by_id, strict=True)
+        for work_id, data in zip(missing_works, pool.map(fetch, missing_works)):
+            if data:
+                records[work_id] = data
+            else:
+                errors.append({'identifier': work_id, 'error': 'Not found on Open Library'})
+
+        return list(records.values()), errors
+
+    @staticmethod
+    def _lookup(field, values):
+        if field == 'key':
+            query = 'key:(' + ' OR '.join(f'/works/{v}' for v in values) + ')'
+        else:
+            query = 'isbn:(' + ' OR '.join(values) + ')'
+        data = get_client().get_json('search', '/search.json', params={
+            'q'     : query,
+            'fields': SEARCH_FIELDS,
+            'limit' : len(values),
+        })
+        return field, values, data.get('docs', [])
+
+    @staticmethod
+    def _record(doc, isbn=None):
+        record = OpenLibraryService._normalize(doc)
+        # Only trust the ISBN we were asked for — a work's doc lists every
+        # edition's ISBNs, and ours are unique per Book.
+        record['isbn_10'] = isbn if isbn and len(isbn) == 10 else None
+        record['isbn_13'] = isbn if isbn and len(isbn) == 13 else None
+        record['published_date'] = str(record['published_date'] or '')
+        return record
+
+    # ── Write ────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _write_batch(records, user=None):
+        """Insert books not already in the catalog; returns the new book ids."""
+        if not records:
+            return []
+
+        def keys(record):
+            return {
+                value for value in (
+                    record['google_books_id'], record.get('isbn_10'), record.get('isbn_13'),
+                ) if value
+            }
+
+        all_keys = set().union(*(keys(r) for r in records))
+        taken = set()
+        for row in Book.objects.filter(
+            Q(google_books_id__in=all_keys) | Q(isbn_10__in=all_keys) | Q(isbn_13__in=all_keys)
+        ).values_list('google_books_id', 'isbn_10', 'isbn_13'):
+            taken.update(filter(None, row))
+
+        new = [r for r in records if not keys(r) & taken]
+        if not new:
+            return []
+
+        books = [
+            Book(
+                title           = r['title'][:500],
+                author          = r['author'][:500],
+                isbn_10         = r.get('isbn_10') or None,
+                isbn_13         = r.get('isbn_13') or None,
+                total_pages     = r.get('total_pages') or 0,
+                cover_url       = r.get('cover_url', ''),
+                description     = r.get('description', ''),
+                publisher       = (r.get('publisher') or '')[:300],
+                published_date  = str(r.get('published_date') or '')[:20],
+                language        = r.get('language', 'en'),
+                google_books_id = r['google_books_id'],
+                added_by        = user,
+            )
+            for r in new
+        ]
+        try:
+            with transaction.atomic():
+                Book.objects.bulk_create(books)
+        except IntegrityError:
+            # Someone else added some of these since we looked: insert one
+            # at a time so only the rows we actually wrote count as imported
+            books = [book for book in books if BookImportService._insert(book)]
+
+        # Backends without RETURNING leave pks unset; every row here is ours
+        unsaved = [book.google_books_id for book in books if book.pk is None]
+        if unsaved:
+            fetched = dict(
+                Book.objects.filter(google_books_id__in=unsaved).values_list('google_books_id', 'id')
+            )
+            for book in books:
+                book.pk = book.pk or fetched.get(book.google_books_id)
+        book_ids = {book.google_books_id: book.pk for book in books if book.pk}
+
+        GenreResolver.link({
+            book_ids[r['google_books_id']]: r.get('categories', [])
+            for r in new if r['google_books_id'] in book_ids
+        })
+
+        return list(book_ids.values())
+
+    @staticmethod
+    def _insert(book):
+        """Insert one book in its own savepoint; False if it conflicts."""
+        try:
+            with transaction.atomic():
+                Book.objects.bulk_create([book])
+        except IntegrityError:
+            return False
+        return True
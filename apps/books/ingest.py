@@ -0,0 +1,164 @@
+"""
+Post-upload PDF ingestion.
+
+Each new Book.file is downloaded once (streamed to a temp file) and:
+  * hashed and de-duplicated against the content index (BookFileStore),
+  * read with pypdf for page count, document metadata and outline,
+  * optionally rewritten as a linearized ("fast web view") PDF, so viewers
+    can show the first page before the rest arrives (needs pikepdf, from
+    requirements-worker.txt, and settings.PDF_LINEARIZE).
+"""
+
+import logging
+import tempfile
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .dedup import BookFileStore
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pikepdf
+except ImportError:  # linearization is optional
+    pikepdf = None
+
+METADATA_FIELDS = ('title', 'author', 'subject', 'creator', 'producer')
+
+
+class BookIngestService:
+
+    # Outline entries kept per book (some PDFs have one per paragraph)
+    MAX_OUTLINE_ITEMS = 500
+
+    @staticmethod
+    def process(book, ingest=True, derive=True, force=False):
+        """
+        Download book.file once and run the pipeline on that copy: ingest,
+        then (with `derive`) searchable text, cover and page thumbnails.
+        """
+        from .rendering import BookRenderService
+        from .text import BookTextService
+
+        if not book.file:
+            return book
+
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as fh:
+            digest, size = BookFileStore.download(book.file.name, fh)
+            if ingest:
+                BookIngestService.ingest(book, fh, digest, size)
+            if derive:
+                BookTextService.extract(book, force=force, path=fh.name, digest=digest)
+                BookRenderService.render(book, path=fh.name, digest=digest)
+        return book
+
+    @staticmethod
+    def pending_derivatives():
+        """Books with a file but no extracted text or rendered images yet."""
+        from .models import Book
+
+        return (
+            Book.objects.exclude(file='').exclude(file__isnull=True)
+            .filter(Q(pdf_renders={}) | Q(text__isnull=True))
+            .order_by('pk')
+        )
+
+    @staticmethod
+    def ingest(book, fh=None, digest=None, size=None):
+        """
+        Run every ingestion step for book.file; returns the updated book.
+        `fh` (with its digest and size) is an already-downloaded copy.
+        """
+        if not book.file:
+            return book
+
+        if fh is None:
+            with tempfile.TemporaryFile() as fh:
+                digest, size = BookFileStore.download(book.file.name, fh)
+                return BookIngestService.ingest(book, fh, digest, size)
+
+        BookFileStore.dedupe_book(book, digest=digest, size=size)
+
+        fh.seek(0)
+        info = BookIngestService.read(fh)
+
+        if BookIngestService._should_linearize(info):
+            fh.seek(0)
+            BookIngestService._linearize(book, fh)
+            info['linearized'] = True
+
+        update_fields = ['pdf_metadata', 'pdf_outline', 'ingested_at', 'updated_at']
+        book.pdf_metadata = info['metadata'] | {'linearized': info['linearized']}
+        book.pdf_outline  = info['outline']
+        book.ingested_at  = timezone.now()
+        if not book.total_pages and info['page_count']:
+            book.total_pages = info['page_count']
+            update_fields.append('total_pages')
+        for field in ('title', 'author'):
+            if not getattr(book, field) and info['metadata'].get(field):
+                setattr(book, field, info['metadata'][field][:500])
+                update_fields.append(field)
+        book.save(update_fields=update_fields)
+        return book
+
+    @staticmethod
+    def read(fh):
+        """{'page_count', 'metadata', 'outline', 'linearized'} from a PDF file object."""
+        from pypdf import PdfReader
+
+        reader = PdfReader(fh)
+        metadata = {}
+        for field in METADATA_FIELDS:
+            value = getattr(reader.metadata, field, None) if reader.metadata else None
+            if value and str(value).strip():
+                metadata[field] = str(value).strip()
+
+        outline = []
+        try:
+            BookIngestService._flatten_outline(reader, reader.outline, 0, outline)
+        except Exception as exc:
+            # Broken outlines are common and never worth failing ingestion over
+            logger.info("Unreadable PDF outline: %s", exc)
+
+        fh.seek(0)
+        return {
+            'page_count': len(reader.pages),
+            'metadata'  : metadata,
+            'outline'   : outline,
+            'linearized': BookIngestService._is_linearized(fh),
+        }
+
+    @staticmethod
+    def _flatten_outline(reader, items, level, out):
+        """pypdf's nested outline as [{'title', 'page', 'level'}]."""
+        for item in items:
+            if len(out) >= BookIngestService.MAX_OUTLINE_ITEMS:
+                return
+            if isinstance(item, list):
+                BookIngestService._flatten_outline(reader, item, level + 1, out)
+                continue
+            page = reader.get_destination_page_number(item)
+            if page is None or page < 0:
+                continue
+            out.append({'title': str(item.title), 'page': page + 1, 'level': level})
+
+    @staticmethod
+    def _is_linearized(fh):
+        # A linearized PDF declares /Linearized in its first object
+        return b'/Linearized' in fh.read(1024)
+
+    @staticmethod
+    def _should_linearize(info):
+        return bool(settings.PDF_LINEARIZE and pikepdf is not None and not info['linearized'])
+
+    @staticmethod
+    def _linearize(book, fh):
+        with tempfile.TemporaryFile() as out:
+            with pikepdf.open(fh) as pdf:
+                pdf.save(out, linearize=True)
+            name = BookFileStore.store(out)
+        if name != book.file.name:
+            book.file.name = name
+            book.save(update_fields=['file', 'updated_at'])
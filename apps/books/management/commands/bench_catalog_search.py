@@ -0,0 +1,94 @@
+"""
+Management command to benchmark catalog search over a synthetic catalog.
+Usage: python manage.py bench_catalog_search --books 100000
+
+The synthetic books are inserted inside a transaction that is rolled back,
+so the command is safe to run against a development database.
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from apps.books.models import Book
+from apps.books.search import BookSearchService
+
+WORDS = (
+    'shadow river garden winter silent empire glass queen letters night '
+    'ocean fire house stone secret forest broken golden city journey '
+    'dragon memory island storm crown whisper mountain lost wild harbor'
+).split()
+FIRST_NAMES = 'Amara Chinua Grace Harper James Leo Maya Ngozi Oscar Ruth Sofia Tom'.split()
+LAST_NAMES = 'Achebe Adichie Baldwin Bronte Dickens Eliot Morrison Okri Orwell Woolf'.split()
+
+QUERIES = (
+    ('single word', 'dragon'),
+    ('prefix (type-ahead)', 'drag'),
+    ('two words', 'golden harbor'),
+    ('author', 'morrison'),
+    ('typo', 'dragn hrbor'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark catalog search against a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            self._populate(rng, options['books'])
+
+            self.stdout.write(f'{"query":<22} {"search ms":>10} {"icontains ms":>13} {"hits":>6}')
+            for label, query in QUERIES:
+                search_ms, hits = self._time(
+                    lambda: list(BookSearchService.search(Book.objects.all(), query)[:20]),
+                    options['repeat'],
+                )
+                legacy_ms, _ = self._time(
+                    lambda: list(Book.objects.filter(
+                        Q(title__icontains=query) | Q(author__icontains=query)
+                    )[:20]),
+                    options['repeat'],
+                )
+                self.stdout.write(f'{label:<22} {search_ms:>10.1f} {legacy_ms:>13.1f} {hits:>6}')
+
+            transaction.set_rollback(True)
+
+    def _populate(self, rng, count):
+        self.stdout.write(f'Inserting {count} synthetic books...')
+        started = time.perf_counter()
+        Book.objects.bulk_create(
+            (
+                Book(
+                    title=' '.join(rng.sample(WORDS, rng.randint(2, 4))).title(),
+                    author=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    description=' '.join(rng.choices(WORDS, k=20)),
+                )
+                for _ in range(count)
+            ),
+            batch_size=5000,
+        )
+        BookSearchService.refresh()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(Book._meta.db_table)}')
+        self.stdout.write(f'Catalog ready in {time.perf_counter() - started:.1f}s\n')
+
+    @staticmethod
+    def _time(fn, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result  = fn()
+            elapsed = (time.perf_counter() - started) * 1000
+            best    = elapsed if best is None else min(best, elapsed)
+        return best, len(result)
@@ -0,0 +1,47 @@
+"""
+Management command to move book covers off Open Library.
+Usage: python manage.py cache_book_covers
+
+Fetches every Open Library cover still referenced by a book (directly or
+through the cover proxy) into our storage once, resized, and rewrites the
+books' cover_url to the stored variant.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.books.covers import BookCoverService
+from apps.books.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Cache Open Library covers in storage and point books at them'
+
+    def handle(self, *args, **options):
+        upstream = Book.objects.filter(
+            Q(cover_url__contains='covers.openlibrary.org') | Q(cover_url__contains='/books/covers/')
+        )
+        urls = upstream.values_list('cover_url', flat=True)
+        cover_ids = sorted({parsed[0] for parsed in map(BookCoverService.parse, urls) if parsed})
+
+        cached = missing = failed = 0
+        for cover_id in cover_ids:
+            try:
+                if BookCoverService.stored(cover_id):
+                    BookCoverService.rewrite_books(cover_id)
+                    cached += 1
+                    continue
+                found = BookCoverService.fetch(cover_id)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'  cover {cover_id} — {exc}')
+                continue
+            if found:
+                cached += 1
+            elif found is False:
+                missing += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{cached} covers cached, {missing} missing upstream, {failed} failed; '
+            f'{upstream.count()} books still use Open Library covers.'
+        ))
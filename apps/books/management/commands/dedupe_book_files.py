@@ -0,0 +1,33 @@
+"""
+Management command to index existing book PDFs by content hash.
+Usage: python manage.py dedupe_book_files
+
+Hashes every stored book file (streaming, one chunk at a time), records it
+in the BookFileBlob index and repoints books whose file duplicates one
+already indexed, deleting the redundant object.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.books.dedup import BookFileStore
+from apps.books.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Index book PDFs by SHA-256 and share identical files'
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(file='').exclude(file__isnull=True).order_by('pk')
+        checked = repointed = 0
+        for book in books.iterator():
+            try:
+                if BookFileStore.dedupe_book(book):
+                    repointed += 1
+                    self.stdout.write(f'  {book.pk}: {book.title} → {book.file.name}')
+            except Exception as exc:
+                self.stderr.write(f'  {book.pk}: {book.title} — {exc}')
+            checked += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} book files, {repointed} deduplicated.'
+        ))
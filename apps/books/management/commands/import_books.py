@@ -0,0 +1,79 @@
+"""
+Management command to bulk-import books from Open Library.
+Usage: python manage.py import_books works.csv
+       python manage.py import_books isbns.jsonl --concurrency 8
+       python manage.py import_books --resume 12
+
+The input is a CSV (a work_id / isbn / key column, else the first column)
+or JSONL file of Open Library work ids and/or ISBNs. Progress is
+checkpointed after every batch; an interrupted import is continued with
+--resume <job id>.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.books.importer import BookImportService
+from apps.books.models import BookImportJob
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import books from a CSV/JSONL list of Open Library work ids or ISBNs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?')
+        parser.add_argument('--format', choices=('csv', 'jsonl'))
+        parser.add_argument('--resume', type=int, metavar='JOB_ID')
+        parser.add_argument('--user', help='Email of the user recorded as added_by')
+        parser.add_argument('--batch-size', type=int, default=BookImportService.BATCH_SIZE)
+        parser.add_argument('--concurrency', type=int, default=BookImportService.CONCURRENCY)
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            job = BookImportJob.objects.filter(pk=options['resume']).first()
+            if job is None:
+                raise CommandError(f"No import job {options['resume']}")
+            if job.status == 'completed':
+                self.stdout.write(f'{job} is already complete.')
+                return
+            self.stdout.write(f'Resuming {job}')
+        elif options['path']:
+            user = None
+            if options['user']:
+                user = get_user_model().objects.filter(email=options['user']).first()
+                if user is None:
+                    raise CommandError(f"No user with email {options['user']}")
+            fmt = options['format'] or BookImportService.format_for(options['path'])
+            with open(options['path'], encoding='utf-8-sig', newline='') as fh:
+                job = BookImportService.create_job(fh, fmt, user=user, source=options['path'])
+            self.stdout.write(f'Created import job #{job.pk} with {job.total} identifiers')
+        else:
+            raise CommandError('Give a file to import or --resume <job id>')
+
+        try:
+            BookImportService.run(
+                job,
+                batch_size  = options['batch_size'],
+                concurrency = options['concurrency'],
+                progress    = self._progress,
+            )
+        except Exception as exc:
+            raise CommandError(
+                f'Import #{job.pk} stopped at {job.cursor}/{job.total}: {exc}. '
+                f'Re-run with --resume {job.pk} to continue.'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Import #{job.pk} done: {job.imported} imported, {job.skipped} already '
+            f'in catalog, {job.failed} failed of {job.total} in '
+            f'{job.elapsed_seconds:.1f}s ({job.throughput} books/s)'
+        ))
+        for error in job.errors[:20]:
+            self.stdout.write(f"  {error['identifier']}: {error['error']}")
+
+    def _progress(self, job):
+        rate = job.cursor / job.elapsed_seconds if job.elapsed_seconds else 0
+        self.stdout.write(
+            f'  {job.cursor}/{job.total}  imported={job.imported} '
+            f'skipped={job.skipped} failed={job.failed}  {rate:.1f} ids/s'
+        )
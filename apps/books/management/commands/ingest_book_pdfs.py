@@ -0,0 +1,40 @@
+"""
+Management command to run PDF ingestion for books that haven't had it.
+Usage: python manage.py ingest_book_pdfs
+       python manage.py ingest_book_pdfs --force   # re-ingest every PDF
+
+Fills page counts, PDF metadata and outlines (and linearizes, when
+PDF_LINEARIZE is on), then extracts searchable text and renders covers and
+page thumbnails, for books uploaded before ingestion existed or whose
+background ingestion failed.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.books.ingest import BookIngestService
+from apps.books.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Extract page count, metadata, outline and text from book PDFs and render covers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-ingest already ingested PDFs')
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(file='').exclude(file__isnull=True).order_by('pk')
+        if not options['force']:
+            books = books.filter(Q(ingested_at__isnull=True) | Q(pdf_renders={}) | Q(text__isnull=True))
+
+        done = failed = 0
+        for book in books.iterator():
+            try:
+                BookIngestService.process(book, force=options['force'])
+                done += 1
+                self.stdout.write(f'  {book.pk}: {book.title} — {book.total_pages} pages')
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'  {book.pk}: {book.title} — {exc}')
+
+        self.stdout.write(self.style.SUCCESS(f'Ingested {done} PDFs, {failed} failed.'))
@@ -0,0 +1,63 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:05
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    """GIN indexes and initial vectors — Postgres only, SQLite uses icontains."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS books_book_search_vector_gin "
+        "ON books_book USING gin (search_vector);"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS books_book_title_trgm "
+        "ON books_book USING gin (title gin_trgm_ops);"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS books_book_author_trgm "
+        "ON books_book USING gin (author gin_trgm_ops);"
+    )
+    schema_editor.execute("""
+        UPDATE books_book SET search_vector =
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(author, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce((
+                SELECT string_agg(g.name, ' ')
+                FROM books_genre g
+                JOIN books_book_genres bg ON bg.genre_id = g.id
+                WHERE bg.book_id = books_book.id
+            ), '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'C');
+    """)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS books_book_search_vector_gin;")
+    schema_editor.execute("DROP INDEX IF EXISTS books_book_title_trgm;")
+    schema_editor.execute("DROP INDEX IF EXISTS books_book_author_trgm;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_alter_file_column_sql'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(
+            create_search_indexes,
+            reverse_code=drop_search_indexes,
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_bookfileblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='ingested_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='pdf_metadata',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='pdf_outline',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
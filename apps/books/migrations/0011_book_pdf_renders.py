@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_book_ingested_at_book_pdf_metadata_book_pdf_outline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='pdf_renders',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:20
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_text_index(apps, schema_editor):
+    """GIN index over page vectors — Postgres only, SQLite scans the text."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS books_booktextpage_search_vector_gin "
+        "ON books_booktextpage USING gin (search_vector);"
+    )
+
+
+def drop_text_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS books_booktextpage_search_vector_gin;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_book_pdf_renders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('pages', models.BinaryField()),
+                ('page_count', models.PositiveIntegerField(default=0)),
+                ('char_count', models.PositiveIntegerField(default=0)),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='text', to='books.book')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookTextPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.PositiveIntegerField()),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(blank=True, null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='text_pages', to='books.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('book', 'page'), name='unique_book_text_page')],
+            },
+        ),
+        migrations.RunPython(
+            create_text_index,
+            reverse_code=drop_text_index,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:05
+
+import apps.books.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_booktext_booktextpage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='cover_url',
+            field=models.CharField(blank=True, default='', max_length=500, validators=[apps.books.models.validate_cover_url]),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-18 19:40
+
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Concat
+
+
+def absolute_cover_urls(apps, schema_editor):
+    """Site-relative cover URLs (proxy, stored covers) onto settings.SITE_URL."""
+    Book = apps.get_model('books', 'Book')
+    Book.objects.filter(cover_url__startswith='/').exclude(cover_url__startswith='//').update(
+        cover_url=Concat(models.Value(urljoin(settings.SITE_URL, '/').rstrip('/')), 'cover_url'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_book_cover_url_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(absolute_cover_urls, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='book',
+            name='cover_url',
+            field=models.URLField(blank=True, default='', max_length=500),
+        ),
+    ]
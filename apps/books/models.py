@@ -1,9 +1,24 @@
 from django.conf import settings
-from django.core.validators import FileExtensionValidator
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
+from django.core.validators import FileExtensionValidator, URLValidator
 from django.db import models
 from django.utils.text import slugify
 
 
+def validate_cover_url(value):
+    """
+    An absolute http(s) URL, or a path on this site. No longer used by
+    Book.cover_url (always absolute now); kept for migration 0013.
+    """
+    if value.startswith('/') and not value.startswith('//'):
+        return
+    try:
+        URLValidator(schemes=['http', 'https'])(value)
+    except ValidationError:
+        raise ValidationError('Enter a valid URL or a path starting with "/".', code='invalid')
+
+
 class Genre(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
@@ -38,6 +53,14 @@ class Book(models.Model):
         validators=[FileExtensionValidator(['pdf'])],
     )
     genres = models.ManyToManyField(Genre, blank=True, related_name='books')
+    # Maintained by BookSearchService.refresh — see apps/books/search.py
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    # Filled in from the PDF by BookIngestService — see apps/books/ingest.py
+    pdf_metadata = models.JSONField(default=dict, blank=True, editable=False)
+    pdf_outline = models.JSONField(default=list, blank=True, editable=False)
+    ingested_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Cover/thumbnail layout written by BookRenderService — see apps/books/rendering.py
+    pdf_renders = models.JSONField(default=dict, blank=True, editable=False)
     added_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -53,3 +76,147 @@ class Book(models.Model):
 
     def __str__(self):
         return f"{self.title} by {self.author}"
+
+
+class BookImportJob(models.Model):
+    """A bulk catalog import; `cursor` is the resume checkpoint."""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='book_imports',
+    )
+    source = models.CharField(max_length=255, blank=True, default='')
+    # Open Library work ids / ISBNs, in input order
+    identifiers = models.JSONField(default=list)
+    # Number of identifiers already committed
+    cursor = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    imported = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    elapsed_seconds = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.cursor}/{len(self.identifiers)}, {self.status})"
+
+    @property
+    def total(self):
+        return len(self.identifiers)
+
+    @property
+    def throughput(self):
+        """Books imported per second of fetch-and-write time."""
+        if not self.elapsed_seconds:
+            return 0.0
+        return round(self.imported / self.elapsed_seconds, 2)
+
+
+class BookUpload(models.Model):
+    """
+    A resumable, multipart PDF upload. Parts go straight to storage; the
+    file is attached to `book` (or a new Book is created from title/author)
+    only when the upload is completed.
+    """
+
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('completed', 'Completed'),
+        ('aborted', 'Aborted'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='book_uploads',
+    )
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='uploads',
+    )
+    title = models.CharField(max_length=500, blank=True, default='')
+    author = models.CharField(max_length=500, blank=True, default='')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    part_size = models.PositiveIntegerField()
+    # Storage name the finished file will have
+    key = models.CharField(max_length=500)
+    # Storage-side multipart upload id (S3), or a local stand-in id
+    upload_id = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+    @property
+    def part_count(self):
+        return max(1, -(-self.size // self.part_size))
+
+
+class BookFileBlob(models.Model):
+    """Content-address index: one stored PDF object per distinct SHA-256."""
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=500)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]}… → {self.name}"
+
+
+class BookText(models.Model):
+    """
+    Text extracted from a book's PDF, one entry per page, stored as a
+    zlib-compressed JSON list — see apps/books/text.py.
+    """
+
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, related_name='text')
+    # Content hash of the file the text came from; unchanged means no re-extract
+    sha256 = models.CharField(max_length=64)
+    pages = models.BinaryField()
+    page_count = models.PositiveIntegerField(default=0)
+    char_count = models.PositiveIntegerField(default=0)
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Text of {self.book} ({self.page_count} pages)"
+
+
+class BookTextPage(models.Model):
+    """Per-page full-text vectors for in-book search (Postgres only, GIN-indexed)."""
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='text_pages')
+    page = models.PositiveIntegerField()
+    search_vector = SearchVectorField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'page'], name='unique_book_text_page'),
+        ]
+
+    def __str__(self):
+        return f"{self.book} p.{self.page}"
@@ -0,0 +1,189 @@
+"""
+Cover and page-thumbnail rendering for book PDFs.
+
+Pages are rasterised with pypdfium2 in a bounded process pool (a PDF
+page can take hundreds of ms and a lot of memory to render) and stored in
+the default storage under keys derived from the file's content hash:
+
+    books/renders/<sha256>/cover-<width>.webp
+    books/renders/<sha256>/page-<n>-<width>.webp
+
+so identical PDFs share their images and re-rendering is a no-op. The
+layout is recorded in Book.pdf_renders for the detail serializer.
+"""
+
+import io
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .dedup import BookFileStore
+from .models import Book, BookFileBlob
+
+logger = logging.getLogger(__name__)
+
+
+def _render_pages(path, pages, widths, image_format, quality):
+    """
+    Worker: [(page, width, image bytes)] for 1-based `pages` of the PDF at
+    `path`, each rendered once at the largest width and downscaled.
+    """
+    import pypdfium2 as pdfium
+
+    results = []
+    pdf = pdfium.PdfDocument(path)
+    try:
+        for number in pages:
+            page  = pdf[number - 1]
+            scale = max(widths) / page.get_width()
+            image = page.render(scale=scale).to_pil().convert('RGB')
+            page.close()
+            for width in sorted(widths, reverse=True):
+                if image.width > width:
+                    image = image.resize((width, round(image.height * width / image.width)))
+                buf = io.BytesIO()
+                image.save(buf, image_format, quality=quality)
+                results.append((number, width, buf.getvalue()))
+    finally:
+        pdf.close()
+    return results
+
+
+class BookRenderService:
+
+    COVER_WIDTHS = (320, 640)
+    THUMB_WIDTHS = (96, 192)
+    IMAGE_FORMAT = 'WEBP'
+    QUALITY      = 70
+    # Pages handed to a worker at a time
+    CHUNK_PAGES  = 16
+
+    @staticmethod
+    def prefix(digest):
+        return f"books/renders/{digest}/"
+
+    @staticmethod
+    def cover_key(prefix, width):
+        return f"{prefix}cover-{width}.webp"
+
+    @staticmethod
+    def page_key(prefix, page, width):
+        return f"{prefix}page-{page}-{width}.webp"
+
+    @staticmethod
+    def render(book, path=None, digest=None):
+        """
+        Render the cover and page thumbnails for book.file; returns the book.
+        `path` and `digest` name an already-downloaded copy.
+        """
+        if not book.file:
+            return book
+
+        blob = BookFileBlob.objects.filter(name=book.file.name).first()
+        if blob is not None:
+            # Same bytes as a book that's already rendered — reuse its images
+            shared = Book.objects.filter(
+                pdf_renders__prefix=BookRenderService.prefix(blob.sha256),
+            ).exclude(pk=book.pk).values_list('pdf_renders', flat=True).first()
+            if shared:
+                return BookRenderService._attach(book, shared)
+
+        if path is None:
+            with tempfile.NamedTemporaryFile(suffix='.pdf') as fh:
+                digest, _ = BookFileStore.download(book.file.name, fh)
+                return BookRenderService._render_file(book, fh.name, blob.sha256 if blob else digest)
+        return BookRenderService._render_file(book, path, blob.sha256 if blob else digest)
+
+    @staticmethod
+    def _render_file(book, path, digest):
+        import pypdfium2 as pdfium
+
+        prefix = BookRenderService.prefix(digest)
+        pdf = pdfium.PdfDocument(path)
+        page_count = len(pdf)
+        pdf.close()
+
+        limit = settings.PDF_THUMBNAIL_MAX_PAGES
+        thumb_pages = page_count if not limit else min(page_count, limit)
+
+        jobs = [([1], BookRenderService.COVER_WIDTHS)]
+        pages = list(range(1, thumb_pages + 1))
+        for i in range(0, len(pages), BookRenderService.CHUNK_PAGES):
+            jobs.append((pages[i:i + BookRenderService.CHUNK_PAGES], BookRenderService.THUMB_WIDTHS))
+
+        for cover, results in BookRenderService._run_jobs(path, jobs):
+            for page, width, data in results:
+                key = (
+                    BookRenderService.cover_key(prefix, width) if cover
+                    else BookRenderService.page_key(prefix, page, width)
+                )
+                if not default_storage.exists(key):
+                    default_storage.save(key, ContentFile(data))
+
+        return BookRenderService._attach(book, {
+            'prefix'      : prefix,
+            'pages'       : thumb_pages,
+            'widths'      : list(BookRenderService.THUMB_WIDTHS),
+            'cover_widths': list(BookRenderService.COVER_WIDTHS),
+        })
+
+    @staticmethod
+    def _attach(book, renders):
+        book.pdf_renders = renders
+        update_fields = ['pdf_renders', 'updated_at']
+        if not book.cover_url:
+            from .covers import BookCoverService
+
+            book.cover_url = BookCoverService.absolute(default_storage.url(
+                BookRenderService.cover_key(renders['prefix'], max(renders['cover_widths']))
+            ))
+            update_fields.append('cover_url')
+        book.save(update_fields=update_fields)
+        return book
+
+    @staticmethod
+    def _run_jobs(path, jobs):
+        """
+        Yield (is_cover, results) per job, rendered in a process pool of
+        settings.PDF_RENDER_WORKERS — or inline where the pool can't start
+        (workers = 0, daemonic Celery prefork children, serverless sandboxes).
+        """
+        args = (BookRenderService.IMAGE_FORMAT, BookRenderService.QUALITY)
+        workers = settings.PDF_RENDER_WORKERS
+        if workers:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {
+                        pool.submit(_render_pages, path, pages, widths, *args): index == 0
+                        for index, (pages, widths) in enumerate(jobs)
+                    }
+                    for future in as_completed(futures):
+                        yield futures[future], future.result()
+                return
+            except (AssertionError, NotImplementedError, OSError) as exc:
+                logger.info("Render pool unavailable (%s); rendering inline", exc)
+
+        for index, (pages, widths) in enumerate(jobs):
+            yield index == 0, _render_pages(path, pages, widths, *args)
+
+    @staticmethod
+    def urls(book):
+        """Cover and thumbnail URLs for the detail serializer, or None."""
+        renders = book.pdf_renders
+        if not renders:
+            return None
+        prefix = renders['prefix']
+        return {
+            'cover': {
+                str(width): default_storage.url(BookRenderService.cover_key(prefix, width))
+                for width in renders['cover_widths']
+            },
+            # Page n at width w: base_url + f'page-{n}-{w}.webp'
+            'base_url': default_storage.url(prefix),
+            'pages'   : renders['pages'],
+            'widths'  : renders['widths'],
+        }
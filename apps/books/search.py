@@ -0,0 +1,127 @@
+"""
+Catalog search.
+
+On Postgres every book carries a weighted tsvector — title and author (A),
+genre names (B), description (C) — kept current by apps.books.signals and
+backed by a GIN index. Queries use prefix matching so type-ahead works on
+partial words, are ranked with ts_rank, and fall back to trigram word
+similarity on title/author when nothing matches (typos).
+
+Other backends (SQLite in development) get an icontains filter over the
+same fields, so the API behaves the same minus ranking quality.
+"""
+
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Book, Genre
+
+# Only word characters reach to_tsquery, so user input can never inject
+# tsquery operators.
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class BookSearchService:
+
+    SEARCH_CONFIG = 'simple'
+
+    @staticmethod
+    def _refresh_sql(where=''):
+        book_table    = connection.ops.quote_name(Book._meta.db_table)
+        genre_table   = connection.ops.quote_name(Genre._meta.db_table)
+        through_table = connection.ops.quote_name(Book.genres.through._meta.db_table)
+        return f"""
+            UPDATE {book_table} SET search_vector =
+                setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(author, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce((
+                    SELECT string_agg(g.name, ' ')
+                    FROM {genre_table} g
+                    JOIN {through_table} bg ON bg.genre_id = g.id
+                    WHERE bg.book_id = {book_table}.id
+                ), '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+            {where}
+        """
+
+    @staticmethod
+    def refresh(book_ids=None):
+        """
+        Recompute search vectors for the given books (all books if None).
+        A no-op outside Postgres.
+        """
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            if book_ids is None:
+                cursor.execute(BookSearchService._refresh_sql())
+            elif book_ids:
+                cursor.execute(
+                    BookSearchService._refresh_sql('WHERE id = ANY(%s)'),
+                    [list(book_ids)],
+                )
+
+    @staticmethod
+    def terms(query):
+        return _TERM_RE.findall(query or '')
+
+    @staticmethod
+    def search(queryset, query):
+        """Filter and rank `queryset` by `query`. Blank queries pass through."""
+        terms = BookSearchService.terms(query)
+        if not terms:
+            return queryset
+        if connection.vendor == 'postgresql':
+            return BookSearchService._search_postgres(queryset, query, terms)
+        return BookSearchService._search_fallback(queryset, terms)
+
+    @staticmethod
+    def _search_postgres(queryset, query, terms):
+        # "harry pot" → "harry:* & pot:*" so the last, half-typed word matches
+        tsquery = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms),
+            config=BookSearchService.SEARCH_CONFIG,
+            search_type='raw',
+        )
+        matches = (
+            queryset
+            .filter(search_vector=tsquery)
+            .annotate(rank=SearchRank(F('search_vector'), tsquery))
+            .order_by('-rank', '-created_at')
+        )
+        if matches.exists():
+            return matches
+
+        return (
+            queryset
+            .filter(Q(title__trigram_word_similar=query) | Q(author__trigram_word_similar=query))
+            .annotate(rank=Greatest(
+                TrigramWordSimilarity(query, 'title'),
+                TrigramWordSimilarity(query, 'author'),
+            ))
+            .order_by('-rank', '-created_at')
+        )
+
+    @staticmethod
+    def _search_fallback(queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term)
+                | Q(author__icontains=term)
+                | Q(description__icontains=term)
+                | Q(genres__name__icontains=term)
+            )
+        return (
+            queryset
+            .annotate(rank=Case(
+                When(title__istartswith=terms[0], then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+            .order_by('-rank', '-created_at')
+            .distinct()
+        )
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from .models import Book, Genre
+from .models import Book, BookImportJob, BookUpload, Genre
 
 
 class GenreSerializer(serializers.ModelSerializer):
@@ -32,6 +32,7 @@ class BookListSerializer(serializers.ModelSerializer):
 class BookDetailSerializer(serializers.ModelSerializer):
     genres = GenreSerializer(many=True, read_only=True)
     file = serializers.SerializerMethodField()
+    renders = serializers.SerializerMethodField()
 
     class Meta:
         model = Book
@@ -40,8 +41,9 @@ class BookDetailSerializer(serializers.ModelSerializer):
             'total_pages', 'cover_url', 'description', 'publisher',
             'published_date', 'language', 'google_books_id',
             'genres', 'added_by', 'created_at', 'updated_at', 'file',
+            'pdf_outline', 'renders',
         )
-        read_only_fields = ('added_by', 'created_at', 'updated_at')
+        read_only_fields = ('added_by', 'created_at', 'updated_at', 'pdf_outline')
 
     def get_file(self, obj):
         """Return file URL if it exists, otherwise None"""
@@ -49,6 +51,12 @@ class BookDetailSerializer(serializers.ModelSerializer):
             return obj.file.url
         return None
 
+    def get_renders(self, obj):
+        """Cover and page-thumbnail URLs, once the PDF has been rendered"""
+        from .rendering import BookRenderService
+
+        return BookRenderService.urls(obj)
+
 
 class BookFileUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
@@ -67,3 +75,30 @@ class GoogleBookResultSerializer(serializers.Serializer):
     published_date = serializers.CharField(allow_blank=True)
     language = serializers.CharField()
     categories = serializers.ListField(child=serializers.CharField(), required=False)
+    in_catalog = serializers.BooleanField(default=False)
+
+
+class BookImportJobSerializer(serializers.ModelSerializer):
+    total = serializers.IntegerField(read_only=True)
+    throughput = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = BookImportJob
+        fields = (
+            'id', 'source', 'status', 'total', 'cursor', 'imported',
+            'skipped', 'failed', 'errors', 'elapsed_seconds', 'throughput',
+            'created_at', 'finished_at',
+        )
+        read_only_fields = fields
+
+
+class BookUploadSerializer(serializers.ModelSerializer):
+    part_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = BookUpload
+        fields = (
+            'id', 'book', 'title', 'author', 'filename', 'size',
+            'part_size', 'part_count', 'status', 'created_at', 'completed_at',
+        )
+        read_only_fields = fields
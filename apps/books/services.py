@@ -1,23 +1,67 @@
+import hashlib
 import logging
-import urllib.parse
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import requests
 
 from django.core.cache import cache
+from django.db import close_old_connections, transaction
 from django.db.models import Q
+from django.utils.text import slugify
 
+from .http_client import CircuitOpenError, get_client
 from .models import Book, Genre
+from .search import BookSearchService
 
 logger = logging.getLogger(__name__)
 
+# Shared across requests on a warm instance; lookups that outlive their
+# caller's deadline finish here in the background and are discarded.
+_FANOUT_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ol-fanout')
+
+# Vercel freezes the function once the response is sent, so work left on
+# the pool afterwards may never finish.
+_ON_VERCEL = bool(os.environ.get('VERCEL'))
+
+
+def _submit(fn, *args):
+    """Run fn on the fan-out pool, closing any DB connection it opened."""
+    def task():
+        close_old_connections()
+        try:
+            return fn(*args)
+        finally:
+            close_old_connections()
+    return _FANOUT_POOL.submit(task)
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]+', re.UNICODE)
+
 
 class GoogleBooksAPIError(Exception):
-    """Raised when the Google Books API call fails."""
+    """Raised when external book search is unavailable (surfaced as a 503)."""
 
 
 class OpenLibraryService:
 
-    BASE_URL = "https://openlibrary.org/search.json"
-    BASE_WORK_URL = "https://openlibrary.org/works"
+    # Overall budget for fetch_by_id (work + concurrent author/editions)
+    FETCH_DEADLINE_SECONDS = 5
+
+    # Single-flight search: the lock outlives the slowest upstream call
+    # (10s read timeout plus retries); followers give up a bit earlier.
+    SINGLE_FLIGHT_LOCK_SECONDS = 15
+    SINGLE_FLIGHT_WAIT_SECONDS = 12
+
+    # (soft, hard) TTLs in seconds for cached search envelopes
+    SEARCH_TTLS          = (60 * 30, 60 * 60 * 24)
+    NEGATIVE_SEARCH_TTLS = (60 * 2, 60 * 10)
+
+    # A failed upstream search is remembered this long, so followers and
+    # retries get the leader's outcome instead of all going upstream
+    FAILED_SEARCH_SECONDS = 10
 
     @staticmethod
     def _safe_cache_get(key, default=None):
@@ -27,6 +71,14 @@ class OpenLibraryService:
             logger.warning("Cache read failed for key %s: %s", key, exc)
             return default
 
+    @staticmethod
+    def _safe_cache_get_many(keys):
+        try:
+            return cache.get_many(keys)
+        except Exception as exc:
+            logger.warning("Cache read failed for keys %s: %s", keys, exc)
+            return {}
+
     @staticmethod
     def _safe_cache_set(key, value, timeout=None):
         try:
@@ -34,28 +86,178 @@ class OpenLibraryService:
         except Exception as exc:
             logger.warning("Cache write failed for key %s: %s", key, exc)
 
+    @staticmethod
+    def _safe_cache_add(key, value, timeout=None):
+        """cache.add, treating an unreachable cache as a successful add."""
+        try:
+            return cache.add(key, value, timeout=timeout)
+        except Exception as exc:
+            logger.warning("Cache add failed for key %s: %s", key, exc)
+            return True
+
+    @staticmethod
+    def _safe_cache_delete(key):
+        try:
+            cache.delete(key)
+        except Exception as exc:
+            logger.warning("Cache delete failed for key %s: %s", key, exc)
+
+    @staticmethod
+    def normalize_query(query):
+        """Case-fold, drop punctuation and collapse whitespace."""
+        text = unicodedata.normalize('NFKC', query or '').casefold()
+        return ' '.join(_PUNCTUATION_RE.sub(' ', text).split())
+
+    @staticmethod
+    def _search_cache_key(normalized, max_results):
+        digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        return f"ol_search:v2:{digest}:{max_results}"
+
     @staticmethod
     def search(query, max_results=10):
-        cache_key = f"ol_search:{query.lower()}:{max_results}"
-        cached = OpenLibraryService._safe_cache_get(cache_key)
-        if cached:
-            return cached
+        """
+        Cached Open Library search.
 
-        params = {'q': query, 'limit': max_results}
-        url = f"{OpenLibraryService.BASE_URL}?{urllib.parse.urlencode(params)}"
+        Entries are envelopes {'results', 'fresh_until'}: past fresh_until
+        (soft TTL) the stale results are still served while one request
+        refreshes them in the background (inline on Vercel, where there is
+        no background after the response); the cache timeout is the hard
+        TTL. Empty result lists are cached too, with shorter TTLs.
+        """
+        normalized = OpenLibraryService.normalize_query(query)
+        if not normalized:
+            return []
+
+        cache_key  = OpenLibraryService._search_cache_key(normalized, max_results)
+        lock_key   = f"{cache_key}:lock"
+        failed_key = f"{cache_key}:failed"
+
+        found    = OpenLibraryService._safe_cache_get_many([cache_key, failed_key])
+        envelope = found.get(cache_key)
+        if envelope is not None:
+            # While the breaker is open a refresh can't reach upstream —
+            # just keep serving the stale entry
+            if (
+                time.time() >= envelope['fresh_until']
+                and get_client().breaker.state() != 'open'
+                and OpenLibraryService._safe_cache_add(
+                    lock_key, 1, timeout=OpenLibraryService.SINGLE_FLIGHT_LOCK_SECONDS,
+                )
+            ):
+                if _ON_VERCEL:
+                    # No background to refresh in — do it in this request
+                    get_client().metrics.incr('search.refreshed_inline')
+                    results = OpenLibraryService._refresh_search(
+                        normalized, max_results, cache_key, lock_key,
+                    )
+                    return envelope['results'] if results is None else results
+                get_client().metrics.incr('search.stale_served')
+                _submit(
+                    OpenLibraryService._refresh_search,
+                    normalized, max_results, cache_key, lock_key,
+                )
+            return envelope['results']
+
+        if failed_key in found:
+            get_client().metrics.incr('search.failure_served')
+            return OpenLibraryService._failed_results(found[failed_key])
+
+        # Single-flight: only the request holding the lock goes upstream;
+        # identical concurrent searches wait for it to fill the cache.
+        if OpenLibraryService._safe_cache_add(
+            lock_key, 1, timeout=OpenLibraryService.SINGLE_FLIGHT_LOCK_SECONDS,
+        ):
+            try:
+                return OpenLibraryService._search_upstream(normalized, max_results, cache_key)
+            finally:
+                OpenLibraryService._safe_cache_delete(lock_key)
 
+        get_client().metrics.incr('search.coalesced')
+        envelope = OpenLibraryService._wait_for_flight(cache_key, lock_key)
+        if envelope is not None:
+            return envelope['results']
+
+        # The leader failed or is taking too long — fetch it ourselves
+        get_client().metrics.incr('search.coalesce_timeouts')
+        return OpenLibraryService._search_upstream(normalized, max_results, cache_key)
+
+    @staticmethod
+    def _refresh_search(normalized, max_results, cache_key, lock_key):
+        """Re-fetch a stale search; returns the fresh results, or None on failure."""
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            return OpenLibraryService._search_upstream(
+                normalized, max_results, cache_key, fallback=False,
+            )
+        except CircuitOpenError:
+            pass  # breaker opened meanwhile — keep serving the stale entry
+        except requests.RequestException as exc:
+            logger.warning("Stale search refresh failed for %s: %s", cache_key, exc)
+        except Exception:
+            logger.exception("Stale search refresh failed for %s", cache_key)
+        finally:
+            OpenLibraryService._safe_cache_delete(lock_key)
+        return None
+
+    @staticmethod
+    def _wait_for_flight(cache_key, lock_key):
+        """
+        Poll for the leader's result. Returns None if the lock is released
+        without a result or the wait budget runs out; a failed leader's
+        outcome is returned (or raised) as if it were a cached envelope.
+        """
+        failed_key = f"{cache_key}:failed"
+        expires_at = time.monotonic() + OpenLibraryService.SINGLE_FLIGHT_WAIT_SECONDS
+        interval   = 0.05
+        while time.monotonic() < expires_at:
+            time.sleep(interval)
+            interval = min(interval * 2, 0.4)
+            try:
+                found = cache.get_many([cache_key, lock_key, failed_key])
+            except Exception as exc:
+                logger.warning("Cache read failed for key %s: %s", cache_key, exc)
+                return None
+            if cache_key in found:
+                return found[cache_key]
+            if failed_key in found:
+                return {'results': OpenLibraryService._failed_results(found[failed_key])}
+            if lock_key not in found:
+                return None
+        return None
+
+    @staticmethod
+    def _search_upstream(normalized, max_results, cache_key, fallback=True):
+        params = {'q': normalized, 'limit': max_results}
+
+        try:
+            data = get_client().get_json('search', '/search.json', params=params)
+        except CircuitOpenError:
+            if not fallback:
+                raise
+            try:
+                results = OpenLibraryService._local_fallback(normalized, max_results)
+            except GoogleBooksAPIError as exc:
+                OpenLibraryService._publish_failure(cache_key, {'error': str(exc)})
+                raise
+            OpenLibraryService._publish_failure(cache_key, {'results': results})
+            return results
         except requests.RequestException:
+            if not fallback:
+                raise
+            OpenLibraryService._publish_failure(cache_key, {'results': []})
             return []
 
         items = data.get('docs', [])
         results = [OpenLibraryService._normalize(item) for item in items]
 
-        # Cache the full result list for 30 min
-        OpenLibraryService._safe_cache_set(cache_key, results, timeout=60 * 30)
+        if results:
+            soft_ttl, hard_ttl = OpenLibraryService.SEARCH_TTLS
+        else:
+            soft_ttl, hard_ttl = OpenLibraryService.NEGATIVE_SEARCH_TTLS
+        OpenLibraryService._safe_cache_set(
+            cache_key,
+            {'results': results, 'fresh_until': time.time() + soft_ttl},
+            timeout=hard_ttl,
+        )
 
         # Also cache each book individually by work_id so add_from_google
         # can reuse the rich search data (author, cover, pages) instead of
@@ -69,11 +271,45 @@ class OpenLibraryService:
 
         return results
 
+    @staticmethod
+    def _publish_failure(cache_key, outcome):
+        """Share a failed search's outcome ({'results'} or {'error'}) briefly."""
+        OpenLibraryService._safe_cache_set(
+            f"{cache_key}:failed", outcome, timeout=OpenLibraryService.FAILED_SEARCH_SECONDS,
+        )
+
+    @staticmethod
+    def _failed_results(outcome):
+        if 'error' in outcome:
+            raise GoogleBooksAPIError(outcome['error'])
+        return outcome['results']
+
+    @staticmethod
+    def _local_fallback(normalized, max_results):
+        """
+        Results from our own catalog while Open Library is unreachable.
+        Not cached, so the real results replace them once upstream recovers.
+        """
+        results = BookCatalogService.search_local(normalized, max_results)
+        if not results:
+            raise GoogleBooksAPIError(
+                "Book search is temporarily unavailable. Please try again shortly."
+            )
+        get_client().metrics.incr('search.local_fallbacks')
+        return results
+
+    @staticmethod
+    def cover_url(cover_id, size='M'):
+        """Our (signed) cover proxy URL for an Open Library cover id — see apps/books/covers.py."""
+        from .covers import BookCoverService
+
+        return BookCoverService.signed_url(cover_id, size)
+
     @staticmethod
     def _normalize(book):
         cover_url = ""
-        if book.get("cover_i"):
-            cover_url = f"https://covers.openlibrary.org/b/id/{book['cover_i']}-M.jpg"
+        if (book.get("cover_i") or 0) > 0:
+            cover_url = OpenLibraryService.cover_url(book['cover_i'])
 
         isbn_list = book.get("isbn", [])
         isbn_10 = isbn_list[0] if isbn_list else None
@@ -97,61 +333,102 @@ class OpenLibraryService:
         }
 
     @staticmethod
-    def fetch_by_id(work_id):
+    def fetch_by_id(work_id, deadline=None, strict=False):
         """
         Fallback fetch when work is not in cache.
         Hits /works/OL45883W.json — note this endpoint lacks author & cover_i,
         so we also call the author and editions endpoints to fill the gaps.
+
+        The author and editions lookups run concurrently once the work is
+        known. If they haven't both finished within `deadline` seconds of
+        the start of the call, the record is returned with whatever has
+        arrived so far.
+
+        Returns None if the work can't be fetched; with `strict`, only for
+        an unknown work (404) — other upstream failures raise.
         """
+        if deadline is None:
+            deadline = OpenLibraryService.FETCH_DEADLINE_SECONDS
+        expires_at = time.monotonic() + deadline
+
         work_id = work_id.split('/')[-1]
-        url = f"{OpenLibraryService.BASE_WORK_URL}/{work_id}.json"
+        client  = get_client()
 
         try:
-            response = requests.get(url, timeout=4)
-            response.raise_for_status()
-            work_data = response.json()
-        except requests.RequestException:
+            work_data = client.get_json('work', f"/works/{work_id}.json")
+        except requests.RequestException as exc:
+            if strict and getattr(exc.response, 'status_code', None) != 404:
+                raise
             return None
 
         normalized = OpenLibraryService._normalize_work(work_data, work_id)
 
-        # Attempt to fetch author name from the authors sub-endpoint
         author_keys = [
             a.get('author', {}).get('key', '')
             for a in work_data.get('authors', [])
             if isinstance(a.get('author'), dict)
         ]
+
+        futures = {}
         if author_keys:
-            try:
-                author_url = f"https://openlibrary.org{author_keys[0]}.json"
-                author_resp = requests.get(author_url, timeout=3)
-                author_resp.raise_for_status()
-                normalized['author'] = author_resp.json().get('name', 'Unknown Author')
-            except requests.RequestException:
-                pass
-
-        # Attempt to fetch cover + page count from editions endpoint
+            futures['author'] = _submit(
+                OpenLibraryService._fetch_author_name, client, author_keys[0],
+            )
         if not normalized['cover_url'] or not normalized['total_pages']:
-            try:
-                editions_url = f"{OpenLibraryService.BASE_WORK_URL}/{work_id}/editions.json?limit=5"
-                ed_resp = requests.get(editions_url, timeout=3)
-                ed_resp.raise_for_status()
-                editions = ed_resp.json().get('entries', [])
-                for ed in editions:
-                    covers = ed.get('covers', [])
-                    if covers and covers[0] > 0 and not normalized['cover_url']:
-                        normalized['cover_url'] = (
-                            f"https://covers.openlibrary.org/b/id/{covers[0]}-M.jpg"
-                        )
-                    if not normalized['total_pages'] and ed.get('number_of_pages'):
-                        normalized['total_pages'] = ed['number_of_pages']
-                    if normalized['cover_url'] and normalized['total_pages']:
-                        break
-            except requests.RequestException:
-                pass
+            futures['editions'] = _submit(
+                OpenLibraryService._fetch_edition_details, client, work_id,
+            )
+        if not futures:
+            return normalized
+
+        done, pending = wait(
+            futures.values(), timeout=max(0, expires_at - time.monotonic()),
+        )
+        if pending:
+            logger.info(
+                "fetch_by_id(%s) deadline hit; returning partial record", work_id,
+            )
+
+        author_future = futures.get('author')
+        if author_future in done and author_future.result():
+            normalized['author'] = author_future.result()
+
+        editions_future = futures.get('editions')
+        if editions_future in done:
+            cover_url, total_pages = editions_future.result()
+            normalized['cover_url']   = normalized['cover_url'] or cover_url
+            normalized['total_pages'] = normalized['total_pages'] or total_pages
 
         return normalized
 
+    @staticmethod
+    def _fetch_author_name(client, author_key):
+        try:
+            return client.get_json('author', f"{author_key}.json").get('name', 'Unknown Author')
+        except requests.RequestException:
+            return None
+
+    @staticmethod
+    def _fetch_edition_details(client, work_id):
+        """First cover URL and page count found among the first editions."""
+        cover_url, total_pages = '', 0
+        try:
+            editions = client.get_json(
+                'editions', f"/works/{work_id}/editions.json", params={'limit': 5},
+            ).get('entries', [])
+        except requests.RequestException:
+            return cover_url, total_pages
+
+        for ed in editions:
+            covers = ed.get('covers', [])
+            if covers and covers[0] > 0 and not cover_url:
+                cover_url = OpenLibraryService.cover_url(covers[0])
+            if not total_pages and ed.get('number_of_pages'):
+                total_pages = ed['number_of_pages']
+            if cover_url and total_pages:
+                break
+        return cover_url, total_pages
+
     @staticmethod
     def _normalize_work(work_data, work_id):
         description = work_data.get("description", "")
@@ -176,6 +453,108 @@ class OpenLibraryService:
 
 class BookCatalogService:
 
+    # Hybrid search skips Open Library once the catalog alone has this many
+    # matches (or max_results, if smaller).
+    HYBRID_MIN_LOCAL_RESULTS = 5
+
+    @staticmethod
+    def to_search_result(book):
+        """A catalog Book in the same shape as OpenLibraryService results."""
+        return {
+            'google_books_id': book.google_books_id,
+            'title': book.title,
+            'author': book.author,
+            'isbn_10': book.isbn_10,
+            'isbn_13': book.isbn_13,
+            'total_pages': book.total_pages,
+            'cover_url': book.cover_url,
+            'description': book.description,
+            'publisher': book.publisher,
+            'published_date': book.published_date,
+            'language': book.language,
+            'categories': [genre.name for genre in book.genres.all()],
+            'in_catalog': True,
+        }
+
+    @staticmethod
+    def search_local(query, max_results=10):
+        """Catalog books that came from Open Library, as search results."""
+        books = BookSearchService.search(
+            Book.objects.filter(google_books_id__isnull=False).prefetch_related('genres'),
+            query,
+        )[:max_results]
+        return [BookCatalogService.to_search_result(book) for book in books]
+
+    @staticmethod
+    def hybrid_search(query, max_results=10):
+        """
+        Catalog-first search. Open Library is only queried when the catalog
+        has too few matches; its results are then appended, minus any work
+        we already hold (matched by work id or ISBN), which are swapped for
+        the catalog copy.
+        """
+        normalized = OpenLibraryService.normalize_query(query)
+        if not normalized:
+            return []
+
+        results = BookCatalogService.search_local(normalized, max_results)
+        if len(results) >= min(max_results, BookCatalogService.HYBRID_MIN_LOCAL_RESULTS):
+            get_client().metrics.incr('search.local_hits')
+            return results
+
+        try:
+            upstream = OpenLibraryService.search(normalized, max_results)
+        except GoogleBooksAPIError:
+            if results:
+                return results
+            raise
+
+        seen_ids, seen_isbns = set(), set()
+
+        def remember(item):
+            seen_ids.add(item['google_books_id'])
+            seen_isbns.update(filter(None, (item.get('isbn_10'), item.get('isbn_13'))))
+
+        def is_seen(item):
+            return item['google_books_id'] in seen_ids or any(
+                isbn in seen_isbns
+                for isbn in (item.get('isbn_10'), item.get('isbn_13')) if isbn
+            )
+
+        for item in results:
+            remember(item)
+
+        # Upstream hits the local ranking missed but that are in the catalog
+        upstream = [item for item in upstream if not is_seen(item)]
+        ids   = {item['google_books_id'] for item in upstream if item['google_books_id']}
+        isbns = {
+            isbn for item in upstream
+            for isbn in (item.get('isbn_10'), item.get('isbn_13')) if isbn
+        }
+        owned = {}
+        if ids or isbns:
+            for book in Book.objects.filter(
+                Q(google_books_id__in=ids) | Q(isbn_10__in=isbns) | Q(isbn_13__in=isbns),
+                google_books_id__isnull=False,
+            ).prefetch_related('genres'):
+                local = BookCatalogService.to_search_result(book)
+                for key in filter(None, (book.google_books_id, book.isbn_10, book.isbn_13)):
+                    owned[key] = local
+
+        for item in upstream:
+            if len(results) >= max_results:
+                break
+            match = next(
+                (owned[key] for key in (item['google_books_id'], item.get('isbn_10'), item.get('isbn_13'))
+                 if key in owned),
+                item,
+            )
+            if is_seen(match):
+                continue
+            remember(match)
+            results.append(match)
+        return results
+
     @staticmethod
     def add_from_google(google_books_id, user=None, prefetched_data=None):
         work_id = google_books_id.split('/')[-1]
@@ -211,17 +590,76 @@ class BookCatalogService:
             added_by=user,
         )
 
-        for cat in data.get('categories', []):
-            if cat and cat.strip():
-                genre, _ = Genre.objects.get_or_create(name=cat.strip())
-                book.genres.add(genre)
+        # Through rows are bulk-inserted, so m2m_changed doesn't fire
+        GenreResolver.link({book.pk: data.get('categories', [])})
+        transaction.on_commit(lambda: BookSearchService.refresh([book.pk]))
 
         return book, True
 
     @staticmethod
     def search_catalog(query):
-        if not query:
-            return Book.objects.all()
-        return Book.objects.filter(
-            Q(title__icontains=query) | Q(author__icontains=query)
-        )
\ No newline at end of file
+        return BookSearchService.search(Book.objects.all(), query)
+
+class GenreResolver:
+    """
+    Batched genre lookup: one query for every name, one bulk insert for
+    the missing genres, one bulk insert of book↔genre rows.
+    """
+
+    @staticmethod
+    def clean(name):
+        return (name or '').strip()[:100]
+
+    @staticmethod
+    def resolve(names):
+        """{cleaned name: genre id}; genres that don't exist yet are created."""
+        wanted = {}
+        for name in names:
+            name = GenreResolver.clean(name)
+            if name and name not in wanted:
+                slug = slugify(name)[:100]
+                if slug:
+                    wanted[name] = slug
+        if not wanted:
+            return {}
+
+        found = GenreResolver._lookup(wanted)
+        absent = {name: slug for name, slug in wanted.items() if name not in found}
+        if absent:
+            # Slugs are set here because bulk_create skips Genre.save()
+            Genre.objects.bulk_create(
+                [Genre(name=name, slug=slug) for name, slug in absent.items()],
+                ignore_conflicts=True,
+            )
+            found.update(GenreResolver._lookup(absent))
+        return found
+
+    @staticmethod
+    def _lookup(wanted):
+        """Existing genres matching each name or its slug, in one query."""
+        by_name, by_slug = {}, {}
+        for pk, name, slug in Genre.objects.filter(
+            Q(name__in=wanted) | Q(slug__in=wanted.values())
+        ).values_list('id', 'name', 'slug'):
+            by_name[name] = by_slug[slug] = pk
+        return {
+            name: by_name.get(name, by_slug.get(slug))
+            for name, slug in wanted.items()
+            if name in by_name or slug in by_slug
+        }
+
+    @staticmethod
+    def link(names_by_book):
+        """Attach genres to books from {book id: [genre names]}."""
+        genre_ids = GenreResolver.resolve(
+            name for names in names_by_book.values() for name in names
+        )
+        Through = Book.genres.through
+        Through.objects.bulk_create([
+            Through(book_id=book_id, genre_id=genre_id)
+            for book_id, names in names_by_book.items()
+            for genre_id in {
+                genre_ids[name] for name in map(GenreResolver.clean, names)
+                if name in genre_ids
+            }
+        ], ignore_conflicts=True)
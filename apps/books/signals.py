@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from .models import Book
+
+# Fields that feed Book.search_vector (genres are handled via m2m_changed).
+_SEARCH_FIELDS = {'title', 'author', 'description'}
+
+
+def _refresh_on_commit(book_ids):
+    from .search import BookSearchService
+
+    book_ids = list(book_ids)
+    transaction.on_commit(lambda: BookSearchService.refresh(book_ids))
+
+
+@receiver(post_save, sender=Book)
+def refresh_book_search_vector(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not _SEARCH_FIELDS.intersection(update_fields):
+        return
+    _refresh_on_commit([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genres.through)
+def refresh_book_search_vector_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _refresh_on_commit([instance.pk])
+    elif pk_set:
+        # genre.books.add(...) — pk_set holds the affected book ids
+        _refresh_on_commit(pk_set)
+
@@ -0,0 +1,61 @@
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def run_book_import(job_id, max_batches=None):
+    """
+    Run (or resume) a bulk catalog import from its last checkpoint, for at
+    most `max_batches` batches when given.
+    """
+    from .importer import BookImportService
+    from .models import BookImportJob
+
+    job = BookImportJob.objects.filter(pk=job_id).first()
+    if job is None or job.status == 'completed':
+        return
+    BookImportService.run(job, max_batches=max_batches)
+
+
+
+@shared_task
+def ingest_book_pdf(book_id, derive=True):
+    """
+    Page count, metadata, outline, dedupe and optional linearization for a
+    new PDF, then (with `derive`) its searchable text, cover and page
+    thumbnails — all from a single download of the file.
+    """
+    from .ingest import BookIngestService
+    from .models import Book
+
+    book = Book.objects.filter(pk=book_id).first()
+    if book is not None:
+        BookIngestService.process(book, derive=derive)
+
+
+@shared_task
+def derive_book_pdfs(budget_seconds=50):
+    """
+    Text, covers and thumbnails for books whose ingest ran without them
+    (uploads on Vercel), oldest first, until the time budget runs out.
+    Returns the number of books processed.
+    """
+    import time
+
+    from .ingest import BookIngestService
+
+    started = time.monotonic()
+    done = 0
+    for book in BookIngestService.pending_derivatives().iterator():
+        if time.monotonic() - started > budget_seconds:
+            break
+        try:
+            BookIngestService.process(book, ingest=book.ingested_at is None)
+            done += 1
+        except Exception as e:
+            # One bad PDF shouldn't hold up the rest of the queue
+            logger.warning(f'derive_book_pdfs failed for book {book.pk}: {e}')
+    return done
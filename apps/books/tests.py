@@ -1,3 +1,702 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import requests
+from botocore.exceptions import ClientError
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from .dedup import BookFileStore
+from .delivery import BookFileDelivery
+from .http_client import CircuitOpenError, OpenLibraryClient, get_client
+from .importer import BookImportService
+from .models import Book, BookFileBlob, BookText, Genre
+from .rendering import BookRenderService
+from .search import BookSearchService
+from .services import BookCatalogService, GoogleBooksAPIError, OpenLibraryService
+from .text import BookTextService
+from .uploads import S3MultipartBackend, UploadError
+
+
+class ParseRangesTests(SimpleTestCase):
+
+    def parse(self, header, size=1000):
+        return BookFileDelivery.parse_ranges(header, size)
+
+    def test_single_ranges(self):
+        self.assertEqual(self.parse('bytes=0-99'), [(0, 99)])
+        self.assertEqual(self.parse('bytes=900-'), [(900, 999)])
+        self.assertEqual(self.parse('bytes=-100'), [(900, 999)])
+
+    def test_end_is_clamped_to_size(self):
+        self.assertEqual(self.parse('bytes=500-5000'), [(500, 999)])
+        self.assertEqual(self.parse('bytes=-5000'), [(0, 999)])
+
+    def test_overlapping_and_adjacent_ranges_merge(self):
+        self.assertEqual(self.parse('bytes=500-599, 0-99, 100-199, 550-700'), [(0, 199), (500, 700)])
+
+    def test_unsatisfiable(self):
+        self.assertEqual(self.parse('bytes=1000-'), [])
+        self.assertEqual(self.parse('bytes=-0'), [])
+        self.assertEqual(self.parse('bytes=2000-3000, 1000-'), [])
+
+    def test_unsatisfiable_parts_are_dropped(self):
+        self.assertEqual(self.parse('bytes=0-9, 5000-6000'), [(0, 9)])
+
+    def test_ignored_headers(self):
+        for header in ('', 'bytes=', 'items=0-9', 'bytes=-', 'bytes=a-b', 'bytes=9-0', 'bytes=0-9,,'):
+            with self.subTest(header=header):
+                self.assertIsNone(self.parse(header))
+
+    def test_too_many_ranges_are_ignored(self):
+        specs = ','.join(f'{n * 10}-{n * 10 + 1}' for n in range(BookFileDelivery.MAX_RANGES + 1))
+        self.assertIsNone(self.parse(f'bytes={specs}', size=10_000))
+
+
+class IfRangeTests(SimpleTestCase):
+
+    ETAG          = '"abc123"'
+    LAST_MODIFIED = 1_700_000_000
+
+    def matches(self, if_range=None):
+        headers = {} if if_range is None else {'HTTP_IF_RANGE': if_range}
+        request = RequestFactory().get('/', **headers)
+        return BookFileDelivery._if_range_matches(request, self.ETAG, self.LAST_MODIFIED)
+
+    def test_no_if_range(self):
+        self.assertTrue(self.matches())
+
+    def test_etag(self):
+        self.assertTrue(self.matches('"abc123"'))
+        self.assertFalse(self.matches('"older"'))
+        # Weak validators never match for ranges
+        self.assertFalse(self.matches('W/"abc123"'))
+
+    def test_date(self):
+        self.assertTrue(self.matches(http_date(self.LAST_MODIFIED)))
+        self.assertFalse(self.matches(http_date(self.LAST_MODIFIED - 60)))
+        self.assertFalse(self.matches('not a date'))
+
+
+class ImportIdentifierTests(SimpleTestCase):
+
+    def parse(self, text, fmt='csv'):
+        return BookImportService.parse_identifiers(io.StringIO(text), fmt)
+
+    def test_csv_with_recognised_header(self):
+        self.assertEqual(
+            self.parse('title,isbn\nDune,9780441013593\nEmma, 0141439580 \n'),
+            ['9780441013593', '0141439580'],
+        )
+
+    def test_csv_without_header_uses_first_column(self):
+        self.assertEqual(self.parse('OL45883W,x\nOL1W,y\n'), ['OL45883W', 'OL1W'])
+
+    def test_csv_deduplicates_in_order(self):
+        self.assertEqual(self.parse('work_id\nOL2W\nOL1W\nOL2W\n\n'), ['OL2W', 'OL1W'])
+
+    def test_jsonl(self):
+        self.assertEqual(
+            self.parse('{"isbn": "123456789X"}\n"OL9W"\n\n{"key": "/works/OL3W"}\n', 'jsonl'),
+            ['123456789X', 'OL9W', '/works/OL3W'],
+        )
+
+    def test_format_for(self):
+        self.assertEqual(BookImportService.format_for('ids.JSONL'), 'jsonl')
+        self.assertEqual(BookImportService.format_for('ids.ndjson'), 'jsonl')
+        self.assertEqual(BookImportService.format_for('ids.csv'), 'csv')
+
+    def test_classify(self):
+        classify = BookImportService.classify
+        self.assertEqual(classify('978-0-441-01359-3'), ('isbn', '9780441013593'))
+        self.assertEqual(classify('0 14 143958 x'), ('isbn', '014143958X'))
+        self.assertEqual(classify('/works/ol45883w'), ('work', 'OL45883W'))
+        self.assertEqual(classify('https://openlibrary.org/works/OL1W/Dune'), ('work', 'OL1W'))
+        self.assertEqual(classify('12345'), (None, '12345'))
+        self.assertEqual(classify('OL1M'), (None, 'OL1M'))
+
+
+class S3MultipartCompleteTests(SimpleTestCase):
+
+    def complete(self, error_code):
+        client = mock.Mock()
+        client.complete_multipart_upload.side_effect = ClientError(
+            {'Error': {'Code': error_code, 'Message': 'Your proposed upload is smaller than the minimum allowed size'}},
+            'CompleteMultipartUpload',
+        )
+        upload = SimpleNamespace(upload_id='u1', key='books/pdfs/dune.pdf')
+        with mock.patch.object(S3MultipartBackend, '_client', return_value=client), \
+             mock.patch.object(S3MultipartBackend, '_object', return_value={'Bucket': 'b', 'Key': upload.key}):
+            return S3MultipartBackend.complete(upload, [{'part_number': 1, 'etag': '"e1"'}])
+
+    def test_client_errors_become_upload_errors(self):
+        for code in ('EntityTooSmall', 'InvalidPart', 'NoSuchUpload'):
+            with self.subTest(code=code), self.assertRaisesMessage(UploadError, f'S3 rejected the upload ({code})'):
+                self.complete(code)
+
+
+class _ScriptedHandler(BaseHTTPRequestHandler):
+    """Answers each path with the next (status, delay) in server.script[path]."""
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        self.server.hits.append(path)
+        script = self.server.script.get(path, [(404, 0)])
+        status_code, delay = script.pop(0) if len(script) > 1 else script[0]
+        time.sleep(delay)
+        body = b'{"ok": true}'
+        try:
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass    # client gave up (timeout)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class OpenLibraryClientTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _ScriptedHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.server.hits   = []
+        self.server.script = {}
+        self.client = OpenLibraryClient(f'http://127.0.0.1:{self.server.server_port}', backoff_factor=0)
+
+    def get(self, path, endpoint='work'):
+        return self.client.get_json(endpoint, path)
+
+    def test_retries_5xx_then_succeeds(self):
+        self.server.script['/works/OL1W.json'] = [(503, 0), (502, 0), (200, 0)]
+        self.assertEqual(self.get('/works/OL1W.json'), {'ok': True})
+        self.assertEqual(len(self.server.hits), 3)
+        counters = self.client.metrics.snapshot()
+        self.assertEqual((counters['work.calls'], counters.get('work.errors', 0)), (1, 0))
+
+    def test_gives_up_after_retries(self):
+        self.server.script['/works/OL1W.json'] = [(500, 0)]
+        with self.assertRaises(requests.HTTPError):
+            self.get('/works/OL1W.json')
+        self.assertEqual(len(self.server.hits), 3)    # first try + 2 retries
+        self.assertEqual(self.client.metrics.snapshot()['work.errors'], 1)
+        self.assertEqual(cache.get(self.client.breaker.failures_key), 1)
+
+    def test_read_timeout_is_not_retried(self):
+        self.server.script['/search.json'] = [(200, 0.5)]
+        with mock.patch.dict(OpenLibraryClient.TIMEOUTS, {'search': (1, 0.1)}):
+            started = time.monotonic()
+            # Surfaces as ConnectionError: urllib3 wraps it once read retries are spent
+            with self.assertRaisesMessage(requests.RequestException, 'Read timed out'):
+                self.get('/search.json', endpoint='search')
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(len(self.server.hits), 1)
+        self.assertEqual(self.client.metrics.snapshot()['search.errors'], 1)
+
+    def test_404_counts_as_healthy(self):
+        self.client.breaker.failure_threshold = 1
+        with self.assertRaises(requests.HTTPError) as ctx:
+            self.get('/works/OL404W.json')
+        self.assertEqual(ctx.exception.response.status_code, 404)
+        self.assertEqual(len(self.server.hits), 1)
+        self.assertIsNone(cache.get(self.client.breaker.failures_key))
+        self.assertEqual(self.client.breaker.state(), 'closed')
+
+    def open_breaker(self):
+        self.client.breaker.failure_threshold = 2
+        self.server.script['/works/OL1W.json'] = [(500, 0)]
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                self.get('/works/OL1W.json')
+        self.assertEqual(self.client.breaker.state(), 'open')
+
+    def half_open_breaker(self):
+        """Open the breaker, then fast-forward past its cooldown."""
+        self.open_breaker()
+        cache.set(self.client.breaker.open_until_key, time.time() - 1)
+        self.assertEqual(self.client.breaker.state(), 'half_open')
+
+    def test_open_breaker_fails_fast(self):
+        self.open_breaker()
+        hits = len(self.server.hits)
+        with self.assertRaises(CircuitOpenError):
+            self.get('/works/OL1W.json')
+        self.assertEqual(len(self.server.hits), hits)
+        self.assertEqual(self.client.metrics.snapshot()['breaker.short_circuits'], 1)
+
+    def test_successful_probe_closes_the_breaker(self):
+        self.half_open_breaker()
+        self.server.script['/works/OL1W.json'] = [(200, 0)]
+        self.assertEqual(self.get('/works/OL1W.json'), {'ok': True})
+        self.assertEqual(self.client.breaker.state(), 'closed')
+        self.assertEqual(self.client.metrics.snapshot()['breaker.closed'], 1)
+
+    def test_failed_probe_reopens_the_breaker(self):
+        self.half_open_breaker()
+        with self.assertRaises(requests.HTTPError):
+            self.get('/works/OL1W.json')
+        self.assertEqual(self.client.breaker.state(), 'open')
+        self.assertEqual(self.client.metrics.snapshot()['breaker.opened'], 2)
+
+    def test_one_probe_at_a_time(self):
+        self.half_open_breaker()
+        self.server.script['/works/OL1W.json'] = [(200, 0.3)]
+        probe = threading.Thread(target=self.get, args=('/works/OL1W.json',))
+        probe.start()
+        time.sleep(0.1)
+        with self.assertRaises(CircuitOpenError):
+            self.get('/works/OL1W.json')
+        probe.join()
+        self.assertEqual(self.client.breaker.state(), 'closed')
+
+
+class UpstreamHealthViewTests(TestCase):
+
+    URL = '/api/books/upstream-health/'
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin  = User.objects.create_user(username='ops', email='ops@example.com', password='x', is_staff=True)
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='x')
+
+    def get(self, user):
+        api = APIClient()
+        api.force_authenticate(user)
+        return api.get(self.URL)
+
+    def test_admin_sees_breaker_and_counters(self):
+        get_client().metrics.incr('search.coalesced')
+        response = self.get(self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.data['breaker'], ('closed', 'open', 'half_open'))
+        self.assertGreaterEqual(response.data['counters']['search.coalesced'], 1)
+
+    def test_readers_are_refused(self):
+        self.assertEqual(self.get(self.reader).status_code, 403)
+
+
+class CatalogSearchFallbackTests(TestCase):
+    """The icontains path used off Postgres (SQLite in development and tests)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dune     = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet')
+        cls.messiah  = Book.objects.create(title='Dune Messiah', author='Frank Herbert')
+        cls.children = Book.objects.create(title='Children of Dune', author='Frank Herbert')
+        cls.emma     = Book.objects.create(title='Emma', author='Jane Austen', description='A novel of manners')
+        sf, classic = Genre.objects.create(name='Science Fiction', slug='sf'), Genre.objects.create(name='Classic', slug='classic')
+        cls.dune.genres.add(sf, classic)
+        cls.emma.genres.add(classic)
+
+    def search(self, query):
+        return list(BookSearchService.search(Book.objects.all(), query))
+
+    def test_blank_query_passes_through(self):
+        self.assertEqual(len(self.search('  ')), 4)
+
+    def test_matches_title_author_description_and_genre(self):
+        for query, expected in (
+            ('austen', [self.emma]),
+            ('manners', [self.emma]),
+            ('fiction', [self.dune]),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), expected)
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search('dune messiah'), [self.messiah])
+        self.assertEqual(self.search('dune austen'), [])
+
+    def test_title_prefix_ranks_first(self):
+        results = self.search('dune')
+        self.assertEqual(results[-1], self.children)
+        self.assertCountEqual(results[:2], [self.dune, self.messiah])
+
+    def test_genre_joins_do_not_duplicate_books(self):
+        # Both of Dune's genres contain "c"
+        results = self.search('c')
+        self.assertEqual(results.count(self.dune), 1)
+        self.assertCountEqual(self.search('classic'), [self.dune, self.emma])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SingleFlightFailureTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.upstream_calls = 0
+
+    def search_concurrently(self, error, n=6):
+        """n identical searches at once against an upstream that fails slowly with `error`."""
+        def get_json(*args, **kwargs):
+            self.upstream_calls += 1
+            time.sleep(0.3)
+            raise error
+
+        outcomes = [None] * n
+
+        def search(i):
+            try:
+                outcomes[i] = OpenLibraryService.search('Failing Query')
+            except GoogleBooksAPIError as exc:
+                outcomes[i] = exc
+
+        with mock.patch.object(get_client(), 'get_json', side_effect=get_json), \
+             mock.patch.object(BookCatalogService, 'search_local', return_value=[]):
+            threads = [threading.Thread(target=search, args=(i,)) for i in range(n)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return outcomes
+
+    def test_followers_share_an_empty_result(self):
+        outcomes = self.search_concurrently(requests.ConnectionError('refused'))
+        self.assertEqual(self.upstream_calls, 1)
+        self.assertEqual(outcomes, [[]] * 6)
+
+    def test_followers_share_an_outage_error(self):
+        # Breaker open and nothing in the catalog: everyone gets the leader's 503
+        outcomes = self.search_concurrently(CircuitOpenError('open'))
+        self.assertEqual(self.upstream_calls, 1)
+        for outcome in outcomes:
+            self.assertIsInstance(outcome, GoogleBooksAPIError)
+
+    def test_failure_is_remembered_briefly(self):
+        self.search_concurrently(requests.ConnectionError('refused'), n=1)
+        with mock.patch.object(get_client(), 'get_json') as get_json:
+            self.assertEqual(OpenLibraryService.search('failing query'), [])
+        get_json.assert_not_called()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class HybridSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dune = Book.objects.create(title='Dune', author='Frank Herbert', google_books_id='OL1W')
+        # In the catalog but not found by title — only its ISBN ties it to an upstream hit
+        cls.messiah = Book.objects.create(
+            title='Messiah', author='Frank Herbert', google_books_id='OL9W', isbn_13='9780441172696',
+        )
+        Book.objects.create(title='Dune (manual upload)', author='Frank Herbert')    # no work id
+
+    def setUp(self):
+        cache.clear()
+
+    def upstream(self, work_id, title, isbn_13=None):
+        return {'google_books_id': work_id, 'title': title, 'author': 'Frank Herbert', 'isbn_13': isbn_13}
+
+    def test_enough_catalog_matches_skip_upstream(self):
+        with mock.patch.object(BookCatalogService, 'HYBRID_MIN_LOCAL_RESULTS', 1), \
+             mock.patch.object(OpenLibraryService, 'search') as search:
+            results = BookCatalogService.hybrid_search('dune')
+        search.assert_not_called()
+        self.assertEqual([(r['google_books_id'], r['in_catalog']) for r in results], [('OL1W', True)])
+
+    def test_upstream_fills_in_without_duplicates(self):
+        upstream = [
+            self.upstream('OL1W', 'Dune'),                          # already found locally
+            self.upstream('OL2W', 'Dune Messiah', '9780441172696'), # same ISBN as a catalog book
+            self.upstream('OL3W', 'Children of Dune'),
+        ]
+        with mock.patch.object(OpenLibraryService, 'search', return_value=upstream):
+            results = BookCatalogService.hybrid_search('dune')
+        self.assertEqual(
+            [(r['google_books_id'], r.get('in_catalog', False)) for r in results],
+            [('OL1W', True), ('OL9W', True), ('OL3W', False)],
+        )
+
+    def test_upstream_outage_keeps_catalog_matches(self):
+        with mock.patch.object(OpenLibraryService, 'search', side_effect=GoogleBooksAPIError('down')):
+            self.assertEqual([r['google_books_id'] for r in BookCatalogService.hybrid_search('dune')], ['OL1W'])
+            with self.assertRaises(GoogleBooksAPIError):
+                BookCatalogService.hybrid_search('austen')
+
+    def test_open_breaker_falls_back_to_the_catalog_uncached(self):
+        with mock.patch.object(get_client(), 'get_json', side_effect=CircuitOpenError('open')):
+            self.assertEqual([r['google_books_id'] for r in OpenLibraryService.search('dune')], ['OL1W'])
+        # Only shared briefly as a failure, so real results replace it on recovery
+        self.assertIsNone(cache.get(OpenLibraryService._search_cache_key('dune', 10)))
+        self.assertEqual(
+            cache.get(f"{OpenLibraryService._search_cache_key('dune', 10)}:failed")['results'][0]['google_books_id'],
+            'OL1W',
+        )
+
+
+def use_temporary_storage(test):
+    """Point default_storage at an empty directory for the rest of `test`."""
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media, ignore_errors=True)
+    storage = override_settings(
+        MEDIA_ROOT=media,
+        STORAGES={
+            'default'    : {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        },
+    )
+    storage.enable()
+    test.addCleanup(storage.disable)
+
+
+class BookFileStoreTests(TestCase):
+
+    PDF = b'%PDF-1.4 dune'
+
+    def setUp(self):
+        use_temporary_storage(self)
+
+    def upload(self, content, name='books/pdfs/uploads/dune.pdf'):
+        """A file stored as-is, the way a direct-to-storage upload lands."""
+        return default_storage.save(name, ContentFile(content))
+
+    def test_identical_files_are_stored_once(self):
+        first  = BookFileStore.store(ContentFile(self.PDF))
+        second = BookFileStore.store(ContentFile(self.PDF))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith('books/pdfs/sha256/'))
+        self.assertEqual(BookFileBlob.objects.count(), 1)
+        self.assertNotEqual(BookFileStore.store(ContentFile(b'%PDF-1.4 emma')), first)
+
+    def test_losing_a_concurrent_store_deletes_our_copy(self):
+        winner = BookFileStore.store(ContentFile(self.PDF))
+        blind  = mock.Mock(**{'first.return_value': None})
+        with mock.patch.object(BookFileBlob.objects, 'filter', return_value=blind):
+            name = BookFileStore.store(ContentFile(self.PDF))
+        self.assertEqual(name, winner)
+        self.assertEqual(len(default_storage.listdir(winner.rsplit('/', 1)[0])[1]), 1)
+
+    def test_first_copy_is_indexed_in_place(self):
+        book = Book.objects.create(title='Dune', author='Frank Herbert', file=self.upload(self.PDF))
+        self.assertFalse(BookFileStore.dedupe_book(book))
+        self.assertEqual(BookFileBlob.objects.get().name, book.file.name)
+
+    def test_duplicate_is_repointed_and_orphan_deleted(self):
+        stored = BookFileStore.store(ContentFile(self.PDF))
+        book   = Book.objects.create(title='Dune', author='Frank Herbert', file=self.upload(self.PDF))
+        orphan = book.file.name
+        self.assertTrue(BookFileStore.dedupe_book(book))
+        book.refresh_from_db()
+        self.assertEqual(book.file.name, stored)
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(stored))
+
+    def test_duplicate_still_used_by_another_book_is_kept(self):
+        BookFileStore.store(ContentFile(self.PDF))
+        name  = self.upload(self.PDF)
+        book  = Book.objects.create(title='Dune', author='Frank Herbert', file=name)
+        Book.objects.create(title='Dune (copy)', author='Frank Herbert', file=name)
+        self.assertTrue(BookFileStore.dedupe_book(book))
+        self.assertTrue(default_storage.exists(name))
+
+
+class BookTextSearchTests(TestCase):
+    """In-book search on the non-Postgres path: a scan of the unpacked pages."""
+
+    PAGES = [
+        'Chapter one. The spice must flow.',
+        '',
+        'An example of sandworms and spice harvesters.',
+        'Sandworms ' + 'of the deep desert, ' * 20 + 'guard the spice.',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Dune', author='Frank Herbert')
+        BookText.objects.create(
+            book=cls.book, sha256='0' * 64, pages=BookTextService.pack(cls.PAGES), page_count=len(cls.PAGES),
+        )
+
+    def pages(self, query, book=None, **kwargs):
+        found = BookTextService.search(book or self.book, query, **kwargs)
+        return found['count'], [result['page'] for result in found['results']]
+
+    def test_not_extracted_yet(self):
+        self.assertIsNone(BookTextService.search(Book.objects.create(title='Emma', author='Jane Austen'), 'x'))
+
+    def test_every_term_by_word_prefix_in_page_order(self):
+        self.assertEqual(self.pages('spice'), (3, [1, 3, 4]))
+        self.assertEqual(self.pages('SAND spi'), (2, [3, 4]))
+        self.assertEqual(self.pages('ample'), (0, []))    # prefixes only, not substrings
+        self.assertEqual(self.pages('  ?! '), (0, []))
+
+    def test_limit_keeps_the_total_count(self):
+        self.assertEqual(self.pages('spice', limit=1), (3, [1]))
+
+    def test_snippet_is_cut_around_the_match(self):
+        snippet = BookTextService.search(self.book, 'guard')['results'][0]['snippet']
+        self.assertTrue(snippet.startswith('…'))
+        self.assertIn('guard the spice.', snippet)
+        self.assertLessEqual(len(snippet), BookTextService.SNIPPET_CHARS + 2)
+
+    def test_extract_skips_an_unchanged_file(self):
+        book = Book.objects.create(title='Emma', author='Jane Austen', file='books/pdfs/emma.pdf')
+        with mock.patch.object(BookTextService, 'read', return_value=['Emma Woodhouse']) as read:
+            BookTextService.extract(book, path='/tmp/emma.pdf', digest='a' * 64)
+            BookTextService.extract(book, path='/tmp/emma.pdf', digest='a' * 64)
+        read.assert_called_once()
+        self.assertEqual(self.pages('woodhouse', book=book), (1, [1]))
+
+
+class FetchByIdTests(SimpleTestCase):
+
+    WORK     = {'title': 'Dune', 'authors': [{'author': {'key': '/authors/OL1A'}}]}
+    EDITIONS = {'entries': [{'number_of_pages': 412, 'covers': [42]}]}
+
+    def fetch(self, delays=None, errors=None, **kwargs):
+        """fetch_by_id against a fake upstream; `delays`/`errors` are keyed by endpoint."""
+        delays, errors = delays or {}, errors or {}
+
+        def get_json(endpoint, path, params=None):
+            time.sleep(delays.get(endpoint, 0))
+            if endpoint in errors:
+                raise errors[endpoint]
+            return {'work': self.WORK, 'author': {'name': 'Frank Herbert'}, 'editions': self.EDITIONS}[endpoint]
+
+        with mock.patch.object(get_client(), 'get_json', side_effect=get_json):
+            started = time.monotonic()
+            record  = OpenLibraryService.fetch_by_id('/works/OL1W', **kwargs)
+        return record, time.monotonic() - started
+
+    def test_author_and_editions_are_fetched_concurrently(self):
+        record, elapsed = self.fetch(delays={'author': 0.2, 'editions': 0.2})
+        self.assertLess(elapsed, 0.35)
+        self.assertEqual((record['author'], record['total_pages']), ('Frank Herbert', 412))
+        self.assertIn('/covers/42/M/', record['cover_url'])
+
+    def test_deadline_returns_a_partial_record(self):
+        record, elapsed = self.fetch(delays={'author': 0.5}, deadline=0.1)
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual((record['author'], record['total_pages']), ('Unknown Author', 412))
+
+    def test_strict_only_swallows_unknown_works(self):
+        missing = requests.HTTPError(response=SimpleNamespace(status_code=404))
+        outage  = requests.ConnectionError('refused')
+        self.assertIsNone(self.fetch(errors={'work': missing}, strict=True)[0])
+        self.assertIsNone(self.fetch(errors={'work': outage})[0])
+        with self.assertRaises(requests.ConnectionError):
+            self.fetch(errors={'work': outage}, strict=True)
+
+
+@override_settings(
+    PDF_SIGNED_URL_EXPIRE=300,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class StorageRedirectTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def book(self, storage=None):
+        return SimpleNamespace(file=SimpleNamespace(
+            name='books/pdfs/sha256/ab/abc.pdf', url='https://cdn.example.com/books/pdfs/sha256/ab/abc.pdf',
+            storage=storage or mock.Mock(),
+        ))
+
+    def test_stream_mode_does_not_redirect(self):
+        with override_settings(PDF_DELIVERY='stream'):
+            self.assertIsNone(BookFileDelivery.redirect(self.book()))
+
+    def test_public_mode_redirects_to_the_object(self):
+        with override_settings(PDF_DELIVERY='public'):
+            response = BookFileDelivery.redirect(self.book())
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], 'https://cdn.example.com/books/pdfs/sha256/ab/abc.pdf')
+        self.assertEqual(response['Cache-Control'], 'private, max-age=3600')
+
+    def test_signed_mode_redirects_to_a_presigned_url(self):
+        from storages.backends.s3boto3 import S3Boto3Storage
+
+        storage = S3Boto3Storage(
+            bucket_name='books', access_key='AKIDEXAMPLE', secret_key='secret',
+            region_name='eu-west-1', signature_version='s3v4',    # as in production
+        )
+        with override_settings(PDF_DELIVERY='signed'):
+            response = BookFileDelivery.redirect(self.book(storage), filename='Dune.pdf')
+        location = response['Location']
+        self.assertIn('/books/pdfs/sha256/ab/abc.pdf?', location)
+        self.assertIn('X-Amz-Expires=300', location)
+        self.assertIn('response-content-disposition=attachment', location)
+        # The cached redirect expires before its signature does
+        self.assertEqual(response['Cache-Control'], 'private, max-age=240')
+
+    def test_existence_checks_are_cached(self):
+        book = self.book()
+        book.file.storage.exists.return_value = True
+        self.assertTrue(BookFileDelivery.exists(book))
+        self.assertTrue(BookFileDelivery.exists(book))
+        book.file.storage.exists.assert_called_once_with(book.file.name)
+
+
+@override_settings(PDF_RENDER_WORKERS=0, PDF_THUMBNAIL_MAX_PAGES=2, SITE_URL='https://bud.example.com')
+class BookRenderTests(TestCase):
+
+    DIGEST = 'ab' * 32
+
+    def setUp(self):
+        from pypdf import PdfWriter
+
+        use_temporary_storage(self)
+        writer = PdfWriter()
+        for _ in range(3):
+            writer.add_blank_page(width=300, height=450)
+        pdf = tempfile.NamedTemporaryFile(suffix='.pdf')
+        self.addCleanup(pdf.close)
+        writer.write(pdf)
+        pdf.flush()
+        self.path = pdf.name
+
+    def book(self, title='Dune'):
+        # Deduplicated copies share one stored object
+        book = Book.objects.create(title=title, author='Frank Herbert', file='books/pdfs/sha256/ab/dune.pdf')
+        BookFileBlob.objects.get_or_create(name=book.file.name, defaults={'sha256': self.DIGEST, 'size': 1})
+        return book
+
+    def test_renders_cover_and_capped_thumbnails(self):
+        book   = BookRenderService.render(self.book(), path=self.path, digest=self.DIGEST)
+        prefix = BookRenderService.prefix(self.DIGEST)
+        self.assertEqual(book.pdf_renders, {
+            'prefix': prefix, 'pages': 2, 'widths': [96, 192], 'cover_widths': [320, 640],
+        })
+        stored = sorted(default_storage.listdir(prefix)[1])
+        self.assertEqual(stored, sorted([
+            'cover-320.webp', 'cover-640.webp',
+            'page-1-96.webp', 'page-1-192.webp', 'page-2-96.webp', 'page-2-192.webp',
+        ]))
+        self.assertEqual(book.cover_url, f'https://bud.example.com/media/{prefix}cover-640.webp')
+
+    def test_identical_file_reuses_the_renders(self):
+        first = BookRenderService.render(self.book(), path=self.path, digest=self.DIGEST)
+        copy  = self.book('Dune (copy)')
+        with mock.patch.object(BookRenderService, '_render_file') as render_file:
+            copy = BookRenderService.render(copy, path=self.path)
+        render_file.assert_not_called()
+        self.assertEqual(copy.pdf_renders, first.pdf_renders)
@@ -0,0 +1,175 @@
+"""
+Per-page text of book PDFs, for in-book search.
+
+Text is extracted once per file with pypdfium2 (much faster than pypdf on
+long books) and kept on BookText as a single zlib-compressed JSON list of
+pages, a fraction of the raw text size. On Postgres every page
+also gets a tsvector row in BookTextPage behind a GIN index, so a query
+finds its pages through the index and the text is only inflated to cut
+snippets; other backends scan the decompressed pages with the same
+prefix-matching rules.
+"""
+
+import json
+import re
+import tempfile
+import zlib
+
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection, transaction
+
+from .dedup import BookFileStore
+from .models import BookFileBlob, BookText, BookTextPage
+from .search import BookSearchService
+
+# "exam-\nple" → "example"; pdfium marks soft hyphens at line ends with \x02
+_HYPHEN_RE  = re.compile(r'(\w)[-\x02]\r?\n(\w)')
+_CONTROL_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class BookTextService:
+
+    SNIPPET_CHARS = 160
+    MAX_RESULTS   = 200
+
+    @staticmethod
+    def extract(book, force=False, path=None, digest=None):
+        """
+        Extract and store the text of book.file; returns its BookText (or
+        None). `path` and `digest` name an already-downloaded copy.
+        """
+        if not book.file:
+            return None
+
+        current = BookText.objects.filter(book=book).only('sha256').first()
+        if digest is None:
+            blob = BookFileBlob.objects.filter(name=book.file.name).only('sha256').first()
+            known = blob.sha256 if blob else None
+        else:
+            known = digest
+        if current and known and current.sha256 == known and not force:
+            return current
+
+        if path is None:
+            with tempfile.NamedTemporaryFile(suffix='.pdf') as fh:
+                digest, _ = BookFileStore.download(book.file.name, fh)
+                pages = BookTextService.read(fh.name)
+        else:
+            pages = BookTextService.read(path)
+
+        with transaction.atomic():
+            text, _ = BookText.objects.update_or_create(book=book, defaults={
+                'sha256'    : digest,
+                'pages'     : BookTextService.pack(pages),
+                'page_count': len(pages),
+                'char_count': sum(map(len, pages)),
+            })
+            BookTextService._index(book, pages)
+        return text
+
+    @staticmethod
+    def read(path):
+        """The text of each page of the PDF at `path`, whitespace-normalised."""
+        import pypdfium2 as pdfium
+
+        pages = []
+        pdf = pdfium.PdfDocument(path)
+        try:
+            for index in range(len(pdf)):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                raw = textpage.get_text_range()
+                textpage.close()
+                page.close()
+                raw = _CONTROL_RE.sub('', _HYPHEN_RE.sub(r'\1\2', raw))
+                pages.append(' '.join(raw.split()))
+        finally:
+            pdf.close()
+        return pages
+
+    @staticmethod
+    def pack(pages):
+        return zlib.compress(json.dumps(pages, ensure_ascii=False).encode('utf-8'))
+
+    @staticmethod
+    def unpack(data):
+        # Postgres hands BinaryField values back as memoryview
+        return json.loads(zlib.decompress(bytes(data)))
+
+    @staticmethod
+    def _index(book, pages):
+        """Rewrite the book's page vectors. A no-op outside Postgres."""
+        BookTextPage.objects.filter(book=book).delete()
+        if connection.vendor != 'postgresql':
+            return
+        table = connection.ops.quote_name(BookTextPage._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} (book_id, page, search_vector) "
+                f"VALUES (%s, %s, to_tsvector('simple', %s))",
+                [(book.pk, number, text) for number, text in enumerate(pages, 1) if text],
+            )
+
+    @staticmethod
+    def search(book, query, limit=50):
+        """
+        {'count', 'results': [{'page', 'snippet'}]} for pages containing
+        every term of `query` (prefix matching, as in catalog search), in
+        page order. None if the book's text isn't extracted yet.
+        """
+        text = BookText.objects.filter(book=book).defer('pages').first()
+        if text is None:
+            return None
+        terms = BookSearchService.terms(query)
+        if not terms:
+            return {'count': 0, 'results': []}
+
+        patterns = [re.compile(r'\b' + re.escape(term), re.IGNORECASE) for term in terms]
+
+        if connection.vendor == 'postgresql':
+            tsquery = SearchQuery(
+                ' & '.join(f'{term}:*' for term in terms),
+                config=BookSearchService.SEARCH_CONFIG,
+                search_type='raw',
+            )
+            numbers = list(
+                BookTextPage.objects
+                .filter(book=book, search_vector=tsquery)
+                .order_by('page')
+                .values_list('page', flat=True)
+            )
+            if not numbers:
+                return {'count': 0, 'results': []}
+            pages = BookTextService.unpack(text.pages)
+        else:
+            pages   = BookTextService.unpack(text.pages)
+            numbers = [
+                number for number, page in enumerate(pages, 1)
+                if all(pattern.search(page) for pattern in patterns)
+            ]
+
+        return {
+            'count'  : len(numbers),
+            'results': [
+                {'page': number, 'snippet': BookTextService.snippet(pages[number - 1], patterns)}
+                for number in numbers[:limit]
+            ],
+        }
+
+    @staticmethod
+    def snippet(text, patterns):
+        """About SNIPPET_CHARS of `text` around the first match, cut on word boundaries."""
+        width  = BookTextService.SNIPPET_CHARS
+        starts = [match.start() for match in (p.search(text) for p in patterns) if match]
+        start  = max(min(starts, default=0) - width // 3, 0)
+        end    = min(start + width, len(text))
+        if start > 0:
+            start = text.find(' ', start, end) + 1 or start
+        if end < len(text):
+            space = text.rfind(' ', start, end)
+            end = space if space > start else end
+        return (
+            ('…' if start > 0 else '')
+            + text[start:end].strip()
+            + ('…' if end < len(text) else '')
+        )
@@ -0,0 +1,310 @@
+"""
+Resumable multipart uploads for book PDFs.
+
+The client starts an upload, PUTs each part to the URL it is handed and
+then calls complete. On S3-compatible storage the part URLs are presigned
+UploadPart URLs, so the bytes never pass through Django; on the local
+filesystem they point at BookUploadViewSet.upload_part, which stands in
+for S3 by writing parts to a temp directory. Uploaded parts are always
+listed from the backend, so an interrupted client resumes by asking for
+the upload again and sending only the parts that are missing.
+"""
+
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .dedup import BookFileStore
+from .models import Book, BookUpload
+
+PDF_MAX_BYTES = 104857600  # 100 MB
+
+
+class UploadError(Exception):
+    """Raised for an invalid or incomplete upload (surfaced as a 400)."""
+
+
+class BookUploadService:
+
+    # S3 needs every part but the last to be at least 5 MB
+    PART_SIZE       = 8 * 1024 * 1024
+    PART_URL_EXPIRE = 60 * 60
+
+    @staticmethod
+    def backend():
+        if getattr(default_storage, 'bucket_name', None):
+            return S3MultipartBackend
+        return LocalMultipartBackend
+
+    @staticmethod
+    def start(user, filename, size, book=None, title='', author=''):
+        if not filename.lower().endswith('.pdf'):
+            raise UploadError('Only PDF files are allowed.')
+        if size <= 0:
+            raise UploadError('File is empty.')
+        if size > PDF_MAX_BYTES:
+            raise UploadError('File size cannot exceed 100 MB.')
+        if book is None and not (title and author):
+            raise UploadError('Title and author are required.')
+
+        key = f"books/pdfs/{uuid.uuid4().hex}/{get_valid_filename(filename)}"
+        upload = BookUpload(
+            user      = user,
+            book      = book,
+            title     = title,
+            author    = author,
+            filename  = filename[:255],
+            size      = size,
+            part_size = BookUploadService.PART_SIZE,
+            key       = key,
+        )
+        upload.upload_id = BookUploadService.backend().create(key)
+        upload.save()
+        return upload
+
+    @staticmethod
+    def part_urls(upload, request, part_numbers=None):
+        """[{'part_number', 'url'}] for the given parts (default: all)."""
+        backend = BookUploadService.backend()
+        if part_numbers is None:
+            part_numbers = range(1, upload.part_count + 1)
+        return [
+            {'part_number': n, 'url': backend.part_url(upload, n, request)}
+            for n in part_numbers
+        ]
+
+    @staticmethod
+    def uploaded_parts(upload):
+        """[{'part_number', 'size', 'etag'}] as recorded by the backend."""
+        return BookUploadService.backend().parts(upload)
+
+    @staticmethod
+    def missing_parts(upload, parts=None):
+        if parts is None:
+            parts = BookUploadService.uploaded_parts(upload)
+        done = {part['part_number'] for part in parts}
+        return [n for n in range(1, upload.part_count + 1) if n not in done]
+
+    @staticmethod
+    def complete(upload):
+        """Assemble the parts and attach the file; returns the Book."""
+        if upload.status != 'active':
+            raise UploadError(f'Upload is {upload.status}.')
+
+        parts   = BookUploadService.uploaded_parts(upload)
+        missing = BookUploadService.missing_parts(upload, parts)
+        if missing:
+            raise UploadError(f'Missing parts: {", ".join(map(str, missing))}.')
+        received = sum(part['size'] for part in parts)
+        if received != upload.size:
+            raise UploadError(f'Expected {upload.size} bytes, received {received}.')
+
+        upload.key = BookUploadService.backend().complete(upload, parts)
+
+        with transaction.atomic():
+            book = upload.book
+            if book is None:
+                book = Book.objects.create(
+                    title    = upload.title,
+                    author   = upload.author,
+                    added_by = upload.user,
+                )
+            book.file.name = upload.key
+            book.save(update_fields=['file', 'updated_at'])
+
+            upload.book         = book
+            upload.status       = 'completed'
+            upload.completed_at = timezone.now()
+            upload.save(update_fields=['book', 'key', 'status', 'completed_at'])
+        return book
+
+    @staticmethod
+    def abort(upload):
+        if upload.status == 'active':
+            BookUploadService.backend().abort(upload)
+            upload.status = 'aborted'
+            upload.save(update_fields=['status'])
+
+
+class S3MultipartBackend:
+    """Native S3 multipart upload against the default S3Boto3Storage bucket."""
+
+    @staticmethod
+    def _client():
+        return default_storage.connection.meta.client
+
+    @staticmethod
+    def _object(key):
+        from storages.utils import clean_name
+
+        return {
+            'Bucket': default_storage.bucket_name,
+            'Key'   : default_storage._normalize_name(clean_name(key)),
+        }
+
+    @staticmethod
+    def create(key):
+        params = S3MultipartBackend._object(key)
+        acl = getattr(default_storage, 'default_acl', None)
+        if acl:
+            params['ACL'] = acl
+        return S3MultipartBackend._client().create_multipart_upload(
+            ContentType='application/pdf', **params,
+        )['UploadId']
+
+    @staticmethod
+    def part_url(upload, part_number, request):
+        return S3MultipartBackend._client().generate_presigned_url(
+            'upload_part',
+            Params={
+                **S3MultipartBackend._object(upload.key),
+                'UploadId'  : upload.upload_id,
+                'PartNumber': part_number,
+            },
+            ExpiresIn=BookUploadService.PART_URL_EXPIRE,
+        )
+
+    @staticmethod
+    def _rejected(exc):
+        """An UploadError for S3 refusing the client's upload (bad or missing parts)."""
+        error = exc.response.get('Error', {})
+        return UploadError(f"S3 rejected the upload ({error.get('Code', 'Error')}): {error.get('Message', '')}")
+
+    @staticmethod
+    def parts(upload):
+        from botocore.exceptions import ClientError
+
+        paginator = S3MultipartBackend._client().get_paginator('list_parts')
+        try:
+            return [
+                {'part_number': part['PartNumber'], 'size': part['Size'], 'etag': part['ETag']}
+                for page in paginator.paginate(
+                    UploadId=upload.upload_id, **S3MultipartBackend._object(upload.key),
+                )
+                for part in page.get('Parts', [])
+            ]
+        except ClientError as exc:
+            raise S3MultipartBackend._rejected(exc) from exc
+
+    @staticmethod
+    def complete(upload, parts):
+        from botocore.exceptions import ClientError
+
+        try:
+            S3MultipartBackend._client().complete_multipart_upload(
+                UploadId=upload.upload_id,
+                MultipartUpload={'Parts': [
+                    {'PartNumber': part['part_number'], 'ETag': part['etag']}
+                    for part in sorted(parts, key=lambda part: part['part_number'])
+                ]},
+                **S3MultipartBackend._object(upload.key),
+            )
+        except ClientError as exc:
+            # EntityTooSmall, InvalidPart, InvalidPartOrder, NoSuchUpload
+            raise S3MultipartBackend._rejected(exc) from exc
+        return upload.key
+
+    @staticmethod
+    def abort(upload):
+        S3MultipartBackend._client().abort_multipart_upload(
+            UploadId=upload.upload_id, **S3MultipartBackend._object(upload.key),
+        )
+
+
+class LocalMultipartBackend:
+    """
+    Stand-in for S3 multipart uploads on filesystem storage: part URLs are
+    signed links to BookUploadViewSet.upload_part, parts live in a temp dir.
+    """
+
+    SIGNING_SALT = 'books.upload-part'
+    WRITE_CHUNK  = 1024 * 1024
+
+    @staticmethod
+    def _directory(upload):
+        return Path(tempfile.gettempdir()) / 'bud-uploads' / upload.upload_id
+
+    @staticmethod
+    def create(key):
+        upload_id = uuid.uuid4().hex
+        (Path(tempfile.gettempdir()) / 'bud-uploads' / upload_id).mkdir(parents=True)
+        return upload_id
+
+    @staticmethod
+    def part_url(upload, part_number, request):
+        token = signing.dumps(
+            {'upload': upload.pk, 'part': part_number}, salt=LocalMultipartBackend.SIGNING_SALT,
+        )
+        path = reverse('book-upload-part', kwargs={'pk': upload.pk, 'part_number': part_number})
+        return request.build_absolute_uri(f'{path}?token={token}')
+
+    @staticmethod
+    def check_token(token, upload_pk, part_number):
+        try:
+            claims = signing.loads(
+                token,
+                salt=LocalMultipartBackend.SIGNING_SALT,
+                max_age=BookUploadService.PART_URL_EXPIRE,
+            )
+        except signing.BadSignature:
+            return False
+        return claims == {'upload': upload_pk, 'part': part_number}
+
+    @staticmethod
+    def write_part(upload, part_number, stream, length):
+        """Copy one part from the request stream to disk, chunk by chunk."""
+        if upload.status != 'active':
+            raise UploadError(f'Upload is {upload.status}.')
+        if not 1 <= part_number <= upload.part_count:
+            raise UploadError('Part number out of range.')
+        if length > upload.part_size:
+            raise UploadError('Part is larger than the part size.')
+
+        directory = LocalMultipartBackend._directory(upload)
+        partial   = directory / f'{part_number:05d}.tmp'
+        with open(partial, 'wb') as fh:
+            remaining = length
+            while remaining > 0:
+                chunk = stream.read(min(LocalMultipartBackend.WRITE_CHUNK, remaining))
+                if not chunk:
+                    break
+                fh.write(chunk)
+                remaining -= len(chunk)
+        if remaining:
+            partial.unlink()
+            raise UploadError('Part body is shorter than its Content-Length.')
+        # Rename last so a re-sent part replaces the old one atomically
+        partial.replace(directory / f'{part_number:05d}.part')
+
+    @staticmethod
+    def parts(upload):
+        directory = LocalMultipartBackend._directory(upload)
+        if not directory.is_dir():
+            return []
+        return [
+            {'part_number': int(path.stem), 'size': path.stat().st_size, 'etag': None}
+            for path in sorted(directory.glob('*.part'))
+        ]
+
+    @staticmethod
+    def complete(upload, parts):
+        directory = LocalMultipartBackend._directory(upload)
+        with tempfile.TemporaryFile() as assembled:
+            for part in sorted(parts, key=lambda part: part['part_number']):
+                with open(directory / f"{part['part_number']:05d}.part", 'rb') as fh:
+                    shutil.copyfileobj(fh, assembled)
+            name = BookFileStore.store(assembled)
+        shutil.rmtree(directory, ignore_errors=True)
+        return name
+
+    @staticmethod
+    def abort(upload):
+        shutil.rmtree(LocalMultipartBackend._directory(upload), ignore_errors=True)
@@ -1,11 +1,18 @@
 # apps/books/urls.py
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet, GenreViewSet
+from . import cron_views
+from .views import BookUploadViewSet, BookViewSet, GenreViewSet
 
 router = DefaultRouter()
+# Before 'books' so uploads/ isn't taken for a book pk
+router.register(r'books/uploads', BookUploadViewSet, basename='book-upload')
 router.register(r'books', BookViewSet, basename='book')
 router.register(r'genres', GenreViewSet, basename='genre')
 
 print("REGISTERED URLS:", [str(u.pattern) for u in router.urls])
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    # QStash cron: text and renders for PDFs ingested inline on Vercel
+    path('books/cron/derive-pdfs/', cron_views.cron_derive_pdfs, name='cron-derive-pdfs'),
+] + router.urls
\ No newline at end of file
@@ -1,22 +1,57 @@
-from django.db.models import Q
-from django.http import FileResponse
+import csv
+import os
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.parsers import MultiPartParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
 
-from .models import Book, Genre
+from .models import Book, BookImportJob, BookUpload, Genre
 from .serializers import (
     BookListSerializer,
     BookDetailSerializer,
     BookFileUploadSerializer,
+    BookImportJobSerializer,
+    BookUploadSerializer,
     GenreSerializer,
     GoogleBookResultSerializer,
 )
+from .covers import BookCoverService
+from .dedup import BookFileStore
+from .delivery import BookFileDelivery
+from .http_client import get_client
+from .importer import BookImportService
 from .permissions import IsBudAdmin
+from .search import BookSearchService
 from .services import OpenLibraryService, BookCatalogService, GoogleBooksAPIError
+from .tasks import ingest_book_pdf, run_book_import
+from .text import BookTextService
+from .uploads import BookUploadService, LocalMultipartBackend, UploadError
+
+# On Vercel there is no Redis/Celery broker — tasks must run synchronously.
+_ON_VERCEL = bool(os.environ.get('VERCEL'))
+
+
+def _run(task, **kwargs):
+    """Call a Celery task directly on Vercel, async everywhere else."""
+    if _ON_VERCEL:
+        task(**kwargs)
+    else:
+        task.delay(**kwargs)
+
+
+def _ingest(book):
+    """Queue PDF ingestion for a book whose file just changed."""
+    try:
+        # On Vercel this runs in the request, so text and renders are left
+        # to the derive-pdfs cron
+        _run(ingest_book_pdf, book_id=book.pk, derive=not _ON_VERCEL)
+    except Exception as e:
+        # The upload itself succeeded; ingest_book_pdfs can catch up later
+        print(f'❌ [Books] PDF ingestion failed for {book.pk}: {e}')
+    book.refresh_from_db()
 
 
 class BookViewSet(viewsets.ModelViewSet):
@@ -30,6 +65,8 @@ class BookViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         if self.action in ('create', 'update', 'partial_update'):
             return [IsBudAdmin()]
+        if self.action == 'cover':
+            return [AllowAny()]
         return [IsAuthenticated()]
 
     def _is_admin(self, user):
@@ -46,12 +83,13 @@ class BookViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         qs = super().get_queryset()
-        query = self.request.query_params.get('q', '').strip()
-        if query:
-            qs = qs.filter(Q(title__icontains=query) | Q(author__icontains=query))
         genre_ids = self.request.query_params.getlist('genre')
         if genre_ids:
             qs = qs.filter(genres__id__in=genre_ids).distinct()
+        query = self.request.query_params.get('q', '').strip()
+        # search-text's q searches inside the book, not the catalog
+        if query and self.action != 'search_text':
+            qs = BookSearchService.search(qs, query)
         return qs
 
     def perform_create(self, serializer):
@@ -62,16 +100,28 @@ class BookViewSet(viewsets.ModelViewSet):
         query = request.query_params.get('q', '').strip()
         if len(query) < 3:
             return Response(status=200)
+        # ?mode=upstream forces a straight Open Library search
         try:
-            results = OpenLibraryService.search(query)
+            if request.query_params.get('mode') == 'upstream':
+                results = OpenLibraryService.search(query)
+            else:
+                results = BookCatalogService.hybrid_search(query)
         except GoogleBooksAPIError as exc:
             return Response(
                 {'detail': str(exc)},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(get_client().breaker.cooldown)},
             )
         serializer = GoogleBookResultSerializer(results, many=True)
         return Response(serializer.data)
 
+    # Public: covers are loaded by <img> tags, which send no auth header
+    @action(detail=False, methods=['get'], authentication_classes=[],
+            url_path=r'covers/(?P<cover_id>\d+)/(?P<size>[SML])', url_name='cover')
+    def cover(self, request, cover_id=None, size=None):
+        """Open Library cover, resized and cached in our storage."""
+        return BookCoverService.serve(request, int(cover_id), size)
+
     @action(detail=False, methods=['post'], url_path='upload-book',
             parser_classes=[MultiPartParser])
     def upload_book(self, request):
@@ -102,9 +152,10 @@ class BookViewSet(viewsets.ModelViewSet):
         book = Book.objects.create(
             title=title,
             author=author,
-            file=file,
+            file=BookFileStore.store(file),
             added_by=request.user,
         )
+        _ingest(book)
         return Response(BookDetailSerializer(book).data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'], url_path='upload-file',
@@ -113,8 +164,10 @@ class BookViewSet(viewsets.ModelViewSet):
         book = self.get_object()
         serializer = BookFileUploadSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        book.file = serializer.validated_data['file']
-        book.save(update_fields=['file'])
+        book.file.name = BookFileStore.store(serializer.validated_data['file'])
+        # updated_at too: it is the Last-Modified validator for download-pdf
+        book.save(update_fields=['file', 'updated_at'])
+        _ingest(book)
         return Response(
             BookDetailSerializer(book).data,
             status=status.HTTP_200_OK,
@@ -167,9 +220,103 @@ class BookViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
         )
 
+    @action(detail=False, methods=['post'], url_path='bulk-import',
+            parser_classes=[MultiPartParser, JSONParser])
+    def bulk_import(self, request):
+        """
+        Admin: import Open Library work ids / ISBNs in bulk, from an uploaded
+        CSV/JSONL `file` or a JSON `identifiers` list. Returns the job (202);
+        a job still 'pending' is resumed by POSTing to bulk-import/<id>/.
+        """
+        if not self._is_admin(request.user):
+            return Response(
+                {'detail': 'Only admins can bulk-import books.'},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        upload = request.FILES.get('file')
+        if upload:
+            try:
+                job = BookImportService.create_job(
+                    upload.read(),
+                    BookImportService.format_for(upload.name),
+                    user=request.user,
+                    source=upload.name,
+                )
+            except (ValueError, csv.Error) as e:
+                # Not UTF-8, bad JSON on a JSONL line, or unreadable CSV
+                return Response(
+                    {'detail': f'Could not read {upload.name}: {e}'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        elif isinstance(request.data.get('identifiers'), list):
+            job = BookImportService.create_job(
+                identifiers=request.data['identifiers'], user=request.user, source='api',
+            )
+        else:
+            return Response(
+                {'detail': 'Upload a CSV/JSONL file or send an identifiers list.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not job.total:
+            job.delete()
+            return Response(
+                {'detail': 'No identifiers found.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return self._start_import(job)
+
+    @action(detail=False, methods=['get', 'post'], url_path=r'bulk-import/(?P<job_id>\d+)')
+    def bulk_import_status(self, request, job_id=None):
+        """Admin: GET an import job's progress; POST resumes it from its checkpoint."""
+        if not self._is_admin(request.user):
+            return Response(
+                {'detail': 'Only admins can view bulk imports.'},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        job = BookImportJob.objects.filter(pk=job_id).first()
+        if job is None:
+            return Response({'detail': 'Import job not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if request.method == 'POST' and job.status != 'completed':
+            return self._start_import(job)
+        return Response(BookImportJobSerializer(job).data)
+
+    def _start_import(self, job):
+        # Without a worker the import runs in this request, so only a few
+        # batches at a time — the client POSTs to bulk-import/<id>/ to go on
+        max_batches = BookImportService.REQUEST_BATCHES if _ON_VERCEL else None
+        try:
+            _run(run_book_import, job_id=job.pk, max_batches=max_batches)
+        except Exception as e:
+            # Synchronous run on Vercel — progress up to the failure is checkpointed
+            print(f'❌ [Books] Bulk import #{job.pk} stopped: {e}')
+        job.refresh_from_db()
+        return Response(BookImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path='upstream-health')
+    def upstream_health(self, request):
+        """
+        Admin: Open Library breaker state and this process's counters
+        (calls, latency, errors, coalesced and stale searches). Counters
+        are per instance and reset when it is recycled.
+        """
+        if not self._is_admin(request.user):
+            return Response(
+                {'detail': 'Only admins can view upstream health.'},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        client = get_client()
+        return Response({
+            'breaker' : client.breaker.state(),
+            'counters': client.metrics.snapshot(),
+            'pid'     : os.getpid(),
+        })
+
     @action(detail=True, methods=['get'], url_path='download-pdf')
     def download_pdf(self, request, pk=None):
-        """Download PDF file for a book - authenticated users only."""
+        """Download PDF file for a book - authenticated users only. Supports Range and conditional GET."""
         book = self.get_object()
 
         if not book.file:
@@ -179,16 +326,20 @@ class BookViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            if not book.file.storage.exists(book.file.name):
+            if not BookFileDelivery.exists(book):
                 return Response(
                     {'detail': 'PDF file not found on server.'},
                     status=status.HTTP_404_NOT_FOUND,
                 )
 
-            file_handle = book.file.open('rb')
-            response = FileResponse(file_handle, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{book.title}.pdf"'
-            print(f'📥 [Books] PDF downloaded: {book.title} by user {request.user.email}')
+            filename = f'{book.title}.pdf'
+            redirect = BookFileDelivery.redirect(book, filename=filename)
+            if redirect is not None:
+                return redirect
+
+            response = BookFileDelivery.serve(request, book, filename=filename)
+            if response.status_code == 200:
+                print(f'📥 [Books] PDF downloaded: {book.title} by user {request.user.email}')
             return response
         except Exception as e:
             print(f'❌ [Books] PDF download error: {e}')
@@ -198,9 +349,142 @@ class BookViewSet(viewsets.ModelViewSet):
             )
 
 
+    @action(detail=True, methods=['get'], url_path='search-text')
+    def search_text(self, request, pk=None):
+        """Pages of the book's PDF matching ?q=, with a snippet from each."""
+        book = self.get_object()
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'detail': 'A search query (q) is required.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), BookTextService.MAX_RESULTS)
+        except ValueError:
+            limit = 50
+
+        found = BookTextService.search(book, query, limit=max(limit, 1))
+        if found is None:
+            # Not extracted yet — the reader falls back to its own text layer
+            return Response({'query': query, 'indexed': False, 'count': 0, 'results': []})
+        return Response({'query': query, 'indexed': True, **found})
+
+
 class GenreViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = GenreSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Genre.objects.filter(books__isnull=False).distinct()
\ No newline at end of file
+        return Genre.objects.filter(books__isnull=False).distinct()
+
+
+class BookUploadViewSet(viewsets.GenericViewSet):
+    """
+    Resumable multipart PDF uploads:
+
+      POST   /api/books/uploads/                  start → part URLs
+      PUT    <part url>                           each part, raw bytes
+      GET    /api/books/uploads/{id}/             progress + URLs for missing parts
+      POST   /api/books/uploads/{id}/complete/    attach the file to the book
+      DELETE /api/books/uploads/{id}/             abort
+    """
+    serializer_class = BookUploadSerializer
+
+    def get_queryset(self):
+        return BookUpload.objects.filter(user=self.request.user)
+
+    def get_permissions(self):
+        if self.action == 'upload_part':
+            # Authorised by the signed token in the part URL instead
+            return [AllowAny()]
+        return [IsAuthenticated()]
+
+    def get_authenticators(self):
+        if getattr(self, 'action', None) == 'upload_part':
+            return []
+        return super().get_authenticators()
+
+    def _is_admin(self, user):
+        return user.is_staff or getattr(user, 'role', '') in ('SUPER_ADMIN', 'CLUB_ADMIN')
+
+    def create(self, request):
+        book_id = request.data.get('book')
+        book = None
+        if book_id:
+            book = Book.objects.filter(pk=book_id).first()
+            if book is None:
+                return Response({'detail': 'Book not found.'}, status=status.HTTP_404_NOT_FOUND)
+        elif not self._is_admin(request.user):
+            count = Book.objects.filter(added_by=request.user).count()
+            if count >= 5:
+                return Response(
+                    {'detail': 'You can add up to 5 books. Remove one of yours first.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        try:
+            upload = BookUploadService.start(
+                request.user,
+                filename = str(request.data.get('filename', '')).strip(),
+                size     = int(request.data.get('size') or 0),
+                book     = book,
+                title    = str(request.data.get('title', '')).strip(),
+                author   = str(request.data.get('author', '')).strip(),
+            )
+        except (UploadError, ValueError) as exc:
+            detail = str(exc) if isinstance(exc, UploadError) else 'size must be an integer.'
+            return Response({'detail': detail}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = BookUploadSerializer(upload).data
+        data['parts'] = BookUploadService.part_urls(upload, request)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        upload = self.get_object()
+        data = BookUploadSerializer(upload).data
+        if upload.status == 'active':
+            try:
+                parts = BookUploadService.uploaded_parts(upload)
+            except UploadError as exc:
+                return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            data['uploaded_parts'] = parts
+            data['parts'] = BookUploadService.part_urls(
+                upload, request, BookUploadService.missing_parts(upload, parts),
+            )
+        return Response(data)
+
+    def destroy(self, request, pk=None):
+        BookUploadService.abort(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            book = BookUploadService.complete(upload)
+        except UploadError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        # Parts may have gone straight to S3, so ingestion also dedupes
+        _ingest(book)
+        return Response(BookDetailSerializer(book).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['put'], url_path=r'parts/(?P<part_number>\d+)', url_name='part')
+    def upload_part(self, request, pk=None, part_number=None):
+        """Local-storage stand-in for a presigned S3 UploadPart URL."""
+        part_number = int(part_number)
+        if BookUploadService.backend() is not LocalMultipartBackend or not LocalMultipartBackend.check_token(
+            request.query_params.get('token', ''), int(pk), part_number,
+        ):
+            return Response({'detail': 'Invalid or expired part URL.'}, status=status.HTTP_403_FORBIDDEN)
+
+        upload = BookUpload.objects.filter(pk=pk).first()
+        if upload is None:
+            return Response({'detail': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            # Read the raw WSGI stream so the part is never buffered whole
+            LocalMultipartBackend.write_part(upload, part_number, request._request, length)
+        except (UploadError, ValueError) as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_200_OK)
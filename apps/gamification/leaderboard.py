@@ -0,0 +1,673 @@
+"""
+Leaderboard engine.
+
+Every participant is a member of a sorted set ordered by RankKey (XP, then
+streak, then sign-up order), so rank, neighbours and top-N are O(log n)
+lookups instead of counts over UserGamification. The all-time board
+('all') is scored by total_xp and current_streak; the weekly and monthly
+boards ('week:<monday>', 'month:<first>') by the PeriodXP buckets written
+at session time. A new period simply starts a new, empty board; old boards
+expire and old buckets are pruned (PeriodBuckets). The set lives in Redis
+when settings.LEADERBOARD_REDIS_URL is configured; otherwise — and
+whenever Redis errors — the board is read straight from the database, as
+keyset counts and ordered slices over the rank indexes.
+
+The set is kept current by apps.gamification.signals on every XP change;
+`python manage.py rebuild_leaderboard` reconciles it with the database.
+"""
+
+import calendar
+import logging
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_redis_client = None
+_redis_lock   = threading.Lock()
+
+
+def _get_redis():
+    """The shared Redis client, or None when no leaderboard Redis is configured."""
+    global _redis_client
+    url = settings.LEADERBOARD_REDIS_URL
+    if not url:
+        return None
+    if _redis_client is None:
+        with _redis_lock:
+            if _redis_client is None:
+                import redis
+
+                _redis_client = redis.Redis.from_url(
+                    url, socket_timeout=2, socket_connect_timeout=2, decode_responses=True,
+                )
+    return _redis_client
+
+
+class RedisLeaderboardStore:
+    """A board as a Redis sorted set of RankKey members and scores."""
+
+    # ZADD arguments per command when rebuilding
+    CHUNK = 5000
+
+    def __init__(self, client, key, expires_at=None):
+        self.client     = client
+        self.key        = key
+        self.expires_at = expires_at
+
+    def ready(self):
+        return bool(self.client.exists(f"{self.key}:built"))
+
+    def add(self, scores):
+        if scores:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.zadd(self.key, scores)
+            if self.expires_at:
+                pipe.expireat(self.key, self.expires_at)
+            pipe.execute()
+
+    def remove(self, members):
+        if members:
+            self.client.zrem(self.key, *members)
+
+    def card(self):
+        return self.client.zcard(self.key)
+
+    def score(self, member):
+        score = self.client.zscore(self.key, member)
+        return None if score is None else int(score)
+
+    def position(self, member):
+        """0-based position from the top, or None if not on the board."""
+        return self.client.zrevrank(self.key, member)
+
+    def range(self, start, stop):
+        """[(member, score)] for positions start..stop inclusive, best first."""
+        if stop < start:
+            return []
+        return [
+            (member, int(score))
+            for member, score in self.client.zrevrange(self.key, start, stop, withscores=True)
+        ]
+
+    def replace(self, scores):
+        """Swap in a freshly built board atomically (readers never see it half-built)."""
+        staging = f"{self.key}:rebuild"
+        items   = list(scores.items())
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(staging)
+        for i in range(0, len(items), self.CHUNK):
+            pipe.zadd(staging, dict(items[i:i + self.CHUNK]))
+        if items:
+            pipe.rename(staging, self.key)
+        else:
+            pipe.delete(self.key)
+        pipe.set(f"{self.key}:built", 1)
+        if self.expires_at:
+            pipe.expireat(self.key, self.expires_at)
+            pipe.expireat(f"{self.key}:built", self.expires_at)
+        pipe.execute()
+
+    def clear(self):
+        self.client.delete(self.key, f"{self.key}:built")
+
+
+def seek(columns, key, ahead):
+    """
+    Q for the rows ordered before (`ahead`) or after `key` in the order
+    [(field, descending)]. The leading bound lets the planner start the
+    index scan at the key (a seek).
+    """
+    def lookup(descending):
+        return 'gt' if descending == ahead else 'lt'
+
+    clauses = Q()
+    for i, (field, descending) in enumerate(columns):
+        ties = {name: key[n] for n, (name, _) in enumerate(columns[:i])}
+        clauses |= Q(**ties, **{f"{field}__{lookup(descending)}": key[i]})
+    first, descending = columns[0]
+    return Q(**{f"{first}__{lookup(descending)}e": key[0]}) & clauses
+
+
+class DatabaseLeaderboardStore:
+    """
+    A board read from its rows (UserGamification or the period's PeriodXP
+    buckets) when there is no Redis. Always ready; writes are no-ops, since
+    the rows are already the scores.
+    """
+
+    def __init__(self, board):
+        from .models import PeriodXP, UserGamification
+
+        parsed = PeriodBuckets.parse(board)
+        if parsed is None:
+            self.rows    = UserGamification.objects.filter(total_xp__gt=0)
+            self.columns = RankKey.COLUMNS
+        else:
+            PeriodBuckets.prune_once(board)
+            period, start = parsed
+            self.rows    = PeriodXP.objects.filter(period=period, period_start=start, xp__gt=0)
+            self.columns = PeriodBuckets.COLUMNS
+        self.fields = [field for field, _ in self.columns]
+        self.order  = [f"-{field}" if descending else field for field, descending in self.columns]
+
+    def _entry(self, row):
+        *score, user_id = row
+        return RankKey.member(user_id), RankKey.score(*score)
+
+    def _key(self, member):
+        return self.rows.filter(user_id=RankKey.user_id(member)).values_list(*self.fields).first()
+
+    def ready(self):
+        return True
+
+    def add(self, scores):
+        pass
+
+    def remove(self, members):
+        pass
+
+    def card(self):
+        return self.rows.count()
+
+    def score(self, member):
+        key = self._key(member)
+        return None if key is None else self._entry(key)[1]
+
+    def position(self, member):
+        key = self._key(member)
+        if key is None:
+            return None
+        return self.rows.filter(seek(self.columns, key, ahead=True)).count()
+
+    def range(self, start, stop):
+        if stop < start:
+            return []
+        return [
+            self._entry(row)
+            for row in self.rows.order_by(*self.order).values_list(*self.fields)[max(start, 0):stop + 1]
+        ]
+
+    def replace(self, scores):
+        pass
+
+    def clear(self):
+        pass
+
+
+class RankKey:
+    """
+    The one leaderboard order: more XP first, then the longer current
+    streak, then whoever signed up first. Sign-up order is the user id —
+    ids are handed out at signup, never tie, and (unlike date_joined) live
+    on UserGamification, so the whole key is covered by gamification_rank_idx.
+    The boards, my-rank and overtake detection all rank through this class.
+    """
+
+    ORDER   = ('-total_xp', '-current_streak', 'user_id')
+    COLUMNS = (('total_xp', True), ('current_streak', True), ('user_id', False))
+    # Board score = XP * STREAK_SLOTS + streak (exact as a double up to
+    # total_xp's 2**31 ceiling). Members are inverted, zero-padded user ids:
+    # sorted sets order equal scores by descending member, so earlier
+    # sign-ups come first.
+    STREAK_SLOTS = 1 << 16
+    MEMBER_BASE  = 10 ** 12
+
+    @staticmethod
+    def of(profile):
+        return (profile.total_xp, profile.current_streak, profile.user_id)
+
+    @staticmethod
+    def score(xp, streak=0):
+        return xp * RankKey.STREAK_SLOTS + min(streak, RankKey.STREAK_SLOTS - 1)
+
+    @staticmethod
+    def xp(score):
+        return score // RankKey.STREAK_SLOTS
+
+    @staticmethod
+    def member(user_id):
+        return f"{RankKey.MEMBER_BASE - user_id:012d}"
+
+    @staticmethod
+    def user_id(member):
+        return RankKey.MEMBER_BASE - int(member)
+
+    @staticmethod
+    def ahead_of(total_xp, current_streak, user_id):
+        """Q for the profiles ranked ahead of this key (an index seek)."""
+        return seek(RankKey.COLUMNS, (total_xp, current_streak, user_id), ahead=True)
+
+    @staticmethod
+    def behind(total_xp, current_streak, user_id):
+        """Q for the profiles ranked behind this key (an index seek)."""
+        return seek(RankKey.COLUMNS, (total_xp, current_streak, user_id), ahead=False)
+
+    @staticmethod
+    def next_behind(key):
+        """The profile directly behind `key`, or None."""
+        from .models import UserGamification
+
+        return (
+            UserGamification.objects
+            .filter(RankKey.behind(*key))
+            .order_by(*RankKey.ORDER)
+            .first()
+        )
+
+    @staticmethod
+    def passed(old, new):
+        """
+        Who a user overtook moving from key `old` to `new`: the profile now
+        directly behind them among those that were ahead of them — an index
+        slice between the two keys. Users without XP aren't on the board,
+        so they can't be overtaken.
+        """
+        from .models import UserGamification
+
+        return (
+            UserGamification.objects
+            .filter(total_xp__gt=0)
+            .filter(RankKey.ahead_of(*old))
+            .filter(RankKey.behind(*new))
+            .order_by(*RankKey.ORDER)
+            .first()
+        )
+
+
+class PeriodBuckets:
+    """Week / month XP buckets (PeriodXP) and the boards built from them."""
+
+    PERIODS = ('week', 'month')
+    # A period board's order: more XP first, then sign-up order
+    COLUMNS = (('xp', True), ('user_id', False))
+    # Buckets kept per period, the current one included
+    RETAIN = {'week': 8, 'month': 6}
+    # A finished period's board stays readable this long past its end
+    BOARD_GRACE = timedelta(days=1)
+
+    @staticmethod
+    def start(period, day):
+        if period == 'week':
+            return day - timedelta(days=day.weekday())
+        return day.replace(day=1)
+
+    @staticmethod
+    def end(period, start):
+        """First day of the following period."""
+        if period == 'week':
+            return start + timedelta(days=7)
+        return start + timedelta(days=calendar.monthrange(start.year, start.month)[1])
+
+    @staticmethod
+    def board(period, day=None):
+        """Board name for the period containing `day` (default: today)."""
+        day = day or timezone.localdate()
+        return f"{period}:{PeriodBuckets.start(period, day).isoformat()}"
+
+    @staticmethod
+    def parse(board):
+        """(period, start) for a period board name, or None for 'all'."""
+        period, _, start = board.partition(':')
+        if period not in PeriodBuckets.PERIODS:
+            return None
+        return period, date.fromisoformat(start)
+
+    @staticmethod
+    def expires_at(board):
+        """Unix time a board may be dropped at (None: never)."""
+        parsed = PeriodBuckets.parse(board)
+        if parsed is None:
+            return None
+        period, start = parsed
+        end = datetime.combine(PeriodBuckets.end(period, start), datetime.min.time())
+        return int(timezone.make_aware(end + PeriodBuckets.BOARD_GRACE).timestamp())
+
+    @staticmethod
+    def record(user_id, xp, day=None):
+        """Add XP to the user's current buckets and, on commit, to the period boards."""
+        from .models import PeriodXP
+
+        if xp <= 0:
+            return
+        day = day or timezone.localdate()
+        for period in PeriodBuckets.PERIODS:
+            start   = PeriodBuckets.start(period, day)
+            buckets = PeriodXP.objects.filter(user_id=user_id, period=period, period_start=start)
+            if buckets.update(xp=F('xp') + xp, updated_at=timezone.now()):
+                continue
+            # First XP of the period. A concurrent session may create the row
+            # between our UPDATE and INSERT, in which case fall back to UPDATE.
+            try:
+                with transaction.atomic():
+                    PeriodXP.objects.create(user_id=user_id, period=period, period_start=start, xp=xp)
+            except IntegrityError:
+                buckets.update(xp=F('xp') + xp, updated_at=timezone.now())
+
+        transaction.on_commit(lambda: PeriodBuckets.publish(user_id, day))
+
+    @staticmethod
+    def publish(user_id, day):
+        """Copy the user's committed bucket totals onto the period boards."""
+        from .models import PeriodXP
+
+        starts = {period: PeriodBuckets.start(period, day) for period in PeriodBuckets.PERIODS}
+        for period, start, xp in PeriodXP.objects.filter(
+            user_id=user_id, period__in=starts, period_start__in=starts.values(),
+        ).values_list('period', 'period_start', 'xp'):
+            if starts[period] == start:
+                LeaderboardService.update(user_id, xp, board=f"{period}:{start.isoformat()}")
+
+    @staticmethod
+    def _cutoff(period, today):
+        """Start of the oldest period still retained."""
+        cutoff = PeriodBuckets.start(period, today)
+        for _ in range(PeriodBuckets.RETAIN[period] - 1):
+            cutoff = PeriodBuckets.start(period, cutoff - timedelta(days=1))
+        return cutoff
+
+    @staticmethod
+    def prune(today=None):
+        """Delete buckets older than RETAIN periods; returns the number deleted."""
+        from .models import PeriodXP
+
+        today = today or timezone.localdate()
+        return sum(
+            PeriodXP.objects.filter(
+                period=period, period_start__lt=PeriodBuckets._cutoff(period, today),
+            ).delete()[0]
+            for period in PeriodBuckets.PERIODS
+        )
+
+    @staticmethod
+    def backfill(today=None):
+        """
+        Recompute the retained buckets from DailyReadingRollup, for XP
+        earned before buckets existed. Rollup days are the reader's local
+        dates, so a session near midnight may land one bucket over.
+        Returns the number of buckets written.
+        """
+        from apps.reading.models import DailyReadingRollup
+        from .models import PeriodXP
+
+        today   = today or timezone.localdate()
+        cutoffs = {period: PeriodBuckets._cutoff(period, today) for period in PeriodBuckets.PERIODS}
+        totals  = defaultdict(int)
+        for user_id, day, xp in (
+            DailyReadingRollup.objects
+            .filter(day__gte=min(cutoffs.values()), xp_earned__gt=0)
+            .values_list('user_id', 'day', 'xp_earned')
+            .iterator(chunk_size=LeaderboardService.REBUILD_BATCH)
+        ):
+            for period, cutoff in cutoffs.items():
+                if day >= cutoff:
+                    totals[(user_id, period, PeriodBuckets.start(period, day))] += xp
+
+        with transaction.atomic():
+            for period, cutoff in cutoffs.items():
+                PeriodXP.objects.filter(period=period, period_start__gte=cutoff).delete()
+            PeriodXP.objects.bulk_create(
+                [
+                    PeriodXP(user_id=user_id, period=period, period_start=start, xp=xp)
+                    for (user_id, period, start), xp in totals.items()
+                ],
+                batch_size=1000,
+            )
+        return len(totals)
+
+    @staticmethod
+    def prune_once(board):
+        """Prune on the first build of each new period's board, whichever process gets there."""
+        try:
+            due = cache.add(f"period_xp_pruned:{board}", 1, timeout=60 * 60 * 24 * 32)
+        except Exception as exc:
+            logger.warning("Cache add failed for period prune %s: %s", board, exc)
+            due = False
+        if due:
+            PeriodBuckets.prune()
+
+
+class LeaderboardService:
+
+    # Rows read per query when rebuilding from the database
+    REBUILD_BATCH = 10000
+
+    @staticmethod
+    def _key(board):
+        # v2: RankKey members and scores
+        return f"leaderboard:v2:{board}"
+
+    @staticmethod
+    def board(period='all', day=None):
+        """Board name for a `period` query value ('all', 'week' or 'month')."""
+        if period in PeriodBuckets.PERIODS:
+            return PeriodBuckets.board(period, day)
+        return 'all'
+
+    @staticmethod
+    def _stores(board):
+        """Stores to try in order: Redis (if configured), then the database."""
+        client = _get_redis()
+        if client is not None:
+            yield RedisLeaderboardStore(
+                client, LeaderboardService._key(board), PeriodBuckets.expires_at(board),
+            )
+        yield DatabaseLeaderboardStore(board)
+
+    @staticmethod
+    def _call(board, method, *args, write=False):
+        """
+        Run a store method; Redis errors fall back to the database. A read
+        builds an unbuilt board first. A write to an unbuilt board is
+        skipped, since the build that follows reads the committed rows.
+        """
+        import redis
+
+        for store in LeaderboardService._stores(board):
+            try:
+                if not store.ready():
+                    if write:
+                        return None
+                    store.replace(LeaderboardService.scores_from_db(board))
+                return getattr(store, method)(*args)
+            except redis.RedisError as exc:
+                logger.warning("Leaderboard Redis unavailable (%s); reading from the database", exc)
+
+    @staticmethod
+    def scores_from_db(board='all'):
+        """{member: score} for every participant, read in batches."""
+        from .models import PeriodXP, UserGamification
+
+        parsed = PeriodBuckets.parse(board)
+        if parsed is None:
+            rows = UserGamification.objects.filter(total_xp__gt=0).values_list(
+                'user_id', 'total_xp', 'current_streak',
+            )
+        else:
+            PeriodBuckets.prune_once(board)
+            period, start = parsed
+            rows = PeriodXP.objects.filter(
+                period=period, period_start=start, xp__gt=0,
+            ).values_list('user_id', 'xp')
+        return {
+            RankKey.member(user_id): RankKey.score(*score)
+            for user_id, *score in rows.iterator(chunk_size=LeaderboardService.REBUILD_BATCH)
+        }
+
+    @staticmethod
+    def _decode(entries):
+        return [(RankKey.user_id(member), RankKey.xp(score)) for member, score in entries]
+
+    # ── Writes ───────────────────────────────────────────────────────────
+
+    @staticmethod
+    def update(user_id, total_xp, current_streak=0, board='all'):
+        """Record a user's new XP; users without XP leave the board."""
+        if total_xp > 0:
+            score = RankKey.score(total_xp, current_streak)
+            LeaderboardService._call(board, 'add', {RankKey.member(user_id): score}, write=True)
+        else:
+            LeaderboardService._call(board, 'remove', [RankKey.member(user_id)], write=True)
+        LeaderboardSnapshot.touch(board, user_id, total_xp)
+
+    @staticmethod
+    def remove(user_id, board='all'):
+        LeaderboardService._call(board, 'remove', [RankKey.member(user_id)], write=True)
+        LeaderboardSnapshot.touch(board, user_id, 0)
+
+    @staticmethod
+    def rebuild(board='all'):
+        """Replace the board with the database's view of it; returns the member count."""
+        scores = LeaderboardService.scores_from_db(board)
+        for store in LeaderboardService._stores(board):
+            store.replace(scores)
+        LeaderboardSnapshot.drop(board)
+        return len(scores)
+
+    @staticmethod
+    def clear(board):
+        """Drop a board (it is rebuilt on its next read)."""
+        for store in LeaderboardService._stores(board):
+            store.clear()
+        LeaderboardSnapshot.drop(board)
+
+    # ── Reads ────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def count(board='all'):
+        return LeaderboardService._call(board, 'card')
+
+    @staticmethod
+    def top(limit, board='all'):
+        """[(user_id, xp)] for the first `limit` places."""
+        if limit <= 0:
+            return []
+        return LeaderboardService._decode(LeaderboardService._call(board, 'range', 0, limit - 1))
+
+    @staticmethod
+    def score(user_id, board='all'):
+        """The user's XP on the board (0 if not on it)."""
+        score = LeaderboardService._call(board, 'score', RankKey.member(user_id))
+        return 0 if score is None else RankKey.xp(score)
+
+    @staticmethod
+    def _position(user_id, board):
+        """0-based place on the board; users not on it sit below everyone who is."""
+        position = LeaderboardService._call(board, 'position', RankKey.member(user_id))
+        if position is None:
+            return LeaderboardService.count(board), False
+        return position, True
+
+    @staticmethod
+    def rank(user_id, board='all'):
+        """The user's 1-based place in RankKey order."""
+        return LeaderboardService._position(user_id, board)[0] + 1
+
+    @staticmethod
+    def neighbours(user_id, above=3, below=3, board='all'):
+        """([(user_id, xp)] just above, [...] just below), best first."""
+        position, listed = LeaderboardService._position(user_id, board)
+        above_range = LeaderboardService._call(board, 'range', max(position - above, 0), position - 1)
+        if not listed:
+            return LeaderboardService._decode(above_range), []
+        return (
+            LeaderboardService._decode(above_range),
+            LeaderboardService._decode(
+                LeaderboardService._call(board, 'range', position + 1, position + below),
+            ),
+        )
+
+    @staticmethod
+    def entries(ranked, request=None):
+        """
+        Serialized leaderboard rows for [(user_id, rank, board xp)], in that
+        order — one query for the profiles, whatever the board size.
+        """
+        from .models import UserGamification
+        from .serializers import LeaderboardEntrySerializer
+
+        profiles = UserGamification.objects.select_related('user').in_bulk(
+            [user_id for user_id, _, _ in ranked], field_name='user_id',
+        )
+        rows = []
+        for user_id, rank, xp in ranked:
+            profile = profiles.get(user_id)
+            if profile is not None:
+                profile.rank      = rank
+                profile.period_xp = xp
+                rows.append(profile)
+        return LeaderboardEntrySerializer(rows, many=True, context={'request': request}).data
+
+
+class LeaderboardSnapshot:
+    """
+    The top SIZE rows of a board, serialized once and cached for TTL
+    seconds, so a dashboard load is a cache read instead of a profile
+    query and a serializer pass. Rows are viewer-neutral (is_current_user
+    is False); the view overlays it per request. An XP change that can
+    show in the rows drops the snapshot straight away.
+    """
+
+    # The leaderboard view's largest limit
+    SIZE = 100
+    TTL  = 5
+
+    @staticmethod
+    def _key(board):
+        return f"leaderboard_snapshot:v1:{board}"
+
+    @staticmethod
+    def get(board='all'):
+        """{'entries', 'total_participants', 'floor'} for the board."""
+        key = LeaderboardSnapshot._key(board)
+        try:
+            snapshot = cache.get(key)
+        except Exception as exc:
+            logger.warning("Cache read failed for key %s: %s", key, exc)
+            snapshot = None
+        if snapshot is not None:
+            return snapshot
+
+        top = LeaderboardService.top(LeaderboardSnapshot.SIZE, board=board)
+        snapshot = {
+            'entries': list(LeaderboardService.entries(
+                [(user_id, position, xp) for position, (user_id, xp) in enumerate(top, start=1)],
+            )),
+            'total_participants': LeaderboardService.count(board=board),
+            # XP needed to appear in a full snapshot (any XP while it isn't full)
+            'floor': top[-1][1] if len(top) == LeaderboardSnapshot.SIZE else 0,
+        }
+        try:
+            cache.set(key, snapshot, timeout=LeaderboardSnapshot.TTL)
+        except Exception as exc:
+            logger.warning("Cache write failed for key %s: %s", key, exc)
+        return snapshot
+
+    @staticmethod
+    def touch(board, user_id, xp):
+        """Drop the board's snapshot if the user's new XP can change its rows."""
+        key = LeaderboardSnapshot._key(board)
+        try:
+            snapshot = cache.get(key)
+        except Exception as exc:
+            logger.warning("Cache read failed for key %s: %s", key, exc)
+            return
+        if snapshot is None:
+            return
+        if xp >= snapshot['floor'] or any(entry['user_id'] == user_id for entry in snapshot['entries']):
+            LeaderboardSnapshot.drop(board)
+
+    @staticmethod
+    def drop(board):
+        key = LeaderboardSnapshot._key(board)
+        try:
+            cache.delete(key)
+        except Exception as exc:
+            logger.warning("Cache delete failed for key %s: %s", key, exc)
@@ -0,0 +1,125 @@
+"""
+Management command to benchmark leaderboard ranking over synthetic users.
+Usage: python manage.py bench_leaderboard --users 1000000
+
+Compares the sorted-set board with the index-backed RankKey seeks on
+UserGamification (and the old total_xp__gt count), and checks that both
+give every probed user the same rank. The synthetic users are inserted
+inside a transaction that is rolled back and the benchmark board is
+dropped afterwards, so the command is safe to run against a development
+database.
+"""
+
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.gamification.leaderboard import LeaderboardService, RankKey
+from apps.gamification.models import UserGamification
+
+User = get_user_model()
+
+BOARD = 'bench'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark leaderboard rank, neighbours and overtake queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--probes', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        try:
+            with transaction.atomic():
+                self._populate(rng, options['users'])
+
+                started = time.perf_counter()
+                members = LeaderboardService.rebuild(BOARD)
+                self.stdout.write(
+                    f'Built board of {members} in {(time.perf_counter() - started) * 1000:.0f} ms'
+                )
+
+                probes = list(
+                    UserGamification.objects
+                    .filter(user__username__startswith='lb-bench-', total_xp__gt=0)
+                    .order_by('?')[:options['probes']]
+                )
+                self._report(probes)
+                transaction.set_rollback(True)
+        finally:
+            LeaderboardService.clear(BOARD)
+
+    def _populate(self, rng, count):
+        self.stdout.write(f'Inserting {count} synthetic users...')
+        started = time.perf_counter()
+        users = User.objects.bulk_create(
+            (
+                User(username=f'lb-bench-{i}', email=f'lb-bench-{i}@example.com')
+                for i in range(count)
+            ),
+            batch_size=5000,
+        )
+        # Long-tailed XP with plenty of ties, as on the real board
+        UserGamification.objects.bulk_create(
+            (
+                UserGamification(
+                    user_id        = user.pk,
+                    total_xp       = int(rng.paretovariate(1.2) * 20) - 20,
+                    current_streak = rng.randint(0, 30),
+                )
+                for user in users
+            ),
+            batch_size=5000,
+        )
+        self.stdout.write(f'  done in {time.perf_counter() - started:.1f}s')
+
+    def _report(self, probes):
+        timings = {}
+
+        def timed(label, fn):
+            started = time.perf_counter()
+            result  = fn()
+            timings.setdefault(label, []).append((time.perf_counter() - started) * 1000)
+            return result
+
+        LeaderboardService.count(board=BOARD)  # warm up (client, imports)
+        timed('top 20 (board)', lambda: LeaderboardService.top(20, board=BOARD))
+        timed('top 20 (seek)', lambda: list(
+            UserGamification.objects.order_by(*RankKey.ORDER).values_list('user_id', flat=True)[:20]
+        ))
+
+        mismatches = 0
+        for profile in probes:
+            key = RankKey.of(profile)
+            board_rank = timed('rank (board)', lambda: LeaderboardService.rank(profile.user_id, board=BOARD))
+            seek_rank  = timed('rank (index count)', lambda: (
+                UserGamification.objects.filter(RankKey.ahead_of(*key)).count() + 1
+            ))
+            timed('rank (old total_xp__gt)', lambda: (
+                UserGamification.objects.filter(total_xp__gt=profile.total_xp).count() + 1
+            ))
+            mismatches += board_rank != seek_rank
+
+            timed('neighbours (board)', lambda: LeaderboardService.neighbours(profile.user_id, board=BOARD))
+            timed('neighbours (seek)', lambda: (
+                list(
+                    UserGamification.objects.filter(RankKey.ahead_of(*key))
+                    .order_by('total_xp', 'current_streak', '-user_id')[:3]
+                ),
+                list(UserGamification.objects.filter(RankKey.behind(*key)).order_by(*RankKey.ORDER)[:3]),
+            ))
+            timed('overtake (seek)', lambda: RankKey.passed(key, (key[0] + 100, key[1], key[2])))
+
+        self.stdout.write(f'{"operation":<26} {"avg ms":>8} {"max ms":>8}')
+        for label, samples in timings.items():
+            self.stdout.write(f'{label:<26} {sum(samples) / len(samples):>8.2f} {max(samples):>8.2f}')
+
+        style = self.style.SUCCESS if not mismatches else self.style.ERROR
+        self.stdout.write(style(f'{len(probes) - mismatches}/{len(probes)} probes ranked identically'))
@@ -0,0 +1,45 @@
+"""
+Management command to reconcile the leaderboards with the database.
+Usage: python manage.py rebuild_leaderboard
+       python manage.py rebuild_leaderboard --backfill-periods
+
+Rebuilds the all-time board from UserGamification and this week's and
+month's boards from their PeriodXP buckets, swapping each in atomically so
+readers never see a partial board, and prunes expired buckets. Run it
+after restoring Redis, after bulk XP edits that bypass save(), or on a
+schedule as a safety net. --backfill-periods first recomputes the retained
+buckets from daily reading rollups (for XP earned before buckets existed).
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.gamification.leaderboard import LeaderboardService, PeriodBuckets
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the XP leaderboards from UserGamification and PeriodXP'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill-periods',
+            action='store_true',
+            help='Recompute week/month XP buckets from DailyReadingRollup first',
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill_periods']:
+            written = PeriodBuckets.backfill()
+            self.stdout.write(f'  Backfilled {written} period buckets from daily rollups')
+
+        pruned = PeriodBuckets.prune()
+        if pruned:
+            self.stdout.write(f'  Pruned {pruned} expired period buckets')
+
+        for board in ('all', *(LeaderboardService.board(period) for period in PeriodBuckets.PERIODS)):
+            started = time.perf_counter()
+            members = LeaderboardService.rebuild(board)
+            self.stdout.write(f'  {board}: {members} participants in {time.perf_counter() - started:.2f}s')
+
+        self.stdout.write(self.style.SUCCESS('Leaderboards rebuilt.'))
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0002_periodxp'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usergamification',
+            index=models.Index(fields=['-total_xp', '-current_streak', 'user'], name='gamification_rank_idx'),
+        ),
+    ]
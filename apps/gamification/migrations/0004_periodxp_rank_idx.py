@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0003_usergamification_gamification_rank_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='periodxp',
+            name='period_xp_board_idx',
+        ),
+        migrations.AddIndex(
+            model_name='periodxp',
+            index=models.Index(fields=['period', 'period_start', '-xp', 'user'], name='period_xp_rank_idx'),
+        ),
+    ]
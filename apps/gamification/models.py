@@ -1,6 +1,5 @@
 from django.conf import settings
 from django.db import models
-from django.utils import timezone
 
 
 class UserGamification(models.Model):
@@ -18,35 +17,15 @@ class UserGamification(models.Model):
     last_read_date  = models.DateField(null=True, blank=True)
     updated_at      = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # RankKey order — top-N, neighbour and overtake seeks
+            models.Index(fields=['-total_xp', '-current_streak', 'user'], name='gamification_rank_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} — {self.total_xp} XP — {self.current_streak} day streak"
 
-    def record_session(self, pages_read: int, duration_minutes: int, xp_earned: int):
-        """
-        Called every time a ReadingSession is saved.
-        Updates streak, XP, pages, and time in one place.
-        """
-        today = timezone.now().date()
-
-        # Streak logic
-        if self.last_read_date is None:
-            self.current_streak = 1
-        elif self.last_read_date == today:
-            pass  # already read today — streak unchanged
-        elif self.last_read_date == today - timezone.timedelta(days=1):
-            self.current_streak += 1  # consecutive day
-        else:
-            self.current_streak = 1   # broke the streak, reset
-
-        if self.current_streak > self.longest_streak:
-            self.longest_streak = self.current_streak
-
-        self.last_read_date   = today
-        self.total_xp        += xp_earned
-        self.total_pages_read += pages_read
-        self.total_time_hours += round(duration_minutes / 60, 2)
-        self.save()
-
 
 class Badge(models.Model):
     BADGE_CHOICES = [
@@ -75,4 +54,36 @@ class Badge(models.Model):
         ordering = ['-earned_at']
 
     def __str__(self):
-        return f"{self.user.username} — {self.badge_type}"
\ No newline at end of file
+        return f"{self.user.username} — {self.badge_type}"
+
+class PeriodXP(models.Model):
+    """
+    XP a user earned in one week or month, incremented at session time so
+    period leaderboards never sum ReadingSession rows. Old buckets are
+    pruned by apps.gamification.leaderboard.PeriodBuckets.
+    """
+    PERIOD_CHOICES = [
+        ('week',  'Week'),
+        ('month', 'Month'),
+    ]
+
+    user         = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='period_xp',
+    )
+    period       = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    # Monday of the week / first of the month, of the reader's local day
+    period_start = models.DateField()
+    xp           = models.PositiveIntegerField(default=0)
+    updated_at   = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'period', 'period_start')
+        indexes = [
+            # Period board order (PeriodBuckets.COLUMNS) — top-N and rank seeks
+            models.Index(fields=['period', 'period_start', '-xp', 'user'], name='period_xp_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} — {self.period} of {self.period_start}: {self.xp} XP"
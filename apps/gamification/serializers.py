@@ -12,6 +12,7 @@ class LeaderboardEntrySerializer(serializers.ModelSerializer):
     first_name = serializers.CharField(source='user.first_name', read_only=True)
     display_name = serializers.SerializerMethodField()
     rank = serializers.SerializerMethodField()
+    period_xp = serializers.SerializerMethodField()
     is_current_user = serializers.SerializerMethodField()
 
     class Meta:
@@ -26,6 +27,7 @@ class LeaderboardEntrySerializer(serializers.ModelSerializer):
             'books_finished',
             'total_pages_read',
             'rank',
+            'period_xp',
             'is_current_user',
         ]
 
@@ -39,6 +41,10 @@ class LeaderboardEntrySerializer(serializers.ModelSerializer):
     def get_rank(self, obj):
         return getattr(obj, 'rank', None)
 
+    def get_period_xp(self, obj):
+        """XP on the board being shown — total_xp on the all-time board."""
+        return getattr(obj, 'period_xp', obj.total_xp)
+
     def get_is_current_user(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
@@ -0,0 +1,68 @@
+import copy
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .leaderboard import LeaderboardService, PeriodBuckets
+from .models import UserGamification
+
+
+class GamificationService:
+
+    @staticmethod
+    def record_session(session):
+        """
+        The one place a ReadingSession's XP is applied. The reader's row is
+        locked and XP, pages, time and streak are written in a single
+        UPDATE; the week/month buckets are bumped in the same transaction
+        and the leaderboards follow on commit (an UPDATE fires no
+        post_save). The session is dated in the reader's own timezone, as
+        the daily rollup is. Returns (before, after) UserGamification copies.
+        """
+        from apps.reading.services import StreakService
+
+        user_id = session.user_id
+        tz      = StreakService.user_timezone(user_id)
+        day     = timezone.localtime(session.created_at, tz).date()
+
+        with transaction.atomic():
+            profiles = UserGamification.objects.select_for_update().filter(user_id=user_id)
+            before = profiles.first()
+            if before is None:
+                UserGamification.objects.get_or_create(user_id=user_id)
+                before = profiles.first()
+
+            # Streak logic
+            if before.last_read_date == day:
+                streak = before.current_streak          # already read today — unchanged
+            elif before.last_read_date == day - timedelta(days=1):
+                streak = before.current_streak + 1      # consecutive day
+            else:
+                streak = 1                              # first read, or broke the streak
+            hours = round(session.duration_minutes / 60, 2)
+
+            profiles.update(
+                total_xp         = F('total_xp') + session.xp_earned,
+                total_pages_read = F('total_pages_read') + session.pages_read,
+                total_time_hours = F('total_time_hours') + hours,
+                current_streak   = streak,
+                longest_streak   = max(before.longest_streak, streak),
+                last_read_date   = day,
+                updated_at       = timezone.now(),
+            )
+            PeriodBuckets.record(user_id, session.xp_earned, day=day)
+
+        after = copy.copy(before)
+        after.total_xp         += session.xp_earned
+        after.total_pages_read += session.pages_read
+        after.total_time_hours += hours
+        after.current_streak    = streak
+        after.longest_streak    = max(before.longest_streak, streak)
+        after.last_read_date    = day
+
+        transaction.on_commit(
+            lambda: LeaderboardService.update(user_id, after.total_xp, after.current_streak)
+        )
+        return before, after
@@ -1,6 +1,7 @@
 import os
 
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from apps.reading.models import ReadingSession
 
@@ -21,42 +22,26 @@ def update_gamification(sender, instance, created, **kwargs):
     if not created:
         return
 
-    from .models import UserGamification
+    from .leaderboard import RankKey
+    from .services import GamificationService
     from notifications.tasks import notify_league_overtake
 
-    gamification, _ = UserGamification.objects.get_or_create(
-        user=instance.user
-    )
-
-    old_xp = gamification.total_xp
-
-    gamification.record_session(
-        pages_read      =instance.pages_read,
-        duration_minutes=instance.duration_minutes,
-        xp_earned       =instance.xp_earned,
-    )
+    before, after = GamificationService.record_session(instance)
 
     # Check badge unlocks
-    _check_badges(instance.user, gamification)
+    _check_badges(instance.user_id, after)
 
     # Check league overtake
-    from .models import UserGamification as UG
-    above = (
-        UG.objects
-        .filter(total_xp__gt=old_xp, total_xp__lte=gamification.total_xp)
-        .exclude(user=instance.user)
-        .order_by('total_xp')
-        .first()
-    )
+    above = RankKey.passed(RankKey.of(before), RankKey.of(after)) if instance.xp_earned else None
     if above:
         _run(
             notify_league_overtake,
-            overtaker_id=instance.user.id,
-            overtaken_id=above.user.id,
+            overtaker_id=instance.user_id,
+            overtaken_id=above.user_id,
         )
 
 
-def _check_badges(user, gamification):
+def _check_badges(user_id, gamification):
     from .models import Badge
     from notifications.tasks import notify_achievement
 
@@ -69,15 +54,40 @@ def _check_badges(user, gamification):
         ('streak_30',      gamification.current_streak >= 30),
         ('books_finished', gamification.books_finished >= 1),
     ]
+    earned = [badge_type for badge_type, condition in checks if condition]
+    if not earned:
+        return
 
-    for badge_type, condition in checks:
-        if condition:
-            badge, created = Badge.objects.get_or_create(
-                user=user, badge_type=badge_type
+    # One read for the badges already held; only new ones are written
+    held = set(
+        Badge.objects.filter(user_id=user_id, badge_type__in=earned)
+        .values_list('badge_type', flat=True)
+    )
+    for badge_type in earned:
+        if badge_type in held:
+            continue
+        badge, created = Badge.objects.get_or_create(
+            user_id=user_id, badge_type=badge_type
+        )
+        if created:
+            _run(
+                notify_achievement,
+                user_id   =user_id,
+                badge_type=badge_type,
             )
-            if created:
-                _run(
-                    notify_achievement,
-                    user_id   =user.id,
-                    badge_type=badge_type,
-                )
\ No newline at end of file
+
+
+@receiver(post_save, sender='gamification.UserGamification')
+def update_leaderboard(sender, instance, **kwargs):
+    from .leaderboard import LeaderboardService
+
+    user_id, total_xp, streak = instance.user_id, instance.total_xp, instance.current_streak
+    transaction.on_commit(lambda: LeaderboardService.update(user_id, total_xp, streak))
+
+
+@receiver(post_delete, sender='gamification.UserGamification')
+def remove_from_leaderboard(sender, instance, **kwargs):
+    from .leaderboard import LeaderboardService
+
+    user_id = instance.user_id
+    transaction.on_commit(lambda: LeaderboardService.remove(user_id))
@@ -1,3 +1,264 @@
-from django.test import TestCase
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.books.models import Book
+from apps.reading.models import ReadingSession, UserBook
+from notifications.models import NotificationPreference
+
+from .leaderboard import LeaderboardService, LeaderboardSnapshot, PeriodBuckets, RankKey
+from .models import PeriodXP, UserGamification
+from .services import GamificationService
+
+
+class RankKeyEncodingTests(SimpleTestCase):
+
+    def test_score_round_trips_xp(self):
+        for xp, streak in ((0, 0), (1, 0), (250, 7), (2**31 - 1, 400)):
+            with self.subTest(xp=xp, streak=streak):
+                self.assertEqual(RankKey.xp(RankKey.score(xp, streak)), xp)
+
+    def test_streak_never_outweighs_xp(self):
+        self.assertLess(RankKey.score(100, 10**9), RankKey.score(101, 0))
+
+    def test_member_round_trips_user_id(self):
+        for user_id in (1, 42, 10**9):
+            with self.subTest(user_id=user_id):
+                self.assertEqual(RankKey.user_id(RankKey.member(user_id)), user_id)
+        self.assertEqual(len(RankKey.member(1)), len(RankKey.member(10**9)))
+
+    def test_board_order_matches_rank_order(self):
+        # Sorted sets read best-first by descending (score, member)
+        keys = [(50, 0, 3), (50, 2, 9), (50, 2, 4), (80, 0, 7), (0, 1, 1), (50, 0, 2)]
+        by_board = sorted(
+            keys,
+            key=lambda k: (RankKey.score(k[0], k[1]), RankKey.member(k[2])),
+            reverse=True,
+        )
+        by_rank = sorted(keys, key=lambda k: (-k[0], -k[1], k[2]))
+        self.assertEqual(by_board, by_rank)
+
+
+class RankKeySeekTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.keys = []
+        for n, (xp, streak) in enumerate([(50, 1), (50, 3), (50, 1), (90, 0), (10, 5), (0, 0), (50, 3)]):
+            user = User.objects.create_user(username=f'rk{n}', email=f'rk{n}@example.com', password='x')
+            UserGamification.objects.update_or_create(
+                user=user, defaults={'total_xp': xp, 'current_streak': streak},
+            )
+            cls.keys.append((xp, streak, user.pk))
+        cls.ranked = sorted(cls.keys, key=lambda k: (-k[0], -k[1], k[2]))
+
+    def user_ids(self, q):
+        return list(
+            UserGamification.objects.filter(q).order_by(*RankKey.ORDER).values_list('user_id', flat=True)
+        )
+
+    def test_ahead_of_and_behind_split_the_order(self):
+        for i, key in enumerate(self.ranked):
+            with self.subTest(key=key):
+                self.assertEqual(self.user_ids(RankKey.ahead_of(*key)), [k[2] for k in self.ranked[:i]])
+                self.assertEqual(self.user_ids(RankKey.behind(*key)), [k[2] for k in self.ranked[i + 1:]])
+
+    def test_next_behind(self):
+        self.assertEqual(RankKey.next_behind(self.ranked[0]).user_id, self.ranked[1][2])
+        self.assertIsNone(RankKey.next_behind(self.ranked[-1]))
+
+    def test_passed_is_the_last_profile_overtaken(self):
+        old = self.ranked[5]
+        new = (old[0] + 40, old[1], old[2])   # climbs past ranked[4]..ranked[1], not ranked[0]
+        self.assertEqual(RankKey.passed(old, new).user_id, self.ranked[1][2])
+        self.assertIsNone(RankKey.passed(old, old))
+
+    def test_passed_skips_users_without_xp(self):
+        zero = next(k for k in self.ranked if k[0] == 0)
+        below = (0, 0, zero[2] + 1)
+        self.assertIsNone(RankKey.passed(below, (5, 0, below[2])))
+
+
+class PeriodBucketsTests(SimpleTestCase):
+
+    def test_week_starts_on_monday(self):
+        for day in (date(2026, 3, 9), date(2026, 3, 12), date(2026, 3, 15)):
+            with self.subTest(day=day):
+                self.assertEqual(PeriodBuckets.start('week', day), date(2026, 3, 9))
+        self.assertEqual(PeriodBuckets.start('week', date(2026, 3, 16)), date(2026, 3, 16))
+
+    def test_week_across_a_year_boundary(self):
+        self.assertEqual(PeriodBuckets.start('week', date(2027, 1, 1)), date(2026, 12, 28))
+        self.assertEqual(PeriodBuckets.end('week', date(2026, 12, 28)), date(2027, 1, 4))
+
+    def test_month_bounds(self):
+        self.assertEqual(PeriodBuckets.start('month', date(2026, 3, 31)), date(2026, 3, 1))
+        self.assertEqual(PeriodBuckets.end('month', date(2026, 3, 1)), date(2026, 4, 1))
+        self.assertEqual(PeriodBuckets.end('month', date(2026, 12, 1)), date(2027, 1, 1))
+        self.assertEqual(PeriodBuckets.end('month', date(2028, 2, 1)), date(2028, 3, 1))
+        self.assertEqual(PeriodBuckets.end('month', date(2026, 2, 1)), date(2026, 3, 1))
+
+    def test_board_names_round_trip(self):
+        day = date(2026, 3, 12)
+        self.assertEqual(PeriodBuckets.board('week', day), 'week:2026-03-09')
+        self.assertEqual(PeriodBuckets.board('month', day), 'month:2026-03-01')
+        self.assertEqual(PeriodBuckets.parse('week:2026-03-09'), ('week', date(2026, 3, 9)))
+        self.assertIsNone(PeriodBuckets.parse('all'))
+        self.assertIsNone(PeriodBuckets.parse('year:2026-01-01'))
+
+    @override_settings(TIME_ZONE='UTC')
+    def test_board_expires_a_grace_period_after_it_ends(self):
+        expires = datetime(2026, 3, 17, tzinfo=timezone.get_current_timezone())
+        self.assertEqual(PeriodBuckets.expires_at('week:2026-03-09'), int(expires.timestamp()))
+        self.assertIsNone(PeriodBuckets.expires_at('all'))
+
+    def test_cutoff_keeps_retained_periods(self):
+        today = date(2026, 3, 12)
+        self.assertEqual(PeriodBuckets._cutoff('week', today), date(2026, 1, 19))
+        self.assertEqual(PeriodBuckets._cutoff('month', today), date(2025, 10, 1))
+
+
+@override_settings(TIME_ZONE='UTC')
+class RecordSessionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='x')
+        cls.rival  = User.objects.create_user(username='rival', email='rival@example.com', password='x')
+        NotificationPreference.objects.filter(user=cls.reader).update(timezone='Pacific/Auckland')
+        UserGamification.objects.update_or_create(user=cls.rival, defaults={'total_xp': 20})
+        cls.book      = Book.objects.create(title='Dune', author='Frank Herbert', total_pages=400)
+        cls.user_book = UserBook.objects.create(user=cls.reader, book=cls.book)
+
+    def session(self, at, pages=10, xp=30, minutes=30):
+        return ReadingSession(
+            user=self.reader, book=self.book, user_book=self.user_book,
+            start_page=1, end_page=1 + pages, pages_read=pages,
+            duration_minutes=minutes, xp_earned=xp, created_at=at,
+        )
+
+    def profile(self):
+        return UserGamification.objects.get(user=self.reader)
+
+    def test_saved_session_is_applied_once(self):
+        with mock.patch('apps.gamification.signals._run') as run:
+            ReadingSession.objects.create(
+                user=self.reader, book=self.book, user_book=self.user_book,
+                start_page=1, end_page=41, pages_read=40, duration_minutes=90, xp_earned=30,
+            )
+        profile = self.profile()
+        self.assertEqual(profile.total_xp, 30)
+        self.assertEqual(profile.total_pages_read, 40)
+        self.assertEqual(profile.total_time_hours, 1.5)
+        self.assertEqual(profile.current_streak, 1)
+        self.assertEqual(PeriodXP.objects.get(user=self.reader, period='week').xp, 30)
+
+        # 0 -> 30 XP climbs past the rival's 20
+        from notifications.tasks import notify_league_overtake
+        run.assert_any_call(notify_league_overtake, overtaker_id=self.reader.pk, overtaken_id=self.rival.pk)
+
+    def test_before_and_after_copies(self):
+        at = datetime(2026, 3, 9, 9, tzinfo=dt_timezone.utc)
+        before, after = GamificationService.record_session(self.session(at, pages=12, xp=25, minutes=60))
+        self.assertEqual((before.total_xp, before.total_pages_read, before.current_streak), (0, 0, 0))
+        self.assertEqual((after.total_xp, after.total_pages_read, after.current_streak), (25, 12, 1))
+        self.assertEqual(after.total_time_hours, before.total_time_hours + 1)
+
+        profile = self.profile()
+        self.assertEqual(
+            (profile.total_xp, profile.total_pages_read, profile.current_streak, profile.last_read_date),
+            (after.total_xp, after.total_pages_read, after.current_streak, after.last_read_date),
+        )
+
+    def test_day_is_the_readers_local_day(self):
+        # 09:00 and 12:00 UTC on the 9th are the 9th and the 10th in Auckland
+        GamificationService.record_session(self.session(datetime(2026, 3, 9, 9, tzinfo=dt_timezone.utc)))
+        _, after = GamificationService.record_session(
+            self.session(datetime(2026, 3, 9, 12, tzinfo=dt_timezone.utc))
+        )
+        self.assertEqual(after.last_read_date, date(2026, 3, 10))
+        self.assertEqual(after.current_streak, 2)
+        self.assertEqual(self.profile().last_read_date, date(2026, 3, 10))
+
+    def test_period_bucket_uses_the_readers_local_day(self):
+        # Sunday 20:00 UTC is already Monday in Auckland: a new week
+        GamificationService.record_session(self.session(datetime(2026, 3, 15, 20, tzinfo=dt_timezone.utc)))
+        self.assertEqual(
+            list(PeriodXP.objects.filter(user=self.reader, period='week').values_list('period_start', 'xp')),
+            [(date(2026, 3, 16), 30)],
+        )
+
+
+@override_settings(
+    LEADERBOARD_REDIS_URL='',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class LeaderboardSnapshotViewTests(TestCase):
+
+    URL = '/api/gamification/leaderboard/'
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.users = {}
+        for name, xp in (('ada', 100), ('bo', 50), ('cy', 10)):
+            cls.users[name] = User.objects.create_user(username=name, email=f'{name}@example.com', password='x')
+            UserGamification.objects.update_or_create(user=cls.users[name], defaults={'total_xp': xp})
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, name, **params):
+        api = APIClient()
+        api.force_authenticate(self.users[name])
+        response = api.get(self.URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def set_xp(self, name, xp):
+        user = self.users[name]
+        UserGamification.objects.filter(user=user).update(total_xp=xp)
+        LeaderboardService.update(user.pk, xp)
+
+    def test_one_snapshot_overlaid_per_viewer(self):
+        with mock.patch.object(LeaderboardService, 'top', wraps=LeaderboardService.top) as top:
+            for name in ('ada', 'bo'):
+                rows = self.get(name)['leaderboard']
+                self.assertEqual(
+                    [(row['username'], row['is_current_user']) for row in rows],
+                    [('ada', name == 'ada'), ('bo', name == 'bo'), ('cy', False)],
+                )
+        top.assert_called_once()
+        cached = cache.get(LeaderboardSnapshot._key('all'))
+        self.assertFalse(any(entry['is_current_user'] for entry in cached['entries']))
+
+    def test_viewer_below_the_limit_gets_their_own_entry(self):
+        data = self.get('cy', limit=1)
+        self.assertEqual([row['username'] for row in data['leaderboard']], ['ada'])
+        self.assertEqual(data['current_user_rank'], 3)
+        self.assertEqual(data['current_user_entry']['total_xp'], 10)
+        self.assertEqual(data['total_participants'], 3)
+
+    def test_xp_change_in_the_rows_drops_the_snapshot(self):
+        self.get('ada')
+        self.set_xp('bo', 150)
+        self.assertIsNone(cache.get(LeaderboardSnapshot._key('all')))
+        self.assertEqual([row['username'] for row in self.get('ada')['leaderboard']], ['bo', 'ada', 'cy'])
+
+    def test_xp_change_below_a_full_snapshot_keeps_it(self):
+        with mock.patch.object(LeaderboardSnapshot, 'SIZE', 2):
+            self.get('ada')
+            newcomer = get_user_model().objects.create_user(username='di', email='di@example.com', password='x')
+            self.users['di'] = newcomer
+            UserGamification.objects.update_or_create(user=newcomer)
+            self.set_xp('di', 20)     # under the floor (bo's 50)
+            self.assertIsNotNone(cache.get(LeaderboardSnapshot._key('all')))
+            self.set_xp('di', 60)
+            self.assertIsNone(cache.get(LeaderboardSnapshot._key('all')))
@@ -2,65 +2,75 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Window, F
-from django.db.models.functions import RowNumber
 
+from .leaderboard import LeaderboardService, LeaderboardSnapshot, PeriodBuckets
 from .models import UserGamification, Badge
-from .serializers import LeaderboardEntrySerializer, UserGamificationSerializer, BadgeSerializer
+from .serializers import UserGamificationSerializer, BadgeSerializer
+
+
+PERIODS = ('all', 'week', 'month')
+
+
+def _board(request):
+    """(board name, period) for ?period=, or (None, period) if it isn't one we know."""
+    period = request.query_params.get('period', 'all')
+    if period not in PERIODS:
+        return None, period
+    return LeaderboardService.board(period), period
+
+
+def _bad_period(period):
+    return Response(
+        {'detail': f"Unknown period '{period}' — use 'all', 'week' or 'month'."},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def _period_start(board):
+    parsed = PeriodBuckets.parse(board)
+    return parsed[1] if parsed else None
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def leaderboard(request):
     """
-    Get the leaderboard ranked by total XP.
+    Get the leaderboard ranked by total XP, or by XP earned this week / month.
+    Ties go to the longer current streak, then the earlier sign-up.
     
     Query params:
     - limit: Number of entries to return (default 20, max 100)
     - period: 'all', 'week', 'month' (default 'all')
     """
     limit = min(int(request.query_params.get('limit', 20)), 100)
-    
-    # Get all gamification records ordered by XP
-    queryset = UserGamification.objects.select_related('user').filter(
-        total_xp__gt=0  # Only include users with XP
-    ).order_by('-total_xp', '-current_streak', 'user__date_joined')[:limit]
-    
-    # Add rank to each entry
-    entries = list(queryset)
-    for i, entry in enumerate(entries, start=1):
-        entry.rank = i
-    
-    serializer = LeaderboardEntrySerializer(
-        entries, 
-        many=True, 
-        context={'request': request}
-    )
-    
+    board, period = _board(request)
+    if board is None:
+        return _bad_period(period)
+
+    # Shared top rows, with only the viewer's own flag and entry per request
+    snapshot = LeaderboardSnapshot.get(board)
+    entries  = [
+        {**entry, 'is_current_user': entry['user_id'] == request.user.id}
+        for entry in snapshot['entries'][:limit]
+    ]
+
     # Get current user's rank if not in top results
     user_rank = None
     user_entry = None
-    current_user_in_list = any(e.user_id == request.user.id for e in entries)
-    
-    if not current_user_in_list:
-        try:
-            user_gamification = UserGamification.objects.get(user=request.user)
-            # Count users with more XP
-            rank = UserGamification.objects.filter(
-                total_xp__gt=user_gamification.total_xp
-            ).count() + 1
-            user_gamification.rank = rank
-            user_entry = LeaderboardEntrySerializer(
-                user_gamification, 
-                context={'request': request}
-            ).data
-            user_rank = rank
-        except UserGamification.DoesNotExist:
-            user_rank = None
-    
+    if not any(entry['is_current_user'] for entry in entries):
+        score = LeaderboardService.score(request.user.id, board=board)
+        found = LeaderboardService.entries(
+            [(request.user.id, LeaderboardService.rank(request.user.id, board=board), score)], request,
+        )
+        if found:
+            user_entry = found[0]
+            user_rank  = user_entry['rank']
+
     return Response({
-        'leaderboard': serializer.data,
-        'total_participants': UserGamification.objects.filter(total_xp__gt=0).count(),
+        'period': period,
+        'period_start': _period_start(board),
+        'leaderboard': entries,
+        'total_participants': snapshot['total_participants'],
         'current_user_rank': user_rank,
         'current_user_entry': user_entry,
     })
@@ -69,51 +79,43 @@ def leaderboard(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_rank(request):
-    """Get the current user's rank and nearby competitors."""
+    """Get the current user's rank and nearby competitors (?period= as for leaderboard)."""
+    board, period = _board(request)
+    if board is None:
+        return _bad_period(period)
     try:
-        user_gamification = UserGamification.objects.get(user=request.user)
+        user_gamification = UserGamification.objects.select_related('user').get(user=request.user)
     except UserGamification.DoesNotExist:
         return Response({
             'rank': None,
             'total_xp': 0,
             'message': 'Start reading to join the leaderboard!'
         })
-    
-    # Calculate rank
-    rank = UserGamification.objects.filter(
-        total_xp__gt=user_gamification.total_xp
-    ).count() + 1
-    
-    total_participants = UserGamification.objects.filter(total_xp__gt=0).count()
-    
-    # Get users just above and below
-    above = UserGamification.objects.select_related('user').filter(
-        total_xp__gt=user_gamification.total_xp
-    ).order_by('total_xp')[:3]
-    
-    below = UserGamification.objects.select_related('user').filter(
-        total_xp__lt=user_gamification.total_xp
-    ).order_by('-total_xp')[:3]
-    
-    # Add ranks
-    above_list = list(above)
-    for i, entry in enumerate(above_list):
-        entry.rank = rank - len(above_list) + i
-    
-    below_list = list(below)
-    for i, entry in enumerate(below_list):
-        entry.rank = rank + i + 1
-    
-    user_gamification.rank = rank
-    
+
+    score = LeaderboardService.score(request.user.id, board=board)
+    rank  = LeaderboardService.rank(request.user.id, board=board)
+    total_participants = LeaderboardService.count(board=board)
+
+    # Users just above and below, best first
+    above, below = LeaderboardService.neighbours(request.user.id, board=board)
+    above_list = LeaderboardService.entries(
+        [(user_id, rank - len(above) + i, xp) for i, (user_id, xp) in enumerate(above)], request,
+    )
+    below_list = LeaderboardService.entries(
+        [(user_id, rank + i + 1, xp) for i, (user_id, xp) in enumerate(below)], request,
+    )
+
     return Response({
+        'period': period,
+        'period_start': _period_start(board),
+        'period_xp': score,
         'rank': rank,
         'total_participants': total_participants,
         'percentile': round((1 - (rank / total_participants)) * 100, 1) if total_participants > 0 else 0,
         'user': UserGamificationSerializer(user_gamification).data,
-        'above': LeaderboardEntrySerializer(above_list, many=True, context={'request': request}).data,
-        'below': LeaderboardEntrySerializer(below_list, many=True, context={'request': request}).data,
-        'xp_to_next_rank': above_list[0].total_xp - user_gamification.total_xp if above_list else 0,
+        'above': above_list,
+        'below': below_list,
+        'xp_to_next_rank': max(above[-1][1] - score, 0) if above else 0,
     })
 
 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import UserBook, ReadingSession
+from .models import UserBook, ReadingSession, DailyReadingRollup
 
 
 @admin.register(UserBook)
@@ -17,3 +17,11 @@ class ReadingSessionAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('user__username', 'user__email', 'book__title')
     raw_id_fields = ('user', 'book', 'user_book')
+
+
+@admin.register(DailyReadingRollup)
+class DailyReadingRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'day', 'pages_read', 'minutes_read', 'xp_earned', 'session_count')
+    list_filter = ('day',)
+    search_fields = ('user__username', 'user__email')
+    raw_id_fields = ('user',)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ReadingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.reading'
+
+    def ready(self):
+        import apps.reading.signals  # noqa
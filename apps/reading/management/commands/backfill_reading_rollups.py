@@ -0,0 +1,115 @@
+"""
+Management command to rebuild DailyReadingRollup rows from ReadingSession.
+Usage: python manage.py backfill_reading_rollups [--chunk-size 500] [--user 42]
+
+Users are processed in primary-key order, one transaction per chunk, so an
+interrupted run can be restarted with --start-after <last reported id>.
+"""
+
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from apps.reading.models import ReadingSession, DailyReadingRollup
+from apps.reading.services import StreakService
+from notifications.models import NotificationPreference
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-user daily reading rollups from raw reading sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Users rebuilt per transaction',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Only rebuild this user id',
+        )
+        parser.add_argument(
+            '--start-after',
+            type=int,
+            default=0,
+            help='Resume after this user id',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id    = options['start_after']
+        users      = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(pk=options['user'])
+
+        total_users = total_days = 0
+        while True:
+            user_ids = list(
+                users.filter(pk__gt=last_id).values_list('pk', flat=True)[:chunk_size]
+            )
+            if not user_ids:
+                break
+
+            with transaction.atomic():
+                days = self._rebuild_chunk(user_ids)
+
+            last_id      = user_ids[-1]
+            total_users += len(user_ids)
+            total_days  += days
+            self.stdout.write(f'Rebuilt {days} days for {len(user_ids)} users (up to id {last_id})')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Rebuilt {total_days} rollup days for {total_users} users')
+        )
+
+    @staticmethod
+    def _rebuild_chunk(user_ids):
+        # Local days depend on each user's timezone, so aggregate once per
+        # timezone present in the chunk rather than once per user.
+        tz_names = dict(
+            NotificationPreference.objects
+            .filter(user_id__in=user_ids)
+            .values_list('user_id', 'timezone')
+        )
+        by_tz = defaultdict(list)
+        for user_id in user_ids:
+            by_tz[tz_names.get(user_id)].append(user_id)
+
+        rollups = []
+        for tz_name, tz_user_ids in by_tz.items():
+            rows = (
+                ReadingSession.objects
+                .filter(user_id__in=tz_user_ids)
+                .annotate(day=TruncDate('created_at', tzinfo=StreakService.tz_from_name(tz_name)))
+                .values('user_id', 'day')
+                .annotate(
+                    pages=Sum('pages_read'),
+                    minutes=Sum('duration_minutes'),
+                    xp=Sum('xp_earned'),
+                    sessions=Count('id'),
+                )
+                .order_by()
+            )
+            rollups.extend(
+                DailyReadingRollup(
+                    user_id      =row['user_id'],
+                    day          =row['day'],
+                    pages_read   =row['pages'],
+                    minutes_read =row['minutes'],
+                    xp_earned    =row['xp'],
+                    session_count=row['sessions'],
+                )
+                for row in rows
+            )
+
+        DailyReadingRollup.objects.filter(user_id__in=user_ids).delete()
+        DailyReadingRollup.objects.bulk_create(rollups, batch_size=1000)
+        return len(rollups)
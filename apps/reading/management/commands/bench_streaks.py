@@ -0,0 +1,68 @@
+"""
+Management command to benchmark the streak engine against streak length.
+Usage: python manage.py bench_streaks --lengths 1 30 300
+
+Synthetic readers are created inside a transaction that is rolled back,
+so the command is safe to run against a development database.
+"""
+
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.reading.models import DailyReadingRollup
+from apps.reading.services import StreakService
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark StreakService query count and latency for long streaks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lengths',
+            type=int,
+            nargs='+',
+            default=[1, 30, 300],
+            help='Streak lengths (in days) to benchmark',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"days":>6} {"queries":>8} {"ms":>8} {"current":>8} {"longest":>8}')
+
+        with transaction.atomic():
+            for length in options['lengths']:
+                user = self._make_reader(length)
+
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    streaks = StreakService.get_streaks(user)
+                    elapsed = (time.perf_counter() - started) * 1000
+
+                self.stdout.write(
+                    f'{length:>6} {len(ctx.captured_queries):>8} {elapsed:>8.1f} '
+                    f'{streaks["current_streak"]:>8} {streaks["longest_streak"]:>8}'
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _make_reader(days):
+        user = User.objects.create(
+            username=f'streak-bench-{days}',
+            email=f'streak-bench-{days}@example.com',
+        )
+        today = timezone.now().astimezone(StreakService.user_timezone(user)).date()
+        DailyReadingRollup.objects.bulk_create([
+            DailyReadingRollup(
+                user=user, day=today - timedelta(days=i),
+                pages_read=10, minutes_read=15, xp_earned=20, session_count=3,
+            )
+            for i in range(days)
+        ])
+        return user
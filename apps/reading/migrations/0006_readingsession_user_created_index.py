@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reading', '0005_alter_note_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='readingsession',
+            index=models.Index(fields=['user', 'created_at'], name='reading_session_user_created'),
+        ),
+    ]
@@ -60,11 +60,40 @@ class ReadingSession(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='reading_session_user_created'),
+        ]
 
     def __str__(self):
         return f"{self.user} read {self.pages_read}pg of {self.book.title}"
 
 
+class DailyReadingRollup(models.Model):
+    """
+    Per-user totals for one local calendar day, upserted by
+    ReadingService.log_session so stats, streaks and digests read one
+    compact row per day instead of every session.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='reading_days',
+    )
+    day = models.DateField()
+    pages_read = models.PositiveIntegerField(default=0)
+    minutes_read = models.PositiveIntegerField(default=0)
+    xp_earned = models.PositiveIntegerField(default=0)
+    session_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'day')
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"{self.user} — {self.day}: {self.pages_read}pg in {self.session_count} sessions"
+
+
 class Note(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
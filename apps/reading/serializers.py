@@ -49,6 +49,7 @@ class LogSessionSerializer(serializers.Serializer):
 class ReadingStatsSerializer(serializers.Serializer):
     total_xp = serializers.IntegerField()
     current_streak = serializers.IntegerField()
+    longest_streak = serializers.IntegerField()
     books_finished = serializers.IntegerField()
     total_time_hours = serializers.FloatField()
 
@@ -1,15 +1,24 @@
-from datetime import timedelta
+import logging
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from django.db.models import Sum
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
 from django.utils import timezone
 
 from apps.books.models import Book
 
-from .models import UserBook, ReadingSession
+from .models import UserBook, ReadingSession, DailyReadingRollup
+
+logger = logging.getLogger(__name__)
 
 
 class ReadingService:
 
+    STATS_CACHE_TIMEOUT = 60 * 10
+
     @staticmethod
     def calculate_xp(pages_read, duration_minutes):
         base_xp = pages_read * 2
@@ -38,86 +47,187 @@ class ReadingService:
     @staticmethod
     def log_session(user, book_id, start_page, end_page, duration_minutes):
         book = Book.objects.get(id=book_id)
-        user_book, _ = UserBook.objects.get_or_create(
-            user=user,
-            book=book,
-            defaults={'status': 'READING', 'started_at': timezone.now()},
-        )
 
-        pages_read = max(0, end_page - start_page)
-        xp_earned  = ReadingService.calculate_xp(pages_read, duration_minutes)
-
-        session = ReadingSession.objects.create(
-            user            =user,
-            book            =book,
-            user_book       =user_book,
-            start_page      =start_page,
-            end_page        =end_page,
-            pages_read      =pages_read,
-            duration_minutes=duration_minutes,
-            xp_earned       =xp_earned,
-        )
+        with transaction.atomic():
+            user_book, _ = UserBook.objects.get_or_create(
+                user=user,
+                book=book,
+                defaults={'status': 'READING', 'started_at': timezone.now()},
+            )
 
-        # Update current page + progress percent
-        user_book.current_page = end_page
+            pages_read = max(0, end_page - start_page)
+            xp_earned  = ReadingService.calculate_xp(pages_read, duration_minutes)
 
-        if book.total_pages and book.total_pages > 0:
-            user_book.progress_percent = min(
-                100, round((end_page / book.total_pages) * 100)
+            session = ReadingSession.objects.create(
+                user            =user,
+                book            =book,
+                user_book       =user_book,
+                start_page      =start_page,
+                end_page        =end_page,
+                pages_read      =pages_read,
+                duration_minutes=duration_minutes,
+                xp_earned       =xp_earned,
             )
 
-        if user_book.status != 'READING':
-            user_book.status = 'READING'
-            if not user_book.started_at:
-                user_book.started_at = timezone.now()
+            # Update current page + progress percent
+            user_book.current_page = end_page
 
-        # Auto-finish if reached total pages
-        if book.total_pages and book.total_pages > 0 and end_page >= book.total_pages:
-            user_book.status      = 'FINISHED'
-            user_book.finished_at = timezone.now()
+            if book.total_pages and book.total_pages > 0:
+                user_book.progress_percent = min(
+                    100, round((end_page / book.total_pages) * 100)
+                )
 
-        user_book.save()
+            if user_book.status != 'READING':
+                user_book.status = 'READING'
+                if not user_book.started_at:
+                    user_book.started_at = timezone.now()
 
-        # Award XP inline — no Celery, bypasses any signal that hits Redis
-        ReadingService._award_xp_inline(user, xp_earned)
+            # Auto-finish if reached total pages
+            if book.total_pages and book.total_pages > 0 and end_page >= book.total_pages:
+                user_book.status      = 'FINISHED'
+                user_book.finished_at = timezone.now()
+
+            user_book.save()
+
+            ReadingService._record_daily_rollup(user, session)
+            transaction.on_commit(lambda: ReadingService.invalidate_stats(user.pk))
 
         return session
 
     @staticmethod
-    def _award_xp_inline(user, xp):
-        """Award XP directly to gamification profile.
-        Uses .update() to avoid triggering post_save signals."""
-        if xp <= 0:
+    def _record_daily_rollup(user, session):
+        """Add the session to the user's rollup row for its local day."""
+        tz  = StreakService.user_timezone(user)
+        day = timezone.localtime(session.created_at, tz).date()
+
+        increments = {
+            'pages_read'   : F('pages_read') + session.pages_read,
+            'minutes_read' : F('minutes_read') + session.duration_minutes,
+            'xp_earned'    : F('xp_earned') + session.xp_earned,
+            'session_count': F('session_count') + 1,
+            'updated_at'   : timezone.now(),
+        }
+        rollups = DailyReadingRollup.objects.filter(user=user, day=day)
+        if rollups.update(**increments):
             return
+
+        # First session of the day. A concurrent session may create the row
+        # between our UPDATE and INSERT, in which case fall back to UPDATE.
         try:
-            from apps.gamification.models import UserProfile
-            profile, _ = UserProfile.objects.get_or_create(user=user)
-            UserProfile.objects.filter(pk=profile.pk).update(
-                total_xp=(profile.total_xp or 0) + xp
-            )
-        except Exception:
-            pass  # never break session logging if gamification is missing
+            with transaction.atomic():
+                DailyReadingRollup.objects.create(
+                    user         =user,
+                    day          =day,
+                    pages_read   =session.pages_read,
+                    minutes_read =session.duration_minutes,
+                    xp_earned    =session.xp_earned,
+                    session_count=1,
+                )
+        except IntegrityError:
+            rollups.update(**increments)
+
+    @staticmethod
+    def _stats_version_key(user_id):
+        return f"reading_stats_version:{user_id}"
+
+    @staticmethod
+    def _stats_cache_key(user_id):
+        """The stats key under the user's current version (see invalidate_stats)."""
+        version_key = ReadingService._stats_version_key(user_id)
+        try:
+            version = cache.get(version_key)
+            if version is None:
+                cache.add(version_key, 1, timeout=None)
+                version = cache.get(version_key, 1)
+        except Exception as exc:
+            logger.warning("Cache read failed for key %s: %s", version_key, exc)
+            version = 1
+        return f"reading_stats:{user_id}:v{version}"
+
+    @staticmethod
+    def invalidate_stats(user_id):
+        """
+        Move the user to a new stats version. A request that read the old
+        version and is still computing writes under the old key, so it
+        can't resurrect stale stats the way a set after a delete would.
+        """
+        try:
+            cache.incr(ReadingService._stats_version_key(user_id))
+        except ValueError:
+            pass    # no version yet, so nothing has been cached
+        except Exception as exc:
+            logger.warning("Stats cache invalidation failed for user %s: %s", user_id, exc)
 
     @staticmethod
     def get_reading_stats(user):
-        total_xp = ReadingSession.objects.filter(user=user).aggregate(
-            total=Sum('xp_earned')
-        )['total'] or 0
+        """
+        Dashboard stats card. Warm path is two cache reads (version, then
+        stats); cold path is one aggregate query plus the streak query.
+        Entries are retired by invalidate_stats and never outlive the
+        user's local day, since the current streak depends on "today".
+        """
+        cache_key = ReadingService._stats_cache_key(user.pk)
+        try:
+            cached = cache.get(cache_key)
+        except Exception as exc:
+            logger.warning("Cache read failed for key %s: %s", cache_key, exc)
+            cached = None
+        if cached is not None:
+            return cached
 
-        books_finished = UserBook.objects.filter(user=user, status='FINISHED').count()
+        stats, tz = ReadingService._compute_reading_stats(user)
 
-        total_minutes = ReadingSession.objects.filter(user=user).aggregate(
-            total=Sum('duration_minutes')
-        )['total'] or 0
+        now_local = timezone.now().astimezone(tz)
+        midnight  = datetime.combine(now_local.date() + timedelta(days=1), time.min, tzinfo=tz)
+        timeout   = min(
+            ReadingService.STATS_CACHE_TIMEOUT,
+            int((midnight - now_local).total_seconds()) + 1,
+        )
+        try:
+            cache.set(cache_key, stats, timeout=timeout)
+        except Exception as exc:
+            logger.warning("Cache write failed for key %s: %s", cache_key, exc)
+        return stats
 
-        current_streak = ReadingService._calculate_streak(user)
+    @staticmethod
+    def _compute_reading_stats(user):
+        from notifications.models import NotificationPreference
 
-        return {
-            'total_xp'        : total_xp,
-            'current_streak'  : current_streak,
-            'books_finished'  : books_finished,
-            'total_time_hours': round(total_minutes / 60, 1),
+        rollups = (
+            DailyReadingRollup.objects
+            .filter(user=OuterRef('pk'))
+            .order_by()
+            .values('user')
+        )
+        row = (
+            get_user_model().objects
+            .filter(pk=user.pk)
+            .order_by()
+            .annotate(
+                total_xp=Subquery(rollups.annotate(total=Sum('xp_earned')).values('total')),
+                total_minutes=Subquery(rollups.annotate(total=Sum('minutes_read')).values('total')),
+                books_finished=Count('user_books', filter=Q(user_books__status='FINISHED')),
+                tz_name=Subquery(
+                    NotificationPreference.objects
+                    .filter(user=OuterRef('pk'))
+                    .values('timezone')[:1]
+                ),
+            )
+            .values('total_xp', 'total_minutes', 'books_finished', 'tz_name')
+            .get()
+        )
+
+        tz      = StreakService.tz_from_name(row['tz_name'])
+        streaks = StreakService.get_streaks(user, tz=tz)
+
+        stats = {
+            'total_xp'        : row['total_xp'] or 0,
+            'current_streak'  : streaks['current_streak'],
+            'longest_streak'  : streaks['longest_streak'],
+            'books_finished'  : row['books_finished'],
+            'total_time_hours': round((row['total_minutes'] or 0) / 60, 1),
         }
+        return stats, tz
 
     @staticmethod
     def get_currently_reading(user):
@@ -128,16 +238,101 @@ class ReadingService:
 
     @staticmethod
     def _calculate_streak(user):
-        today  = timezone.now().date()
-        streak = 0
-        day    = today
-        while True:
-            has_session = ReadingSession.objects.filter(
-                user=user,
-                created_at__date=day,
-            ).exists()
-            if not has_session:
-                break
-            streak += 1
-            day -= timedelta(days=1)
-        return streak
\ No newline at end of file
+        return StreakService.get_streaks(user)['current_streak']
+
+
+class StreakService:
+    """
+    Current / longest reading streak from the user's DailyReadingRollup
+    days, which are already bucketed by local date.
+
+    Postgres solves it in one gaps-and-islands query; other backends (SQLite
+    in development) fetch the days in one query and walk them in Python.
+    Either way the query count does not grow with streak length.
+    """
+
+    # Each run of consecutive days shares the same (day - row_number) value,
+    # so grouping on it yields one row per streak ("island").
+    _ISLANDS_SQL = """
+        WITH islands AS (
+            SELECT MAX(day) AS last_day, COUNT(*) AS length
+            FROM (
+                SELECT day, day - (ROW_NUMBER() OVER (ORDER BY day))::int AS grp
+                FROM {table}
+                WHERE user_id = %(user_id)s
+            ) numbered
+            GROUP BY grp
+        )
+        SELECT
+            COALESCE(MAX(length) FILTER (WHERE last_day = %(today)s), 0),
+            COALESCE(MAX(length), 0)
+        FROM islands
+    """
+
+    @staticmethod
+    def tz_from_name(tz_name):
+        try:
+            return ZoneInfo(tz_name) if tz_name else ZoneInfo('UTC')
+        except (ZoneInfoNotFoundError, ValueError):
+            return ZoneInfo('UTC')
+
+    @staticmethod
+    def user_timezone(user):
+        """The user's notification timezone, falling back to UTC."""
+        from notifications.models import NotificationPreference
+
+        tz_name = (
+            NotificationPreference.objects
+            .filter(user=user)
+            .values_list('timezone', flat=True)
+            .first()
+        )
+        return StreakService.tz_from_name(tz_name)
+
+    @staticmethod
+    def get_streaks(user, tz=None):
+        tz    = tz or StreakService.user_timezone(user)
+        today = timezone.now().astimezone(tz).date()
+
+        if connection.vendor == 'postgresql':
+            current, longest = StreakService._streaks_sql(user, today)
+        else:
+            days = (
+                DailyReadingRollup.objects
+                .filter(user=user)
+                .order_by('day')
+                .values_list('day', flat=True)
+            )
+            current, longest = StreakService.streaks_from_dates(days, today)
+
+        return {'current_streak': current, 'longest_streak': longest}
+
+    @staticmethod
+    def _streaks_sql(user, today):
+        sql = StreakService._ISLANDS_SQL.format(
+            table=connection.ops.quote_name(DailyReadingRollup._meta.db_table),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'user_id': user.pk, 'today': today})
+            current, longest = cursor.fetchone()
+        return current, longest
+
+    @staticmethod
+    def streaks_from_dates(days, today):
+        """
+        Pure-Python gaps-and-islands over ascending distinct dates.
+        The current streak is the run that ends on `today`.
+        """
+        current = longest = 0
+        prev = None
+        for day in days:
+            if prev is not None and day - prev == timedelta(days=1):
+                current += 1
+            else:
+                current = 1
+            longest = max(longest, current)
+            prev = day
+
+        if prev != today:
+            current = 0
+        return current, longest
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import UserBook
+
+
+@receiver(post_save, sender=UserBook)
+@receiver(post_delete, sender=UserBook)
+def invalidate_reading_stats(sender, instance, **kwargs):
+    """books_finished is part of the cached stats card — drop it on any change."""
+    from .services import ReadingService
+
+    user_id = instance.user_id
+    transaction.on_commit(lambda: ReadingService.invalidate_stats(user_id))
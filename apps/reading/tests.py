@@ -1,3 +1,127 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.books.models import Book
+from notifications.models import NotificationPreference
+
+from .models import DailyReadingRollup, ReadingSession
+from .services import ReadingService, StreakService
+
+
+class StreaksFromDatesTests(SimpleTestCase):
+
+    TODAY = date(2026, 3, 10)
+
+    def streaks(self, *offsets):
+        """Streaks for reading days given as offsets before TODAY."""
+        days = sorted(self.TODAY - timedelta(days=n) for n in offsets)
+        return StreakService.streaks_from_dates(days, self.TODAY)
+
+    def test_no_reading(self):
+        self.assertEqual(self.streaks(), (0, 0))
+
+    def test_only_today(self):
+        self.assertEqual(self.streaks(0), (1, 1))
+
+    def test_run_ending_today(self):
+        self.assertEqual(self.streaks(3, 2, 1, 0), (4, 4))
+
+    def test_run_ending_yesterday_is_not_current(self):
+        self.assertEqual(self.streaks(3, 2, 1), (0, 3))
+
+    def test_longest_is_an_earlier_run(self):
+        self.assertEqual(self.streaks(10, 9, 8, 7, 5, 1, 0), (2, 4))
+
+    def test_run_across_a_month_boundary(self):
+        today = date(2026, 3, 1)
+        days  = [date(2026, 2, 27), date(2026, 2, 28), today]
+        self.assertEqual(StreakService.streaks_from_dates(days, today), (3, 3))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class StatsCacheVersionTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidation_moves_to_a_new_key(self):
+        key = ReadingService._stats_cache_key(7)
+        self.assertEqual(ReadingService._stats_cache_key(7), key)
+        ReadingService.invalidate_stats(7)
+        self.assertNotEqual(ReadingService._stats_cache_key(7), key)
+
+    def test_write_from_before_invalidation_is_never_read(self):
+        stale_key = ReadingService._stats_cache_key(7)    # a request starts computing
+        ReadingService.invalidate_stats(7)                # a session is logged meanwhile
+        cache.set(stale_key, {'total_pages': 10})         # the request finishes
+        self.assertIsNone(cache.get(ReadingService._stats_cache_key(7)))
+
+    def test_versions_are_per_user(self):
+        other = ReadingService._stats_cache_key(8)
+        ReadingService.invalidate_stats(7)
+        self.assertEqual(ReadingService._stats_cache_key(8), other)
+
+    def test_invalidating_before_any_read(self):
+        ReadingService.invalidate_stats(9)
+        self.assertTrue(ReadingService._stats_cache_key(9).endswith(':v1'))
+
+
+@override_settings(TIME_ZONE='UTC')
+class DailyRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='ro', email='ro@example.com', password='x')
+        NotificationPreference.objects.filter(user=cls.user).update(timezone='Pacific/Auckland')
+        cls.book = Book.objects.create(title='Emma', author='Jane Austen', total_pages=500)
+
+    def log(self, at, start, end, minutes=20):
+        with mock.patch('django.utils.timezone.now', return_value=at), \
+             mock.patch('apps.gamification.signals._run'):
+            return ReadingService.log_session(self.user, self.book.pk, start, end, minutes)
+
+    def rollups(self):
+        return list(
+            DailyReadingRollup.objects.filter(user=self.user).order_by('day')
+            .values_list('day', 'pages_read', 'minutes_read', 'xp_earned', 'session_count')
+        )
+
+    def test_sessions_on_one_day_share_a_row(self):
+        first  = self.log(datetime(2026, 3, 9, 1, tzinfo=dt_timezone.utc), 0, 10)
+        second = self.log(datetime(2026, 3, 9, 2, tzinfo=dt_timezone.utc), 10, 25, minutes=30)
+        self.assertEqual(self.rollups(), [
+            (date(2026, 3, 9), 25, 50, first.xp_earned + second.xp_earned, 2),
+        ])
+
+    def test_row_is_the_readers_local_day(self):
+        # 11:00 UTC is 00:00 the next day in Auckland (UTC+13 in March)
+        self.log(datetime(2026, 3, 9, 10, 59, tzinfo=dt_timezone.utc), 0, 5)
+        self.log(datetime(2026, 3, 9, 11, 0, tzinfo=dt_timezone.utc), 5, 8)
+        self.assertEqual([(day, pages) for day, pages, *_ in self.rollups()], [
+            (date(2026, 3, 9), 5), (date(2026, 3, 10), 3),
+        ])
+
+    def test_insert_race_falls_back_to_update(self):
+        at  = datetime(2026, 3, 9, 1, tzinfo=dt_timezone.utc)
+        day = date(2026, 3, 9)
+        # A concurrent session inserted today's row after our UPDATE found nothing
+        DailyReadingRollup.objects.create(
+            user=self.user, day=day, pages_read=4, minutes_read=10, xp_earned=8, session_count=1,
+        )
+        session = ReadingSession(pages_read=6, duration_minutes=15, xp_earned=12, created_at=at)
+        update  = QuerySet.update
+        calls   = []
+
+        def first_update_misses(queryset, **kwargs):
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', first_update_misses):
+            ReadingService._record_daily_rollup(self.user, session)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.rollups(), [(day, 10, 25, 20, 2)])
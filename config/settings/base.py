@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_extensions',
 
     # Third-party
@@ -135,8 +136,27 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 # Media files (user uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
-FILE_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100 MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100 MB
+# Larger uploads spool to a temp file instead of sitting in worker memory;
+# big PDFs should use the resumable /api/books/uploads/ protocol instead.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5 MB
+DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5 MB
+
+# How download-pdf delivers book files:
+#   'stream' — bytes through Django (local filesystem storage)
+#   'public' — redirect to the storage's public URL
+#   'signed' — redirect to a presigned S3 URL valid for PDF_SIGNED_URL_EXPIRE seconds
+PDF_DELIVERY = os.environ.get('PDF_DELIVERY', 'stream')
+PDF_SIGNED_URL_EXPIRE = int(os.environ.get('PDF_SIGNED_URL_EXPIRE', 300))
+# Rewrite uploaded PDFs as linearized ("fast web view") during ingestion;
+# needs pikepdf, installed on workers only (requirements-worker.txt)
+PDF_LINEARIZE = os.environ.get('PDF_LINEARIZE', 'false').lower() == 'true'
+# Processes used to render covers/thumbnails (0 renders inline)
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+# Page thumbnails rendered per book (0 = every page). Vercel renders inside
+# the upload request, so it only does the first few there.
+PDF_THUMBNAIL_MAX_PAGES = int(
+    os.environ.get('PDF_THUMBNAIL_MAX_PAGES', 24 if os.environ.get('VERCEL') else 0)
+)
 
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -203,6 +223,13 @@ GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID', '')
 # Get a free key at: https://console.cloud.google.com/ → APIs → Books API
 GOOGLE_BOOKS_API_KEY = os.environ.get('GOOGLE_BOOKS_API_KEY', '')
 
+# Public origin of this API, for absolute URLs built outside a request
+# (cover proxy links in cached search results, stored covers)
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+
+# Open Library (book search/metadata) — override to point at a local stub
+OPEN_LIBRARY_BASE_URL = os.environ.get('OPEN_LIBRARY_BASE_URL', 'https://openlibrary.org')
+
 
 # Firebase
 FIREBASE_CREDENTIALS_PATH = os.path.join(BASE_DIR, 'firebase_credentials.json')
@@ -239,6 +266,11 @@ CELERY_TIMEZONE = 'Africa/Kampala'
 #     },
 # }
 
+# Leaderboard sorted sets (apps/gamification/leaderboard.py); without Redis
+# boards are read straight from the indexed UserGamification / PeriodXP
+# rows (DatabaseLeaderboardStore), so every process sees the same ranks
+LEADERBOARD_REDIS_URL = os.environ.get('LEADERBOARD_REDIS_URL') or os.environ.get('REDIS_URL', '')
+
 # QStash
 QSTASH_TOKEN = os.environ.get('QSTASH_TOKEN', '')
 QSTASH_CURRENT_SIGNING_KEY = os.environ.get('QSTASH_CURRENT_SIGNING_KEY', '')
@@ -92,6 +92,9 @@ AWS_DEFAULT_ACL          = 'public-read'
 AWS_S3_FILE_OVERWRITE    = False
 AWS_QUERYSTRING_AUTH     = False
 AWS_S3_SIGNATURE_VERSION = 's3v4'
+# Object names are never reused (content hashes, cover ids, unique upload
+# names), so browsers and CDNs may keep anything they fetch from the bucket
+AWS_S3_OBJECT_PARAMETERS = {'CacheControl': 'public, max-age=31536000, immutable'}
 
 # ✅ Force Supabase public URL format instead of S3 signed URLs
 AWS_S3_CUSTOM_DOMAIN = f"{env('AWS_S3_ENDPOINT_URL').replace('https://', '').replace('/storage/v1/s3', '')}/storage/v1/object/public/{env('AWS_STORAGE_BUCKET_NAME')}"
@@ -108,6 +111,9 @@ STORAGES = {
 
 MEDIA_URL = f"https://{AWS_S3_CUSTOM_DOMAIN}/"
 
+# Bucket is public-read: redirect PDF downloads straight to it
+PDF_DELIVERY = env('PDF_DELIVERY', default='public')
+
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
@@ -122,6 +128,7 @@ EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD', default='')
 EMAIL_TIMEOUT     = env.int('EMAIL_TIMEOUT', default=30)
 DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default=EMAIL_HOST_USER or 'noreply@budapp.com')
 FRONTEND_URL      = env('FRONTEND_URL', default='https://bud-ruby.vercel.app')
+SITE_URL          = env('SITE_URL', default='https://bud-ruby.vercel.app')
 
 # Google OAuth
 GOOGLE_CLIENT_ID = env('GOOGLE_CLIENT_ID', default='')
\ No newline at end of file
@@ -1,5 +1,6 @@
 from celery import shared_task
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Sum
 from django.utils import timezone
 from datetime import timedelta
 
@@ -11,18 +12,20 @@ def check_streaks():
     """Runs at 9PM — warns users who haven't read today and have a streak to protect."""
     from .models import NotificationPreference, NotificationLog
     from .services import send_push
-    from apps.reading.models import ReadingSession
+    from apps.reading.models import DailyReadingRollup
+    from apps.reading.services import StreakService
 
-    today = timezone.now().date()
+    now   = timezone.now()
     prefs = NotificationPreference.objects.filter(
         streak_alerts=True
     ).select_related('user')
 
     for pref in prefs:
-        user = pref.user
+        user  = pref.user
+        today = now.astimezone(StreakService.tz_from_name(pref.timezone)).date()
 
-        already_read = ReadingSession.objects.filter(
-            user=user, created_at__date=today,
+        already_read = DailyReadingRollup.objects.filter(
+            user=user, day=today,
         ).exists()
         if already_read:
             continue
@@ -47,18 +50,20 @@ def midnight_sos():
     """Runs at 11:30PM — final urgent warning."""
     from .models import NotificationPreference, NotificationLog
     from .services import send_push
-    from apps.reading.models import ReadingSession
+    from apps.reading.models import DailyReadingRollup
+    from apps.reading.services import StreakService
 
-    today = timezone.now().date()
+    now   = timezone.now()
     prefs = NotificationPreference.objects.filter(
         streak_alerts=True
     ).select_related('user')
 
     for pref in prefs:
-        user = pref.user
+        user  = pref.user
+        today = now.astimezone(StreakService.tz_from_name(pref.timezone)).date()
 
-        already_read = ReadingSession.objects.filter(
-            user=user, created_at__date=today,
+        already_read = DailyReadingRollup.objects.filter(
+            user=user, day=today,
         ).exists()
         if already_read:
             continue
@@ -135,7 +140,7 @@ def weekly_digest():
     """Runs every Sunday at 6PM — sends weekly reading summary."""
     from .models import NotificationPreference, NotificationLog
     from .services import send_push
-    from apps.reading.models import ReadingSession
+    from apps.reading.models import DailyReadingRollup
 
     prefs    = NotificationPreference.objects.filter(
         goal_reminders=True
@@ -143,13 +148,13 @@ def weekly_digest():
     week_ago = timezone.now().date() - timedelta(days=7)
 
     for pref in prefs:
-        user     = pref.user
-        sessions = ReadingSession.objects.filter(
-            user=user, created_at__date__gte=week_ago,
-        )
+        user = pref.user
+        week = DailyReadingRollup.objects.filter(
+            user=user, day__gte=week_ago,
+        ).aggregate(total_pages=Sum('pages_read'), days_read=Count('id'))
 
-        total_pages  = sum(s.pages_read for s in sessions)
-        days_read    = sessions.dates('created_at', 'day').count()
+        total_pages  = week['total_pages'] or 0
+        days_read    = week['days_read']
         gamification = getattr(user, 'gamification', None)
         streak       = getattr(gamification, 'current_streak', 0) if gamification else 0
         xp           = getattr(gamification, 'total_xp', 0) if gamification else 0
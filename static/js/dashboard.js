@@ -235,7 +235,9 @@ function setupUserDropdown() {
 
 function sanitizeUrl(url) {
   if (!url) return "";
-  return url.startsWith("http") ? url : "";
+  // Absolute http(s) URLs, or same-origin paths such as the cover proxy
+  if (url.startsWith("http")) return url;
+  return url.startsWith("/") && !url.startsWith("//") ? url : "";
 }
 
 function setupAddBookModal() {